@@ -0,0 +1,80 @@
+__author__ = 'anish'
+
+# A cache of images and sprites shared by every entity in every game. Players and ghosts used to slice the spritesheet
+# up and make their own sprites (and, for players, a copy of each one for every rotation) whenever they were created,
+# which happens for every entity on every level up and lost life. Now each frame is cut out once and each sprite is made
+# once, and entities just keep references to them. Sharing sprites is fine since an entity always sets a sprite's
+# position right before drawing it
+# DEPENDS Pyglet
+
+from pyglet import image
+from sprite import Sprite
+from common import *
+
+SPRITESHEET = "resources/sprites.png"
+# Width and height in pixels of one frame of a spritesheet
+FRAME_DIM = 32
+
+# filename -> the spritesheet as a single texture
+_sheets = {}
+# (filename, row, column) -> a region of that texture, anchored at its centre
+_frames = {}
+# (filename, row, column, angle, xoff, yoff) -> a Sprite of that frame
+_sprites = {}
+
+
+def get_sheet(sheet=SPRITESHEET):
+    '''
+    Load a spritesheet, or get it if it's already loaded
+    :param sheet: The filename of the spritesheet
+    :returns: The spritesheet as a texture
+    '''
+    if sheet not in _sheets:
+        _sheets[sheet] = image.load(sheet).get_texture()
+
+    return _sheets[sheet]
+
+
+def get_frame(row, column, sheet=SPRITESHEET):
+    '''
+    One frame of a spritesheet. Frames are regions of the sheet's texture rather than textures of their own
+    :param row: Row of the frame, counting up from the bottom of the sheet
+    :param column: Column of the frame, counting from the left of the sheet
+    :param sheet: The filename of the spritesheet
+    :returns: The frame, anchored at its centre
+    '''
+    key = (sheet, row, column)
+
+    if key not in _frames:
+        frame = get_sheet(sheet).get_region(column * FRAME_DIM, row * FRAME_DIM, FRAME_DIM, FRAME_DIM)
+        frame.anchor_x = frame.width // 2
+        frame.anchor_y = frame.width // 2
+        _frames[key] = frame
+
+    return _frames[key]
+
+
+def get_sprite(group, row, column, angle=0, sheet=SPRITESHEET):
+    '''
+    A sprite of one frame of a spritesheet, shared with every other entity drawn by a group with the same offsets
+    :param group: The GraphicsGroup the sprite is drawn with
+    :param row: Row of the frame, counting up from the bottom of the sheet
+    :param column: Column of the frame, counting from the left of the sheet
+    :param angle: Angle in degrees to rotate the sprite by
+    :param sheet: The filename of the spritesheet
+    :returns: The Sprite
+    '''
+    key = (sheet, row, column, angle, group.xoff, group.yoff)
+
+    if key not in _sprites:
+        sprite = Sprite(get_frame(row, column, sheet), group)
+        sprite.set_rotation(angle)
+        _sprites[key] = sprite
+
+    return _sprites[key]
+
+
+def top_row(sheet=SPRITESHEET):
+
+    # The index of the row at the top of a spritesheet
+    return get_sheet(sheet).height // FRAME_DIM - 1
@@ -0,0 +1,787 @@
+__author__ = 'anish'
+
+# A batch engine which steps many independent games of the same map in lockstep. The state of every game lives in numpy
+# arrays with one row per game, and each rule from Game.update, Governor, Player and Ghost is applied to all of the
+# games at once. Entities are still updated one slot at a time (player 1, player 2, Blinky, Pinky...) because the rules
+# depend on that order, but each of those updates is a handful of array operations no matter how many games there are.
+#
+# Batch games never freeze, just like a headless Game.
+#
+# The only per-game Python work left is drawing random numbers, which is done with one random.Random per game so that
+# any single game can be replayed by the scalar implementation and checked against it, see check_equivalence().
+#
+# DEPENDS numpy
+
+import random
+import sys
+from argparse import ArgumentParser
+
+import numpy as np
+
+from game import Game
+from clock import TickClock
+from controllers import Greedy
+from ghosts import Blinky, Pinky, Inky, Clyde
+from gamemap import UNREACHABLE
+from common import *
+
+# Ghost states and directions are stored as small integers. NONE stands in for a theta or state which is None
+STATES = ["idle", "escape", "wander", "chase", "scared", "flashing", "retreat"]
+IDLE, ESCAPE, WANDER, CHASE, SCARED, FLASHING, RETREAT = range(len(STATES))
+NONE = -1
+
+# Movement speed of a ghost in each state, indexed by state, see Ghost.speeds
+GHOST_SPEEDS = np.array([0, 2, 2, 2, 1, 1, 4]) * (SUBTILE // 40)
+
+# Same values as common.cos/common.sin so that targets round exactly like they do in ghosts.py
+COS = {theta: cos(theta) for theta in DIRECTIONS}
+SIN = {theta: sin(theta) for theta in DIRECTIONS}
+
+
+def snapshot(game):
+    '''
+    Capture the state of a scalar Game in the same form as BatchGame.snapshot
+    :param game: The game
+    :returns: A dict which compares equal to the batch snapshot of an equivalent game
+    '''
+    theta = lambda t: NONE if t is None else t
+
+    return {"score": game.score, "lives": game.lives, "level": game.level, "over": game.over,
+            "total_dots_eaten": game.total_dots_eaten, "dots_eaten": game.dots_eaten, "pups_eaten": game.pups_eaten,
+            "master_state": game.governor.master_state,
+            "players": [(p.x, p.y, theta(p.theta), theta(p.want_theta), theta(p.last_theta)) for p in game.players],
+            "ghosts": [(g.x, g.y, theta(g.theta), g.state, g.escaped, game.players.index(g.target_player))
+                       for g in game.ghosts],
+            "dots": sorted((i % game.map.width, i // game.map.width, "d" if tile == DOT else "p")
+                           for i, tile in enumerate(game.grid) if tile in (DOT, PUP))}
+
+
+def check_equivalence(handle, seed, actions, wanted_players=1):
+    '''
+    Step a one-game batch and a headless scalar Game side by side with the same seed and inputs, comparing their full
+    state after every tick
+    :param handle: The map file
+    :param seed: Seed of the batch game
+    :param actions: Per tick, a sequence of one direction per player (see BatchGame.step)
+    :param wanted_players: Number of players
+    :returns: The first tick at which the two differ, or None if they never do
+    '''
+    batch = BatchGame(handle, 1, wanted_players, seeds=[seed])
+
+    # A game's random numbers come from a random.Random seeded with its seed, just like each game of a batch
+    game = Game(handle, wanted_players, headless=True, freeze_ticks=0, clock=TickClock(), seed=seed)
+
+    for tick, action in enumerate(actions):
+        if game.over:
+            break
+
+        for p, a in zip(game.players, action):
+            for key, theta in zip(p.cscheme, (90, 180, 270, 0)):
+                p.keys[key] = a == theta
+
+        game.update()
+        batch.step(np.asarray(action).reshape(1, -1))
+
+        if snapshot(game) != batch.snapshot(0):
+            return tick
+
+    return None
+
+
+def random_actions(seed, ticks, wanted_players=1):
+    '''
+    Random input for check_equivalence. Every player holds a random direction (or no key) from the very first tick,
+    which is also the tick the first level starts on, and now and then switches to another
+    :param seed: Seed for the directions
+    :param ticks: How many ticks of input
+    :param wanted_players: Number of players
+    :returns: A list with a list of one direction per player for every tick
+    '''
+    rng = random.Random(seed)
+    pick = lambda: [rng.choice((0, 90, 180, 270, NONE)) for _ in range(wanted_players)]
+    actions = [pick()]
+
+    for _ in range(ticks - 1):
+        actions.append(pick() if rng.random() < 1 / 32 else actions[-1])
+
+    return actions
+
+
+def greedy_actions(handle, seed, wanted_players=1, levels=1, max_ticks=20000):
+    '''
+    Input for check_equivalence which clears levels: what Greedy bots asked for in a scalar game with the same seed, up
+    to and including the tick the game levels up for the last time
+    :param handle: The map file
+    :param seed: Seed of the game, and of the bots
+    :param wanted_players: Number of players
+    :param levels: How many levels to clear, after the level up on the first tick
+    :param max_ticks: When to give up on the bots clearing them
+    :returns: A list with a list of one direction per player for every tick, or None if the bots didn't clear the
+    levels before the game was over
+    '''
+    bots = [Greedy(random.Random("{}:{}".format(seed, number))) for number in range(wanted_players)]
+    game = Game(handle, wanted_players, headless=True, freeze_ticks=0, clock=TickClock(), seed=seed, record=True,
+                controllers=bots)
+
+    # The first tick starts the first level, see Game.update
+    game.update()
+    last = game.level + levels
+
+    while game.level < last and not game.over and game.clock.ticks < max_ticks:
+        game.update()
+
+    if game.level < last:
+        return None
+
+    actions = []
+
+    for entry in game.log.entries[1:]:
+        (should_update, masks), count = entry
+        directions = [NONE if MASK_DIRECTIONS[mask] is None else MASK_DIRECTIONS[mask] for mask in masks]
+        actions.extend([directions] * count)
+
+    return actions
+
+
+class BatchGame:
+
+    def __init__(self, handle="classic.map", n=1, wanted_players=1, seeds=None, record=False):
+        '''
+        N independent games of one map, stepped together. Unlike Game, nothing here can be drawn
+        :param handle: The map file
+        :param n: Number of games
+        :param wanted_players: Number of players in each game
+        :param seeds: One seed per game for the ghosts' random choices, defaults to 0..n-1
+        :param record: If True, every step's actions are kept so that games can be checked with verify()
+        :returns: Nothing
+        '''
+        self.handle = handle
+        self.n = n
+        self.wanted_players = wanted_players
+        self.seeds = list(range(n)) if seeds is None else list(seeds)
+        self.randoms = [random.Random(s) for s in self.seeds]
+        self.history = [] if record else None
+
+        self.tick = 0
+
+        # Build one throwaway scalar game to read the map, spawns and ghost types from
+        template = Game(handle, wanted_players, headless=True, seed=0)
+
+        self.load_grid(template.map)
+
+        # Dots needed to level up, as in Game.update
+        self.level_dots = template.map.dots
+
+        # Where the tunnel comes out on the right, or None for a map without one, see Entity.update
+        tunnel_column = template.map.tunnel_column
+        self.wrap_x = None if tunnel_column is None else tunnel_column * SUBTILE + HALF_TILE
+
+        self.player_spawns = np.array([[p.x, p.y] for p in template.players], dtype=np.int64)
+        self.ghost_spawns = np.array([[g.x, g.y] for g in template.ghosts], dtype=np.int64)
+        self.ghost_types = [type(g) for g in template.ghosts]
+        self.thresholds = [g.dot_threshold for g in template.ghosts]
+        self.wanderpoints = [g.wanderpoint for g in template.ghosts]
+        self.escape_tiles = [g.escape_tile for g in template.ghosts]
+
+        # Level timings, see levels.py. Phase start times are converted to ticks
+        self.first_levels = np.array(sorted(template.governor.levels))
+        self.level_configs = [template.governor.levels[first] for first in self.first_levels]
+        self.pup_durations = np.array([c.pup_duration for c in self.level_configs]) * CLOCKS_PER_SEC
+        self.flash_durations = np.array([c.flash_duration for c in self.level_configs]) * CLOCKS_PER_SEC
+        self.phase_times = [np.array(c.times) * CLOCKS_PER_SEC for c in self.level_configs]
+        self.phase_states = [np.array([STATES.index(state) for state in c.states]) for c in self.level_configs]
+
+        for t in self.ghost_types:
+            if t not in (Blinky, Pinky, Inky, Clyde):
+                raise NotImplementedError("The batch engine has no targeting rule for {}".format(t.__name__))
+
+        n_players = len(self.player_spawns)
+        n_ghosts = len(self.ghost_spawns)
+
+        # Per game
+        self.score = np.zeros(n, dtype=np.int64)
+        self.lives = np.full(n, 3, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.over = np.zeros(n, dtype=bool)
+        self.total_dots_eaten = np.zeros(n, dtype=np.int64)
+        self.dots_eaten = np.zeros(n, dtype=np.int64)
+        self.pups_eaten = np.zeros(n, dtype=np.int64)
+        self.dots = np.repeat(self.initial_dots[None], n, axis=0)
+
+        # Governor, with times counted in ticks
+        self.start_time = np.zeros(n, dtype=np.int64)
+        self.now = np.zeros(n, dtype=np.int64)
+        self.past = np.zeros(n, dtype=np.int64)
+        self.master_state = np.full(n, IDLE, dtype=np.int64)
+        self.pup_time = np.zeros(n, dtype=np.int64)
+        self.flash_time = np.zeros(n, dtype=np.int64)
+        self.has_pup = np.zeros(n, dtype=bool)
+        self.has_flash = np.zeros(n, dtype=bool)
+
+        # Per game and player
+        self.px = np.zeros((n, n_players), dtype=np.int64)
+        self.py = np.zeros((n, n_players), dtype=np.int64)
+        self.plast_x = np.zeros((n, n_players), dtype=np.int64)
+        self.plast_y = np.zeros((n, n_players), dtype=np.int64)
+        self.ptheta = np.zeros((n, n_players), dtype=np.int64)
+        self.want_theta = np.zeros((n, n_players), dtype=np.int64)
+        self.last_theta = np.zeros((n, n_players), dtype=np.int64)
+
+        # Per game and ghost
+        self.gx = np.zeros((n, n_ghosts), dtype=np.int64)
+        self.gy = np.zeros((n, n_ghosts), dtype=np.int64)
+        self.glast_x = np.zeros((n, n_ghosts), dtype=np.int64)
+        self.glast_y = np.zeros((n, n_ghosts), dtype=np.int64)
+        self.gtheta = np.zeros((n, n_ghosts), dtype=np.int64)
+        self.state = np.zeros((n, n_ghosts), dtype=np.int64)
+        self.pre_state = np.zeros((n, n_ghosts), dtype=np.int64)
+        self.escaped = np.zeros((n, n_ghosts), dtype=bool)
+        self.target_player = np.zeros((n, n_ghosts), dtype=np.int64)
+        self.want_x = np.zeros((n, n_ghosts))
+        self.want_y = np.zeros((n, n_ghosts))
+
+        self.new_round(np.ones(n, dtype=bool))
+
+    def load_grid(self, game_map):
+
+        # The map's flat tables of tile codes and movement masks, as 2D arrays indexed [y, x]
+        self.height = game_map.height
+        self.width = game_map.width
+        table = lambda data: np.frombuffer(bytes(data), dtype=np.uint8).reshape(self.height, self.width)
+
+        self.player_moves = table(game_map.player_moves)
+        self.ghost_moves = table(game_map.ghost_moves)
+
+        tiles = table(game_map.tiles)
+        self.initial_dots = np.where(tiles == DOT, 1, np.where(tiles == PUP, 2, 0)).astype(np.int8)
+
+        # Ghost navigation, see Map.ghost_distances. A distance field is only worked out the first time a ghost heads
+        # for its target, and kept as a row of one uint16 table indexed [row, tile], see field_rows. A field for every
+        # tile up front would be tiles squared, far too much on big maps. The extra column at the end stands for a way
+        # a ghost can't go (-1 in Map.ghost_neighbours)
+        size = self.height * self.width
+        self.game_map = game_map
+        self.nearest_ghost_tile = np.array(game_map.nearest_ghost_tile, dtype=np.int64)
+        self.ghost_neighbours = np.array(game_map.ghost_neighbours, dtype=np.int64).reshape(size, 4)
+        self.ghost_neighbours[self.ghost_neighbours == -1] = size
+
+        # target tile -> row of its field, -1 for none yet. The table grows by doubling, only the first field_count
+        # rows are in use
+        self.field_row = np.full(size, -1, dtype=np.int64)
+        self.fields = np.empty((16, size + 1), dtype=np.uint16)
+        self.field_count = 0
+
+    def field_rows(self, targets):
+        '''
+        The rows of self.fields holding the distance field to each target, working out any which haven't been yet
+        :param targets: Int array of target tile indexes
+        :returns: Int array of rows
+        '''
+        missing = np.unique(targets[self.field_row[targets] == -1])
+
+        if len(missing):
+            size = self.fields.shape[1] - 1
+            needed = self.field_count + len(missing)
+
+            if needed > len(self.fields):
+                fields = np.empty((max(needed, 2 * len(self.fields)), size + 1), dtype=np.uint16)
+                fields[:self.field_count] = self.fields[:self.field_count]
+                self.fields = fields
+
+            for row, target in enumerate(missing, self.field_count):
+                self.fields[row, :size] = np.frombuffer(self.game_map.ghost_distances(int(target)), dtype=np.uint16)
+                self.fields[row, size] = UNREACHABLE
+                self.field_row[target] = row
+
+            self.field_count = needed
+
+        return self.field_row[targets]
+
+    def moves(self, table, tile_y, tile_x, bits):
+
+        # Whether the given OPEN_* bits are set for each tile. bits may be an array, one per game
+        return table[np.clip(tile_y, 0, self.height - 1), np.clip(tile_x, 0, self.width - 1)] & bits != 0
+
+    def new_round(self, mask):
+        '''
+        The equivalent of creating a new Governor: every entity goes back to its spawn and the schedule restarts
+        :param mask: Games to reset
+        :returns: None
+        '''
+        self.start_time[mask] = self.now[mask] = self.tick
+        # Anything before start_time will do, it only has to fall outside every interval
+        self.past[mask] = self.tick - 1
+        self.master_state[mask] = IDLE
+        self.has_pup[mask] = self.has_flash[mask] = False
+
+        self.px[mask] = self.player_spawns[:, 0]
+        self.py[mask] = self.player_spawns[:, 1]
+        self.ptheta[mask] = self.want_theta[mask] = self.last_theta[mask] = NONE
+
+        self.gx[mask] = self.ghost_spawns[:, 0]
+        self.gy[mask] = self.ghost_spawns[:, 1]
+        self.gtheta[mask] = NONE
+        self.state[mask] = IDLE
+        self.pre_state[mask] = NONE
+        self.escaped[mask] = False
+        self.want_x[mask] = self.ghost_spawns[:, 0] / SUBTILE
+        self.want_y[mask] = self.ghost_spawns[:, 1] / SUBTILE
+
+        players = range(self.px.shape[1])
+        for i in np.flatnonzero(mask):
+            for k in range(self.gx.shape[1]):
+                self.target_player[i, k] = self.randoms[i].choice(players)
+
+    def step(self, actions=None):
+        '''
+        Advance every game which isn't over by one tick, the equivalent of Game.update
+        :param actions: Int array of shape (n, players) holding the direction (0, 90, 180 or 270) each player is
+        pressing, or -1 for no key. None means no keys at all
+        :returns: None
+        '''
+        if actions is None:
+            actions = np.full(self.px.shape, NONE, dtype=np.int64)
+        actions = np.asarray(actions)
+
+        if self.history is not None:
+            self.history.append(actions.copy())
+
+        active = ~self.over
+
+        level_up = active & (self.total_dots_eaten % self.level_dots == 0)
+        if level_up.any():
+            self.level[level_up] += 1
+            self.dots[level_up] = self.initial_dots
+            self.new_round(level_up)
+            self.dots_eaten[level_up] = 0
+            self.pups_eaten[level_up] = 0
+
+        self.update_governor(active)
+
+        for j in range(self.px.shape[1]):
+            self.update_player(j, active, actions[:, j])
+            self.eat(j, active)
+
+        # A lost life replaces every entity, after which the rest of that game's ghosts sit the tick out
+        running = active.copy()
+
+        for k in range(self.gx.shape[1]):
+            self.update_ghost(k, running)
+
+            for j in range(self.px.shape[1]):
+                hit = running & self.hits(j, k)
+
+                frightened = hit & ((self.state[:, k] == SCARED) | (self.state[:, k] == FLASHING))
+                self.score[frightened] += 200
+                self.state[frightened, k] = RETREAT
+
+                caught = hit & ~frightened & (self.state[:, k] != RETREAT)
+                if caught.any():
+                    self.lives[caught] -= 1
+                    survived = caught & (self.lives > 0)
+                    self.new_round(survived)
+                    self.dots_eaten[survived] = 0
+                    self.over[caught & ~survived] = True
+                    running &= ~caught
+
+        self.tick += 1
+
+    def hits(self, j, k):
+
+        # Entity.hits, between player j and ghost k of every game
+        same_tile = (self.gx[:, k] // SUBTILE == self.px[:, j] // SUBTILE) & \
+            (self.gy[:, k] // SUBTILE == self.py[:, j] // SUBTILE)
+
+        start_x = self.plast_x[:, j] - self.glast_x[:, k]
+        start_y = self.plast_y[:, j] - self.glast_y[:, k]
+        end_x = self.px[:, j] - self.gx[:, k]
+        end_y = self.py[:, j] - self.gy[:, k]
+
+        return same_tile | ((start_x * end_y == start_y * end_x) & (start_x * end_x + start_y * end_y <= 0))
+
+    def level_index(self):
+
+        # levels.level_for, for every game
+        return np.maximum(np.searchsorted(self.first_levels, self.level, side="right") - 1, 0)
+
+    def into_interval(self, start, stop):
+
+        # Governor.into_interval in ticks: true on the first update which finds the clock inside [start, stop)
+        now = self.now - self.start_time
+        past = self.past - self.start_time
+
+        return (start <= now) & (now < stop) & ~((start <= past) & (past < stop))
+
+    def update_governor(self, mask):
+
+        group = self.level_index()
+        pup_duration = self.pup_durations[group]
+        flash_duration = self.flash_durations[group]
+
+        flash = mask & self.has_pup & self.into_interval(self.pup_time + pup_duration,
+                                                         self.pup_time + pup_duration + CLOCKS_PER_SEC)
+        self.set_ghost_states(flash, FLASHING, break_scared=True, break_wander=False, break_chase=False)
+        self.flash_time[flash] = self.tick - self.start_time[flash]
+        self.has_pup[flash] = False
+        self.has_flash[flash] = True
+
+        unflash = mask & self.has_flash & self.into_interval(self.flash_time + flash_duration,
+                                                             self.flash_time + flash_duration + CLOCKS_PER_SEC)
+        self.set_ghost_states(unflash, self.master_state, break_scared=True, break_wander=False, break_chase=False)
+        self.has_flash[unflash] = False
+
+        # The phase whose start is the latest one at or before the governor's clock, see Governor.update
+        elapsed = self.now - self.start_time
+        for i, (times, states) in enumerate(zip(self.phase_times, self.phase_states)):
+            pending = mask & (group == i)
+            phase = np.searchsorted(times, elapsed, side="right") - 1
+            started = pending & (phase >= 0)
+            self.master_state[started] = states[phase[started]]
+
+        self.set_ghost_states(mask, self.master_state)
+
+        self.past[mask] = self.now[mask]
+        self.now[mask] = self.tick
+
+    def set_ghost_states(self, mask, state, break_scared=False, break_wander=True, break_chase=True):
+
+        # Governor.set_ghost_states, one elif branch at a time. state is either a state or one state per game
+        state = np.broadcast_to(np.asarray(state), mask.shape)[:, None]
+        current = self.state
+        pending = mask[:, None] & (current != ESCAPE) & (current != RETREAT)
+        frightened = (current == SCARED) | (current == FLASHING)
+
+        scare_break = pending & frightened if break_scared else np.zeros_like(pending)
+        pending &= ~scare_break
+
+        reverse = pending & (state == SCARED) & ~frightened & (current != IDLE)
+        pending &= ~reverse
+        self.gtheta[reverse] = np.where(self.gtheta[reverse] < 180, self.gtheta[reverse] + 180,
+                                        self.gtheta[reverse] - 180)
+
+        changed = scare_break | reverse
+        if break_wander:
+            changed |= pending & (current == WANDER)
+        if break_chase:
+            changed |= pending & (current == CHASE)
+
+        current[...] = np.where(changed, state, current)
+
+    def update_player(self, j, mask, keys):
+
+        x = self.px[:, j]
+        y = self.py[:, j]
+        theta = self.ptheta[:, j]
+        want = self.want_theta[:, j]
+        speed = SUBTILE // 20
+
+        # Entity.update
+        if self.wrap_x is not None:
+            wrap_left = mask & (x <= HALF_TILE) & (theta == 180)
+            wrap_right = mask & ~wrap_left & (x >= self.wrap_x) & (theta == 0)
+            x[wrap_left] = self.wrap_x
+            x[wrap_right] = HALF_TILE
+
+        self.plast_x[:, j] = x
+        self.plast_y[:, j] = y
+
+        pressed = mask & (keys != NONE)
+        want[pressed] = keys[pressed]
+
+        temp_theta = theta.copy()
+
+        tile_x = x // SUBTILE
+        tile_y = y // SUBTILE
+        can_right = self.moves(self.player_moves, tile_y, tile_x, OPEN_RIGHT) | (x % SUBTILE < HALF_TILE)
+        can_left = self.moves(self.player_moves, tile_y, tile_x, OPEN_LEFT) | (x % SUBTILE > HALF_TILE)
+        can_up = self.moves(self.player_moves, tile_y, tile_x, OPEN_UP) | (y % SUBTILE < HALF_TILE)
+        can_down = self.moves(self.player_moves, tile_y, tile_x, OPEN_DOWN) | (y % SUBTILE > HALF_TILE)
+
+        moving = mask & (want != NONE)
+
+        # Cornering, see Player.update
+        centred_y = ((theta == 90) & (y % SUBTILE <= HALF_TILE)) | ((theta == 270) & (y % SUBTILE >= HALF_TILE)) | \
+            (theta == NONE)
+        centred_x = ((theta == 0) & (x % SUBTILE <= HALF_TILE)) | ((theta == 180) & (x % SUBTILE >= HALF_TILE)) | \
+            (theta == NONE)
+
+        turn = moving & (want == 0) & can_right & \
+            ((theta == 180) | (self.moves(self.player_moves, tile_y, (x + speed) // SUBTILE, OPEN_RIGHT) & centred_y))
+        turn |= moving & (want == 180) & can_left & \
+            ((theta == 0) | (self.moves(self.player_moves, tile_y, (x - speed) // SUBTILE, OPEN_LEFT) & centred_y))
+        turn |= moving & (want == 90) & can_up & \
+            ((theta == 270) | (self.moves(self.player_moves, (y + speed) // SUBTILE, tile_x, OPEN_UP) & centred_x))
+        turn |= moving & (want == 270) & can_down & \
+            ((theta == 90) | (self.moves(self.player_moves, (y - speed) // SUBTILE, tile_x, OPEN_DOWN) & centred_x))
+        theta[turn] = want[turn]
+
+        x += speed * (moving & (theta == 0) & can_right)
+        x -= speed * (moving & (theta == 180) & can_left)
+        y += speed * (moving & (theta == 90) & can_up)
+        y -= speed * (moving & (theta == 270) & can_down)
+
+        # Mismatch correction
+        last = self.last_theta[:, j]
+        changed = moving & (temp_theta != theta)
+        last[changed] = temp_theta[changed]
+
+        horizontal = moving & ((theta == 90) | (theta == 270)) & ((last == 0) | (last == 180))
+        vertical = moving & ~horizontal & ((theta == 0) | (theta == 180)) & ((last == 90) | (last == 270))
+
+        horizontal &= x % SUBTILE != HALF_TILE
+        vertical &= y % SUBTILE != HALF_TILE
+        x += speed * horizontal * np.where(last == 0, 1, -1)
+        y += speed * vertical * np.where(last == 90, 1, -1)
+
+    def eat(self, j, mask):
+
+        games = np.flatnonzero(mask)
+        tile_y, tile_x = self.py[games, j] // SUBTILE, self.px[games, j] // SUBTILE
+        tile = self.dots[games, tile_y, tile_x]
+        self.dots[games, tile_y, tile_x] = 0
+
+        dot = games[tile == 1]
+        self.score[dot] += 10
+        self.dots_eaten[dot] += 1
+        self.total_dots_eaten[dot] += 1
+
+        pup = games[tile == 2]
+        self.score[pup] += 50
+        self.pups_eaten[pup] += 1
+
+        # Governor.fire_pup
+        fired = np.zeros(self.n, dtype=bool)
+        fired[pup] = True
+        self.pup_time[fired] = self.tick - self.start_time[fired]
+        self.has_pup[fired] = True
+        self.set_ghost_states(fired, SCARED)
+
+    def target(self, k, mask):
+        '''
+        The chase target of ghost k in every game, see the target methods in ghosts.py
+        :returns: Arrays of target x and y, in tiles
+        '''
+        ghost_type = self.ghost_types[k]
+        games = np.arange(self.n)
+        player = self.target_player[:, k]
+        tx = self.px[games, player] / SUBTILE
+        ty = self.py[games, player] / SUBTILE
+        ttheta = self.ptheta[games, player]
+
+        if ghost_type is Blinky:
+            return tx, ty
+
+        elif ghost_type is Clyde:
+            near = (self.gx[:, k] - self.px[games, player]) ** 2 + (self.gy[:, k] - self.py[games, player]) ** 2 \
+                <= 64 * SUBTILE * SUBTILE
+            return np.where(near, 30, self.wanderpoints[k][0]), np.where(near, -1, self.wanderpoints[k][1])
+
+        reach = 4 if ghost_type is Pinky else 2
+        cos_theta = np.select([ttheta == t for t in DIRECTIONS], [COS[t] for t in DIRECTIONS])
+        sin_theta = np.select([ttheta == t for t in DIRECTIONS], [SIN[t] for t in DIRECTIONS])
+        x1 = tx + reach * cos_theta
+        y1 = ty + reach * sin_theta
+
+        if ghost_type is Inky:
+            blinky_x = self.gx[:, 0] / SUBTILE
+            blinky_y = self.gy[:, 0] / SUBTILE
+            x1 = blinky_x + 2 * (x1 - blinky_x)
+            y1 = blinky_y + 2 * (y1 - blinky_y)
+
+        # A player which hasn't moved yet has no direction to look ahead in
+        still = ttheta == NONE
+        return np.where(still, self.wanderpoints[k][0], x1), np.where(still, self.wanderpoints[k][1], y1)
+
+    def update_ghost(self, k, mask):
+
+        x = self.gx[:, k]
+        y = self.gy[:, k]
+        theta = self.gtheta[:, k]
+        state = self.state[:, k]
+
+        # Entity.update
+        if self.wrap_x is not None:
+            wrap_left = mask & (x <= HALF_TILE) & (theta == 180)
+            wrap_right = mask & ~wrap_left & (x >= self.wrap_x) & (theta == 0)
+            x[wrap_left] = self.wrap_x
+            x[wrap_right] = HALF_TILE
+
+        self.glast_x[:, k] = x
+        self.glast_y[:, k] = y
+
+        state[mask & ~self.escaped[:, k] & (self.dots_eaten >= self.thresholds[k])] = ESCAPE
+
+        mask = mask & (state != IDLE)
+
+        escape_x, escape_y = self.escape_tiles[k]
+        at_escape = (x * 2 == escape_x * 2 * SUBTILE) & (y * 2 == escape_y * 2 * SUBTILE)
+
+        homing = mask & ((state == ESCAPE) | (state == RETREAT))
+        self.want_x[homing, k] = escape_x
+        self.want_y[homing, k] = escape_y
+
+        escaped = mask & (state == ESCAPE) & ~self.escaped[:, k] & at_escape
+        self.escaped[escaped, k] = True
+        state[escaped | (mask & (state == RETREAT) & at_escape)] = WANDER
+
+        chase = mask & (state == CHASE)
+        if chase.any():
+            target_x, target_y = self.target(k, chase)
+            self.want_x[chase, k] = target_x[chase]
+            self.want_y[chase, k] = target_y[chase]
+
+        wander = mask & (state == WANDER)
+        self.want_x[wander, k] = self.wanderpoints[k][0]
+        self.want_y[wander, k] = self.wanderpoints[k][1]
+
+        pre_state = self.pre_state[:, k]
+        panicking = mask & ((state == SCARED) | (state == FLASHING))
+        retarget = mask & ((pre_state == FLASHING) | (pre_state == SCARED) | ((pre_state == RETREAT) &
+                                                                               (state != pre_state)))
+        players = range(self.px.shape[1])
+
+        # Ghost.panic and the choice of target player, in the same order as Ghost.update draws them
+        for i in np.flatnonzero(panicking | retarget):
+            rng = self.randoms[i]
+            if panicking[i]:
+                self.want_x[i, k] = rng.randint(0, 32)
+                self.want_y[i, k] = rng.randint(0, 31)
+            if retarget[i]:
+                self.target_player[i, k] = rng.choice(players)
+
+        speed = np.where(mask, GHOST_SPEEDS[state], 1)
+        x -= x % speed
+        y -= y % speed
+
+        self.update_pos(k, mask, speed)
+
+        pre_state[mask] = state[mask]
+
+    def update_pos(self, k, mask, speed):
+
+        x = self.gx[:, k]
+        y = self.gy[:, k]
+        theta = self.gtheta[:, k]
+
+        tile_x = x // SUBTILE
+        tile_y = y // SUBTILE
+        offset_x = x % SUBTILE
+        offset_y = y % SUBTILE
+        centred_x = offset_x == HALF_TILE
+        centred_y = offset_y == HALF_TILE
+
+        # See Ghost.update_movement_possibilities
+        can_up = centred_x & (theta != 270) & \
+            self.moves(self.ghost_moves, tile_y, tile_x, np.where(offset_y >= HALF_TILE, OPEN_UP, OPEN_SELF))
+        can_left = centred_y & (theta != 0) & \
+            self.moves(self.ghost_moves, tile_y, tile_x, np.where(offset_x <= HALF_TILE, OPEN_LEFT, OPEN_SELF))
+        can_down = centred_x & (theta != 90) & \
+            self.moves(self.ghost_moves, tile_y, tile_x, np.where(offset_y <= HALF_TILE, OPEN_DOWN, OPEN_FLOOR))
+        can_right = centred_y & (theta != 180) & \
+            self.moves(self.ghost_moves, tile_y, tile_x, np.where(offset_x >= HALF_TILE, OPEN_RIGHT, OPEN_SELF))
+
+        # Ghost.update_pos: the allowed direction leading to the tile closest to the setpoint, preferring up, left,
+        # down, right on ties
+        target_x = np.clip(np.floor(self.want_x[:, k]).astype(np.int64), 0, self.width - 1)
+        target_y = np.clip(np.floor(self.want_y[:, k]).astype(np.int64), 0, self.height - 1)
+        target = self.nearest_ghost_tile[target_y * self.width + target_x]
+        neighbours = self.ghost_neighbours[np.clip(tile_y, 0, self.height - 1) * self.width +
+                                           np.clip(tile_x, 0, self.width - 1)]
+
+        allowed = np.stack([can_up, can_left, can_down, can_right], axis=1)
+        rows = self.field_rows(target)
+        distances = np.where(allowed, self.fields[rows[:, None], neighbours].astype(np.int64), UNREACHABLE + 1)
+        choice = np.argmin(distances, axis=1)
+
+        turn = mask & allowed.any(axis=1)
+        theta[turn] = np.array([90, 180, 270, 0])[choice[turn]]
+
+        x += mask * speed * np.where(theta == 0, 1, np.where(theta == 180, -1, 0))
+        y += mask * speed * np.where(theta == 90, 1, np.where(theta == 270, -1, 0))
+
+    def snapshot(self, i):
+        '''
+        Capture the state of game i in the same form as snapshot(game)
+        :param i: Index of the game
+        :returns: A dict which compares equal to the snapshot of an equivalent scalar game
+        '''
+        dots = self.dots[i]
+        tiles = {1: "d", 2: "p"}
+
+        return {"score": int(self.score[i]), "lives": int(self.lives[i]), "level": int(self.level[i]),
+                "over": bool(self.over[i]), "total_dots_eaten": int(self.total_dots_eaten[i]),
+                "dots_eaten": int(self.dots_eaten[i]), "pups_eaten": int(self.pups_eaten[i]),
+                "master_state": STATES[self.master_state[i]],
+                "players": [(int(self.px[i, j]), int(self.py[i, j]), int(self.ptheta[i, j]),
+                             int(self.want_theta[i, j]), int(self.last_theta[i, j])) for j in range(self.px.shape[1])],
+                "ghosts": [(int(self.gx[i, k]), int(self.gy[i, k]), int(self.gtheta[i, k]), STATES[self.state[i, k]],
+                            bool(self.escaped[i, k]), int(self.target_player[i, k])) for k in range(self.gx.shape[1])],
+                "dots": sorted((int(x), int(y), tiles[dots[y, x]]) for y, x in zip(*np.nonzero(dots)))}
+
+    def verify(self, i):
+        '''
+        Replay game i through the scalar implementation with the recorded inputs. Needs record=True
+        :param i: Index of the game
+        :returns: The first tick at which game i differs from the scalar implementation, or None
+        '''
+        actions = [a[i] for a in self.history]
+        diverged = check_equivalence(self.handle, self.seeds[i], actions, self.wanted_players)
+
+        if diverged is not None:
+            return diverged
+
+        # The replay uses a one-game batch, so also make sure game i itself ended up in the same place
+        replay = BatchGame(self.handle, 1, self.wanted_players, seeds=[self.seeds[i]])
+        for a in actions:
+            if replay.over[0]:
+                break
+            replay.step(np.asarray(a).reshape(1, -1))
+
+        return None if replay.snapshot(0) == self.snapshot(i) else len(actions)
+
+
+if __name__ == "__main__":
+
+    # Checks the batch engine against the scalar one, with random input from the very first tick and with bots' input
+    # which clears a level. Exits with status 1 if any game diverges
+    parser = ArgumentParser(description="Check BatchGame against the scalar Game")
+    parser.add_argument("--map", default="classic.map")
+    parser.add_argument("--seeds", type=int, default=4, help="games to check for each number of players")
+    parser.add_argument("--ticks", type=int, default=2000, help="ticks of random input for each game")
+    parser.add_argument("--max-players", type=int, default=2)
+    args = parser.parse_args()
+
+    failures = 0
+
+    def check(name, seed, players, actions):
+
+        global failures
+
+        diverged = check_equivalence(args.map, seed, actions, players)
+        failures += diverged is not None
+
+        print("{:<6} seed {} players {} {} ticks: {}".format(name, seed, players, len(actions), "ok" if diverged is None
+                                                             else "diverged at tick {}".format(diverged)))
+
+    for players in range(1, args.max_players + 1):
+        for seed in range(args.seeds):
+            check("random", seed, players, random_actions(seed, args.ticks, players))
+
+        # Greedy bots don't get through a level in every game, so seeds are tried in turn until enough games have had
+        # a level up after the first
+        cleared = 0
+
+        for seed in range(10 * args.seeds):
+            actions = greedy_actions(args.map, seed, players)
+
+            if actions is not None:
+                check("greedy", seed, players, actions)
+                cleared += 1
+
+            if cleared == args.seeds:
+                break
+        else:
+            print("greedy players {}: only {} of {} games cleared a level".format(players, cleared, args.seeds))
+            failures += 1
+
+    sys.exit(1 if failures else 0)
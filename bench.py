@@ -0,0 +1,258 @@
+__author__ = 'anish'
+
+# Benchmarks for the hot paths: ticks per second of Game.update, how long it takes to load a map and build what it's
+# drawn from, how long draw_map takes a frame and how long a Governor takes to make. Each is run on the classic map and
+# on generated maps of a few sizes (see mapgen.py), with fixed seeds and scripted input, so two runs on the same machine
+# do exactly the same work.
+#
+# Results are printed as JSON. --save writes them to a baseline file, and --compare checks a run against it and exits
+# with status 1 if anything got slower by more than the tolerance:
+#
+#   python bench.py --save                  # on master
+#   python bench.py --compare               # on a branch
+#
+# Rendering benchmarks need pyglet and a display. Without them they're skipped, and the rest still run
+
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+from argparse import ArgumentParser
+from time import perf_counter
+
+import mapgen
+from game import Game
+from gamemap import Map
+from governor import Governor
+
+BASELINE = "bench_baseline.json"
+
+# Sizes of the generated maps benchmarked by default, in tiles
+SIZES = ((100, 100), (300, 300))
+
+# Seed for the generated maps, the ghosts and the scripted input
+SEED = 0
+
+# How much worse than the baseline a result can be before --compare calls it a regression, as a fraction
+TOLERANCE = 0.1
+
+
+def best_of(function, repeats, number=1):
+    '''
+    Time a function, taking the fastest of several runs since anything slower was slowed down by something else
+    :param function: What to time, called with no arguments
+    :param repeats: How many times to time it
+    :param number: How many times to call it for each timing
+    :returns: The fastest time for a single call, in seconds
+    '''
+    best = None
+
+    for _ in range(repeats):
+        start = perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = (perf_counter() - start) / number
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def script(players, ticks, seed=SEED):
+    '''
+    Scripted input: every tick each player has a small chance of switching to a random direction
+    :returns: A list with an entry for every tick, of (player number, index into its control scheme) pairs
+    '''
+    rng = random.Random(seed)
+    return [[(n, rng.randrange(4)) for n in range(players) if rng.random() < 0.05] for _ in range(ticks)]
+
+
+def play(game, presses):
+    '''
+    Update a game once for every tick of a script, starting a new game whenever the last one ends
+    :returns: Nothing
+    '''
+    # Reseeding and restarting the clock makes every run play out exactly as a new Game(seed=SEED) would, see
+    # Environment.reset
+    game.random.seed(SEED)
+    game.clock.ticks = 0
+    game.reset()
+
+    for tick in presses:
+        for n, direction in tick:
+            player = game.players[n]
+
+            for k in player.cscheme:
+                player.keys[k] = False
+            player.keys[player.cscheme[direction]] = True
+
+        game.update()
+
+        if game.over:
+            game.reset()
+
+
+def bench_simulation(name, handle, results, ticks, repeats):
+
+    # Map loading skips the cache, so every call parses and compiles the map
+    results[name + ".map_load"] = (best_of(lambda: Map(handle), max(1, repeats // 2)) * 1000, "ms", "lower")
+
+    for players in (1, 2):
+        game = Game(handle, wanted_players=players, headless=True, seed=SEED)
+        presses = script(players, ticks)
+
+        # One untimed run first, since ghosts work out the distance fields they need the first time they need them
+        play(game, presses)
+        results["{}.update_{}p".format(name, players)] = (ticks / best_of(lambda: play(game, presses), repeats),
+                                                          "ticks/s", "higher")
+
+    results[name + ".governor"] = (best_of(lambda: Governor(game), repeats, 10) * 1000, "ms", "lower")
+
+
+def bench_rendering(name, handle, results, frames, repeats, window):
+
+    from pyglet.gl import glFinish
+
+    window.switch_to()
+    game = Game(handle, wanted_players=1, seed=SEED)
+
+    def static_map():
+        game.line_points = []
+        game.circle_points = []
+        game.calculate_static_map()
+
+    def init_buffers():
+        game.graphics_group.delete_vbo(game.line_vbo)
+        game.graphics_group.delete_vbo(game.circle_vbo)
+        for buffer in game.dot_buffers.values():
+            buffer.delete()
+
+        game.init_buffers()
+        glFinish()
+
+    def draw_map():
+        for _ in range(frames):
+            window.clear()
+            game.draw_map()
+            glFinish()
+
+    results[name + ".static_map"] = (best_of(static_map, repeats) * 1000, "ms", "lower")
+    results[name + ".init_buffers"] = (best_of(init_buffers, repeats) * 1000, "ms", "lower")
+    results[name + ".draw_map"] = (best_of(draw_map, repeats) / frames * 1000, "ms", "lower")
+
+    game.delete()
+
+
+def run(sizes=SIZES, ticks=5000, frames=100, repeats=5, render=True):
+    '''
+    Run every benchmark
+    :param sizes: (width, height) of each generated map to run them on, as well as the classic map
+    :param ticks: Ticks of Game.update per timing
+    :param frames: Frames of draw_map per timing
+    :param repeats: How many times each benchmark is timed, the fastest time is the one kept
+    :param render: Whether to run the rendering benchmarks
+    :returns: A dict of benchmark name -> {"value": ..., "unit": ..., "better": "higher" or "lower"}, and a list of
+    anything skipped and why
+    '''
+    maps = [("classic", "classic.map")]
+    directory = tempfile.mkdtemp()
+
+    for width, height in sizes:
+        handle = os.path.join(directory, "{}x{}.map".format(width, height))
+        mapgen.write_map(handle, width, height, SEED)
+        maps.append(("gen{}x{}".format(width, height), handle))
+
+    results = {}
+    skipped = []
+
+    for name, handle in maps:
+        bench_simulation(name, handle, results, ticks, repeats)
+
+    window = None
+    if render:
+        try:
+            import pyglet
+            from pyglet.gl import glEnableClientState, glLineWidth, GL_VERTEX_ARRAY
+            window = pyglet.window.Window(visible=False)
+            glLineWidth(4)
+            glEnableClientState(GL_VERTEX_ARRAY)
+        except Exception as e:
+            skipped.append("rendering: {}".format(e))
+
+    if window is not None:
+        for name, handle in maps:
+            bench_rendering(name, handle, results, frames, repeats, window)
+        window.close()
+
+    for name, handle in maps[1:]:
+        os.remove(handle)
+    os.rmdir(directory)
+
+    return {name: {"value": value, "unit": unit, "better": better}
+            for name, (value, unit, better) in sorted(results.items())}, skipped
+
+
+def machine():
+
+    # What the results were measured on, since they're only comparable with results from the same machine
+    return {"platform": platform.platform(), "processor": platform.processor(), "python": platform.python_version()}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    '''
+    Compare results with a baseline
+    :param tolerance: How much worse a result can be before it's a regression, as a fraction of the baseline
+    :returns: A list of (name, baseline value, value, change as a fraction, whether it's a regression), for every
+    benchmark in both. A positive change is always an improvement
+    '''
+    rows = []
+
+    for name in sorted(set(results) & set(baseline)):
+        old, new = baseline[name]["value"], results[name]["value"]
+        change = (new - old) / old if results[name]["better"] == "higher" else (old - new) / old
+        rows.append((name, old, new, change, change < -tolerance))
+
+    return rows
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Benchmark the simulation, map loading and rendering")
+    parser.add_argument("--sizes", nargs="*", default=["{}x{}".format(*size) for size in SIZES],
+                        help="generated map sizes, e.g. 100x100 1000x1000")
+    parser.add_argument("--ticks", type=int, default=5000, help="ticks of Game.update per timing")
+    parser.add_argument("--frames", type=int, default=100, help="frames of draw_map per timing")
+    parser.add_argument("--repeats", type=int, default=5, help="timings of each benchmark, the fastest is kept")
+    parser.add_argument("--no-render", action="store_true", help="skip the rendering benchmarks")
+    parser.add_argument("--baseline", default=BASELINE, help="the baseline file")
+    parser.add_argument("--save", action="store_true", help="write the results to the baseline file")
+    parser.add_argument("--compare", action="store_true", help="compare the results with the baseline file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="fraction slower that counts as a regression")
+    args = parser.parse_args()
+
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes]
+    results, skipped = run(sizes, args.ticks, args.frames, args.repeats, not args.no_render)
+
+    report = {"machine": machine(), "results": results, "skipped": skipped}
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+        rows = compare(results, baseline, args.tolerance)
+
+        for name, old, new, change, regression in rows:
+            print("{:<28} {:>12.3f} {:>12.3f} {:>+8.1%}{}".format(name, old, new, change, "  REGRESSION" * regression),
+                  file=sys.stderr)
+
+        sys.exit(1 if any(regression for *row, regression in rows) else 0)
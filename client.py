@@ -0,0 +1,200 @@
+__author__ = 'anish'
+
+# A window onto a game running on a server, see server.py. The client never updates its game, it only moves the
+# entities to where the server says they are and draws them with the same code as a local game. Either control scheme
+# steers the client's one player
+#
+#   python client.py --host 127.0.0.1 --port 5555
+#
+# DEPENDS Pyglet
+
+import socket
+from argparse import ArgumentParser
+from time import perf_counter
+
+import pyglet
+from pyglet.gl import *
+from common import *
+from controls import Keyboard
+from game import Game
+from protocol import *
+
+
+class Client(pyglet.window.Window):
+
+    def __init__(self, width, length, host, port, handle=None):
+
+        super().__init__(width, length)
+
+        self.keyboard = Keyboard()
+        self.push_handlers(self.keyboard)
+
+        self.connection = socket.create_connection((host, port))
+        join = {"type": "join"} if handle is None else {"type": "join", "map": handle}
+        self.connection.sendall(encode(join))
+
+        # The welcome is read before anything else so the game can be made, after that the socket never blocks
+        self.buffer = b""
+        messages = self.receive(block=True)
+
+        if not messages:
+            self.connection.close()
+            raise ConnectionError("The server closed the connection before the game started")
+
+        welcome = messages[0]
+        self.connection.setblocking(False)
+
+        # Messages the socket hasn't taken yet, which are sent on a later update, see send
+        self.outgoing = bytearray()
+
+        self.player = welcome["player"]
+        self.game = Game(welcome["map"], wanted_players=self.player + 1, xoff=0, yoff=100)
+        self.replica = Replica()
+
+        # Sent again whenever it changes or another tick has been received
+        self.direction = None
+        self.ack = None
+
+        # When the last state arrived, so entities can be drawn partway to the next one
+        self.received = perf_counter()
+
+        glLineWidth(4)
+        glClearColor(0, 0, 0, 1)
+        glClear(GL_COLOR_BUFFER_BIT)
+        glEnableClientState(GL_VERTEX_ARRAY)
+
+    def receive(self, block=False):
+        '''
+        Every complete message which has arrived
+        :param block: Wait for at least one
+        :returns: A list of messages
+        '''
+        while True:
+            try:
+                data = self.connection.recv(1 << 16)
+            except BlockingIOError:
+                data = None
+
+            if data == b"":
+                pyglet.app.exit()
+                return []
+
+            if data:
+                self.buffer += data
+
+            *lines, self.buffer = self.buffer.split(b"\n")
+
+            if lines or not block:
+                return [decode(line) for line in lines]
+
+    def send(self, message):
+        '''
+        Send a message to the server. The socket doesn't block, so if it won't take all of it now, the rest waits for
+        the next flush
+        :param message: The message, see protocol.py
+        :returns: None
+        '''
+        self.outgoing += encode(message)
+        self.flush()
+
+    def flush(self):
+
+        # Send as much of what's waiting as the socket will take
+        while self.outgoing:
+            try:
+                sent = self.connection.send(self.outgoing)
+            except BlockingIOError:
+                return None
+
+            del self.outgoing[:sent]
+
+    def update(self, dt):
+
+        self.flush()
+
+        keys = self.keyboard.snapshot()
+
+        direction = None
+        for cscheme in CONTROL_SCHEMES.values():
+            for theta, index in DIRECTION_KEYS.items():
+                if keys[cscheme[index]]:
+                    direction = theta
+
+        for message in self.receive():
+            if message["type"] == "state":
+                self.apply(message)
+
+        if direction != self.direction or self.replica.tick != self.ack:
+            self.direction = direction
+            self.ack = self.replica.tick
+            self.send({"type": "input", "direction": direction, "ack": self.ack})
+
+    def apply(self, message):
+
+        result = self.replica.apply(message)
+
+        # Without the state the message was a delta from, the next best thing is to ask for everything
+        if result is None:
+            self.replica.tick = None
+            return None
+
+        eaten, reset = result
+        game = self.game
+        replica = self.replica
+
+        # The server starts a new game when players join or leave
+        if len(game.players) != len(replica.players):
+            game.reset(len(replica.players))
+            reset = True
+
+        if reset:
+            game.reset_dots()
+            eaten = replica.eaten
+
+        for index in eaten:
+            tile = game.grid[index]
+            game.grid[index] = EMPTY
+
+            if tile in game.dot_buffers:
+                game.dot_buffers[tile].remove(index)
+
+        for entity, state in zip(game.players + game.ghosts, replica.players + replica.ghosts):
+            entity.last_x, entity.last_y = entity.x, entity.y
+            entity.x, entity.y, entity.theta = state[:3]
+
+            if len(state) > 3:
+                entity.state = state[3]
+
+        game.score, game.lives, game.level = replica.score, replica.lives, replica.level
+        game.lives_label.text = "Lives" + str(game.lives)
+        game.score_label.text = "Score:" + str(game.score)
+        game.moved = True
+
+        self.received = perf_counter()
+
+    def on_draw(self):
+
+        self.clear()
+        self.game.draw(min((perf_counter() - self.received) * CLOCKS_PER_SEC, 1))
+
+    def on_close(self):
+
+        self.connection.close()
+        self.game.delete()
+        super().on_close()
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Play on a multiplayer server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--map", default=None, help="the map to play on, if the server has more than one")
+    args = parser.parse_args()
+
+    client = Client(28 * GRID_DIM, 29 * GRID_DIM + 100, args.host, args.port, args.map)
+
+    pyglet.clock.schedule(client.update)
+    pyglet.clock.set_fps_limit(60)
+
+    pyglet.app.run()
@@ -0,0 +1,38 @@
+__author__ = 'anish'
+
+# Clocks the Governor can time ghost phases and power-ups with. Both have the same two methods: time() returns the
+# current time in seconds, and tick() is called by Game once at the end of every update that actually ran
+
+from time import time
+from common import *
+
+
+class TickClock:
+
+    # Simulation time: CLOCKS_PER_SEC ticks make a second, however fast or slow the game is really being updated. This
+    # makes a game deterministic, and lets headless games run far faster than real time with the same phase timings
+
+    def __init__(self):
+
+        self.ticks = 0
+
+    def tick(self):
+
+        self.ticks += 1
+
+    def time(self):
+
+        return self.ticks / CLOCKS_PER_SEC
+
+
+class WallClock:
+
+    # Real time, which is how the Governor used to be timed. Phases then depend on how fast the game is updated
+
+    def tick(self):
+
+        pass
+
+    def time(self):
+
+        return time()
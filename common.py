@@ -5,8 +5,36 @@ from math import sin as s, cos as c, radians
 
 # Number of times to update per second
 CLOCKS_PER_SEC = 64
+# Number of ticks the game freezes for after a level is cleared or a life is lost
+FREEZE_TICKS = 3 * CLOCKS_PER_SEC
 # Square width in the grid
 GRID_DIM = 24
+# Entity positions and speeds are integers counted in 1/SUBTILE of a tile. Every speed in the game is a whole number of
+# these units, so movement stays exact without the cost of Fraction arithmetic
+SUBTILE = 40
+HALF_TILE = SUBTILE // 2
+
+# Tile codes in a game's grid, see gamemap.py. TILE_CODES maps the letters used in map files to them
+EMPTY, WALL, DOT, PUP, GATE, TUNNEL = range(6)
+TILE_CODES = {"e": EMPTY, "b": WALL, "d": DOT, "p": PUP, "g": GATE, "w": TUNNEL}
+
+# Bits of a tile's movement mask, set when an entity on that tile may move that way. OPEN_SELF and OPEN_FLOOR say
+# whether the tile itself is not a wall, and neither a wall nor a gate, which ghosts need when they're off centre
+OPEN_UP, OPEN_LEFT, OPEN_DOWN, OPEN_RIGHT, OPEN_SELF, OPEN_FLOOR = 1, 2, 4, 8, 16, 32
+
+# Unit steps (dx, dy) for each direction an entity can face
+DIRECTIONS = {0: (1, 0), 90: (0, 1), 180: (-1, 0), 270: (0, -1)}
+
+# Control schemes in the order up, left, down, right. These are pyglet's key symbols (W, A, S, D and the arrow keys),
+# written out here so that players can be created without importing pyglet.window, which needs a display
+CONTROL_SCHEMES = {1: [0x077, 0x061, 0x073, 0x064],
+                   2: [0xff52, 0xff51, 0xff54, 0xff53]}
+
+# The key mask (see Player.key_mask) for each direction a player can want, None being no key at all. MASK_DIRECTIONS
+# goes the other way, and with more than one key down up wins, then left, down and right
+DIRECTION_MASKS = {None: 0, 90: 1, 180: 2, 270: 4, 0: 8}
+MASK_DIRECTIONS = tuple(90 if mask & 1 else 180 if mask & 2 else 270 if mask & 4 else 0 if mask & 8 else None
+                        for mask in range(16))
 
 # sin of an angle in degrees since default sin is in radians
 def sin(degrees):
@@ -15,4 +43,4 @@ def sin(degrees):
 
 # cos of an angle in degrees, since default cos is in radians
 def cos(degrees):
-    return c(radians(degrees))
\ No newline at end of file
+    return c(radians(degrees))
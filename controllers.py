@@ -0,0 +1,338 @@
+__author__ = 'anish'
+
+# What steers a player. Every tick, before anything moves, Game.update asks each player's controller which way the
+# player wants to go (see Player.read_input), and Player.update turns that way when it can. A controller is anything
+# with a direction(player) method returning 0, 90, 180, 270 or None for no input:
+#
+#   Keys     the player's keys against its control scheme, which is what players without a controller get. The driver
+#            gives players a snapshot of the keyboard, see controls.py
+#   Remote   whatever direction was last set on it, for input from somewhere else: a network client, an agent
+#   Script   a recorded list of directions, played back one tick at a time
+#   Bots     Idle, Wander and Greedy, which decide for themselves from the game and its Maze
+#
+# Controllers are handed to a game by player number, Game(controllers=[...]). Players are made again every time a life
+# is lost, and each new one picks up the controller for its number, so a controller lasts the whole game. Nothing here
+# touches pyglet, so bots can play as many headless games at once as the machine can run
+#
+# Bots share what they know about a map through its Maze, which is worked out once per map: where a player can go from
+# each tile, and distance fields over those moves. One field serves every bot that needs it, however many there are
+
+import random
+from array import array
+from copy import copy
+from weakref import WeakKeyDictionary
+from common import *
+
+# The OPEN_* bit of each direction
+OPENINGS = {90: OPEN_UP, 180: OPEN_LEFT, 270: OPEN_DOWN, 0: OPEN_RIGHT}
+
+# Distance to a tile a player can't get to at all
+UNREACHABLE = 0xFFFF
+
+
+class Controller:
+
+    # Never asks to go anywhere. Subclasses override direction
+
+    def direction(self, player):
+        '''
+        :param player: The player being steered, which has the game it's in as player.game
+        :returns: The direction the player wants to go in, or None for no input this tick
+        '''
+        return None
+
+
+class Keys(Controller):
+
+    # The keys in the player's own keys, which the driver, server or a script fills in
+
+    def direction(self, player):
+
+        return MASK_DIRECTIONS[player.key_mask()]
+
+
+# Keys doesn't keep anything of its own, so every player can share one
+KEYS = Keys()
+
+
+class Remote(Controller):
+
+    # Set want from outside whenever the input changes, it's held until it's set again
+
+    def __init__(self, want=None):
+
+        self.want = want
+
+    def direction(self, player):
+
+        return self.want
+
+
+class Script(Controller):
+
+    def __init__(self, runs, repeat=False):
+        '''
+        Directions recorded beforehand, one for every tick
+        :param runs: (direction, ticks) pairs, each holding a direction for that many ticks in a row
+        :param repeat: Start again from the top at the end. Otherwise there's no input once the script runs out
+        :returns: Nothing
+        '''
+        self.runs = list(runs)
+        self.repeat = repeat
+
+        # Which run is playing, and how many ticks of it have been played
+        self.run = 0
+        self.ticks = 0
+
+    @classmethod
+    def from_log(cls, log, number):
+        '''
+        One player's input from an input log (see replay.py), up to the first time the game was reset or loaded
+        :param log: The InputLog
+        :param number: The player's index, from 0
+        :returns: The Script
+        '''
+        runs = []
+
+        for entry in log.entries[1:]:
+            if entry[0] in ("reset", "load"):
+                break
+
+            (should_update, masks), count = entry
+            runs.append((MASK_DIRECTIONS[masks[number]] if number < len(masks) else None, count))
+
+        return cls(runs)
+
+    def direction(self, player):
+
+        if self.run == len(self.runs) and self.repeat:
+            self.run = 0
+
+        if self.run == len(self.runs):
+            return None
+
+        direction, ticks = self.runs[self.run]
+        self.ticks += 1
+
+        if self.ticks >= ticks:
+            self.run += 1
+            self.ticks = 0
+
+        return direction
+
+
+class Maze:
+
+    # The parts of a map bots find their way with. Use Maze.of rather than making one, so every bot on a map shares it
+
+    def __init__(self, game_map):
+
+        self.map = game_map
+        self.width = game_map.width
+        self.height = game_map.height
+
+        # neighbours[index] is the (direction, tile) of every way a player can go from the centre of the tile at index
+        self.neighbours = []
+
+        for index in range(len(game_map.tiles)):
+            x, y = index % self.width, index // self.width
+            self.neighbours.append(tuple((theta, (y + dy) * self.width + x + dx)
+                                         for theta, (dx, dy) in DIRECTIONS.items()
+                                         if game_map.player_moves[index] & OPENINGS[theta] and
+                                         0 <= x + dx < self.width and 0 <= y + dy < self.height))
+
+        # sources[index] lists the tiles a player can get to index from, for searching backwards out from a target
+        self.sources = [[] for _ in game_map.tiles]
+
+        for index, neighbours in enumerate(self.neighbours):
+            for theta, neighbour in neighbours:
+                self.sources[neighbour].append(index)
+
+        # Fields to single tiles, by tile, and the field to each game's food, by game, see food. Games on the same map
+        # share the Maze but each keep their own food field, which goes when the game does
+        self._distances = {}
+        self._food = WeakKeyDictionary()
+
+    @staticmethod
+    def of(game_map):
+        '''
+        The Maze of a map, made the first time it's asked for and kept with the map
+        :param game_map: The Map
+        :returns: The Maze
+        '''
+        if game_map.maze is None:
+            game_map.maze = Maze(game_map)
+
+        return game_map.maze
+
+    def tile(self, entity):
+
+        return entity.y // SUBTILE * self.width + entity.x // SUBTILE
+
+    def field(self, targets):
+        '''
+        How many steps a player is from the nearest of some tiles, from every tile, found by a breadth first search
+        backwards out from all of them at once
+        :param targets: Tile indexes
+        :returns: An array of distances indexed by tile, UNREACHABLE where none of targets can be reached from
+        '''
+        distances = array("H", [UNREACHABLE]) * len(self.neighbours)
+        frontier = list(targets)
+
+        for index in frontier:
+            distances[index] = 0
+
+        while frontier:
+            next_frontier = []
+
+            for index in frontier:
+                distance = distances[index] + 1
+
+                for source in self.sources[index]:
+                    if distances[source] == UNREACHABLE:
+                        distances[source] = distance
+                        next_frontier.append(source)
+
+            frontier = next_frontier
+
+        return distances
+
+    def distances(self, target):
+        '''
+        The field to one tile, worked out the first time any bot asks for it and then kept
+        :param target: The tile's index
+        :returns: The field, see field
+        '''
+        if target not in self._distances:
+            self._distances[target] = self.field((target,))
+
+        return self._distances[target]
+
+    def food(self, game):
+        '''
+        The field to the nearest food left in a game. It's only worked out again once the food has changed, so every
+        bot in a game shares it
+        :param game: The game
+        :returns: The field, see field
+        '''
+        # Food is only ever eaten (which scores points) or put back (in a new grid). The grid itself is kept so the
+        # check can't be fooled by a new grid taking an old one's place in memory
+        cached = self._food.get(game)
+
+        if cached is None or cached[0] is not game.grid or cached[1] != game.score:
+            grid = game.grid
+            food = (index for index in self.map.food if grid[index] != EMPTY)
+            self._food[game] = cached = (grid, game.score, self.field(food))
+
+        return cached[2]
+
+    def towards(self, tile, field, prefer=None):
+        '''
+        The way to go from a tile to get closer to whatever a field was made to
+        :param tile: Where the player is
+        :param field: The field
+        :param prefer: The direction to pick out of equally good ones, e.g. the way the player's already going
+        :returns: A direction, or None if the player can't go anywhere
+        '''
+        best = direction = None
+
+        for theta, neighbour in self.neighbours[tile]:
+            distance = field[neighbour]
+
+            if best is None or distance < best or distance == best and theta == prefer:
+                best = distance
+                direction = theta
+
+        return direction
+
+
+class Bot(Controller):
+
+    # A controller which decides for itself. Bots with a random side get their own rng, so a bot made with a seeded
+    # one always plays the same way
+
+    def __init__(self, rng=None):
+
+        self.rng = random.Random() if rng is None else rng
+
+    def __copy__(self):
+
+        # Copies of a game (see savestate.clone) get copies of its bots, which mustn't draw from the same numbers
+        new = type(self).__new__(type(self))
+        new.__dict__.update(self.__dict__)
+        new.rng = random.Random()
+        new.rng.setstate(self.rng.getstate())
+
+        return new
+
+
+class Idle(Bot):
+
+    # Never does anything
+
+    def direction(self, player):
+
+        return None
+
+
+class Wander(Bot):
+
+    # Holds a random direction, and now and then picks another
+
+    def __init__(self, rng=None):
+
+        super().__init__(rng)
+        self.want = self.rng.choice(tuple(DIRECTIONS))
+
+    def direction(self, player):
+
+        if self.rng.random() < 1 / 32:
+            self.want = self.rng.choice(tuple(DIRECTIONS))
+
+        return self.want
+
+
+class Greedy(Bot):
+
+    # Heads for the nearest dot or power-up, ignoring ghosts. Food right next to the player is eaten straight away,
+    # carrying on the way it was going if it can. Only when there's none does it follow the Maze's field to the food
+
+    def __init__(self, rng=None):
+
+        super().__init__(rng)
+
+        self.tile = None
+        self.want = None
+
+    def direction(self, player):
+
+        game = player.game
+        maze = Maze.of(game.map)
+        tile = maze.tile(player)
+
+        # Directions are only picked once per tile
+        if tile == self.tile:
+            return self.want
+
+        self.tile = tile
+        neighbours = maze.neighbours[tile]
+
+        for theta, neighbour in sorted(neighbours, key=lambda way: way[0] != self.want):
+            if game.grid[neighbour] in (DOT, PUP):
+                self.want = theta
+                return self.want
+
+        self.want = maze.towards(tile, maze.food(game), self.want)
+        return self.want
+
+
+# Controllers the tournament (and anything else) can pick by name
+BOTS = {"idle": Idle, "random": Wander, "greedy": Greedy}
+
+
+def copy_controllers(controllers):
+    '''
+    Copies of some controllers, for a copy of a game. Keys is shared, it doesn't keep anything
+    :returns: A list of copies
+    '''
+    return [controller if controller is KEYS else copy(controller) for controller in controllers]
@@ -0,0 +1,66 @@
+__author__ = 'anish'
+
+# Keyboard input. The driver used to push a KeyStateHandler for itself and one for every player onto the window's
+# handler stack on every tick, so the stack (and the time it takes pyglet to dispatch each key event down it) grew for
+# as long as the game ran. Now one Keyboard is pushed once, when the window is made, and once a tick the driver takes a
+# Snapshot of it which everything reads that tick's input from. Nothing here imports pyglet, keys are just the ints
+# pyglet uses for them
+
+
+class Snapshot:
+
+    # The keyboard as it was at the start of one tick. Indexing it with a key says whether the key is down, the same way
+    # a KeyStateHandler or a player's keys would, so it can be used as a player's keys
+
+    __slots__ = ("held", "pressed")
+
+    def __init__(self, held=frozenset(), pressed=frozenset()):
+
+        # Keys which are down, and keys which were pressed since the last snapshot
+        self.held = held
+        self.pressed = pressed
+
+    def __getitem__(self, key):
+
+        return key in self.held
+
+    def was_pressed(self, key):
+
+        # Whether the key went down since the last tick, as opposed to being held down from before then
+        return key in self.pressed
+
+
+class Keyboard:
+
+    # Window event handlers which keep track of which keys are down. Push one onto a window once, with
+    # window.push_handlers(keyboard)
+
+    def __init__(self):
+
+        self.held = set()
+        self.pressed = set()
+
+    def on_key_press(self, symbol, modifiers):
+
+        self.held.add(symbol)
+        self.pressed.add(symbol)
+
+    def on_key_release(self, symbol, modifiers):
+
+        self.held.discard(symbol)
+
+    def on_deactivate(self):
+
+        # Keys released while the window isn't focused never send a release event, so forget all of them
+        self.held.clear()
+
+    def snapshot(self):
+        '''
+        The input for one tick. A key pressed and released again between two snapshots still counts as held in the
+        second one, so quick taps aren't lost
+        :returns: A Snapshot
+        '''
+        snapshot = Snapshot(frozenset(self.held | self.pressed), frozenset(self.pressed))
+        self.pressed.clear()
+
+        return snapshot
@@ -1,10 +1,16 @@
 __author__ = 'anish'
 from game import Game
+from profiler import Profiler
+from controls import Keyboard
 
 import pyglet
 from pyglet.gl import *
 from common import *
 
+# The most ticks run for one frame. A driver that's further behind than this (the machine stalled, or the window was
+# being dragged) skips the rest rather than spending the next frames catching up, which would only put it further behind
+MAX_TICKS = 8
+
 
 class Driver(pyglet.window.Window):
 
@@ -14,12 +20,25 @@ class Driver(pyglet.window.Window):
         self.w = width
         self.l = length
 
-        self.key_states = pyglet.window.key.KeyStateHandler()
+        # The only input handler there is, pushed once. Each tick reads a snapshot of it, see controls.py
+        self.keyboard = Keyboard()
+        self.push_handlers(self.keyboard)
+
+        # Every tick's input is recorded, and written to session.log when the window is closed so the session can be
+        # played back with replay.py
+        self.game = Game("classic.map", wanted_players=1, xoff=0, yoff=100, record=True)
 
-        self.game = Game("classic.map", wanted_players=1, xoff=0, yoff=100)
+        # P switches the profiler and its overlay on and off, X saves what it's recorded to profile.json and
+        # profile.csv. The profiler is kept while it's off, so switching it back on carries on where it left off
+        self.profiler = Profiler()
+        self.profile_label = pyglet.text.Label("", font_size=8, x=4, y=length - 4, width=width, multiline=True,
+                                               anchor_y="top")
+        self.frames = 0
 
-        self.pre_add = True
-        self.pre_pause = True
+        # Real time which has passed but hasn't been simulated yet, in seconds. The game is updated exactly
+        # CLOCKS_PER_SEC times a second however often frames are drawn, and what's left over says how far between two
+        # ticks a frame is, see on_draw
+        self.lag = 0
 
         glLineWidth(4)
         glClearColor(0, 0, 0, 1)
@@ -28,36 +47,74 @@ class Driver(pyglet.window.Window):
 
     def update(self, dt):
 
-        self.push_handlers(self.key_states)
+        # Input is read once a frame, every tick run this frame sees the same keys
+        keys = self.keyboard.snapshot()
+
+        if keys.was_pressed(pyglet.window.key.P):
+            self.game.profiler = None if self.game.profiler is not None else self.profiler
+
+        if keys.was_pressed(pyglet.window.key.X) and self.game.profiler is not None:
+            self.profiler.export_json("profile.json")
+            self.profiler.export_csv("profile.csv")
 
-        if self.key_states[pyglet.window.key.K] and not self.pre_add:
+        if keys.was_pressed(pyglet.window.key.K):
             if self.game.wanted_players < self.game.governor.map_max_players:
-                self.game = Game("classic.map", self.game.wanted_players + 1, xoff=0, yoff=100)
+                self.game.reset(self.game.wanted_players + 1)
 
-        if self.key_states[pyglet.window.key.O] and not self.pre_pause:
+        if keys.was_pressed(pyglet.window.key.O):
             self.game.should_update = not self.game.should_update
 
+        self.lag += dt
+        ticks = min(int(self.lag * CLOCKS_PER_SEC), MAX_TICKS)
+        self.lag -= ticks / CLOCKS_PER_SEC
+
+        if self.lag >= 1 / CLOCKS_PER_SEC:
+            skipped = int(self.lag * CLOCKS_PER_SEC)
+            self.lag -= skipped / CLOCKS_PER_SEC
+
+            if self.game.profiler is not None:
+                self.game.profiler.behind(skipped)
+
+        for _ in range(ticks):
+            self.tick(keys)
+
+    def tick(self, keys):
+
         if not self.game.over:
+            # Every player reads the same snapshot, each only looks at the keys in its own control scheme
             for x in self.game.players:
-                self.push_handlers(x.keys)
+                x.keys = keys
 
             self.game.update()
 
         else:
-            self.game = Game("classic.map", wanted_players=self.number_players, xoff=0, yoff=100)
-
-        self.pre_add = self.key_states[pyglet.window.key.K]
-        self.pre_pause = self.key_states[pyglet.window.key.O]
+            # Start over with the same number of players. Resetting keeps the game's buffers and labels around rather
+            # than making new ones
+            self.game.reset()
 
     def on_draw(self):
         self.clear()
-        self.game.draw()
+        self.game.draw(min(self.lag * CLOCKS_PER_SEC, 1))
+
+        if self.game.profiler is not None:
+            # Laying out a label's text is slow, so the overlay is only rewritten a few times a second
+            if self.frames % (CLOCKS_PER_SEC // 4) == 0:
+                self.profile_label.text = self.profiler.overlay()
+
+            self.profile_label.draw()
+            self.frames += 1
+
+    def on_close(self):
+        self.game.log.save("session.log")
+        self.game.delete()
+        super().on_close()
 
 if __name__ == "__main__":
 
     game = Driver(28 * GRID_DIM, 29 * GRID_DIM + 100)
 
-    pyglet.clock.schedule_interval(game.update, 1 / CLOCKS_PER_SEC)
+    # Called once a frame, the driver works out how many ticks that makes
+    pyglet.clock.schedule(game.update)
     pyglet.clock.set_fps_limit(60)
 
     pyglet.app.run()
\ No newline at end of file
@@ -1,28 +1,73 @@
 __author__ = 'anish'
 
-from pyglet import image
-from fractions import Fraction     # used to create accurate representations of position
+from fractions import Fraction     # used to parse spawn points exactly
 from common import *
 
 
 class Entity:
 
-    # All entities load from the same spritesheet, so I just initialise it as a static variable
-    spritesheet = image.load("resources/sprites.png")
-    map_dims = None
-    padding = None
+    # Sprites are shared by every entity and kept in assets.py, which headless games never import
 
     def __init__(self, game, x, y):
 
-        self.x = Fraction(x)
-        self.y = Fraction(y)
+        # Positions are stored in 1/SUBTILE tile units, see common.py
+        self.x = Entity.to_subtile(x)
+        self.y = Entity.to_subtile(y)
+
+        # Where the entity was at the start of its last move, see hits
+        self.last_x = self.x
+        self.last_y = self.y
 
         self.game = game
-        self.speed = Fraction(1, 20)
+        self.speed = SUBTILE // 20
         self.theta = None
 
         self.can_right = self.can_left = self.can_up = self.can_down = False
 
+    @staticmethod
+    def to_subtile(value):
+        '''
+        Convert a coordinate in tiles (a number or a string from a map file) to integer 1/SUBTILE tile units
+        :param value: The coordinate in tiles
+        :returns: The coordinate in subtile units
+        '''
+        value = Fraction(value) * SUBTILE
+
+        if value.denominator != 1:
+            raise ValueError("Coordinate {} does not lie on the 1/{} tile grid".format(value / SUBTILE, SUBTILE))
+
+        return value.numerator
+
+    def draw_position(self, alpha=1):
+        '''
+        Where to draw the entity in pixels, part of the way along its last move. Ticks are drawn at whatever rate the
+        display runs at, so frames usually fall between two ticks
+        :param alpha: How far along, from 0 (where it was at the start of the last tick) to 1 (where it is now)
+        :returns: x, y
+        '''
+        x = self.last_x + (self.x - self.last_x) * alpha
+        y = self.last_y + (self.y - self.last_y) * alpha
+
+        return x * GRID_DIM / SUBTILE, y * GRID_DIM / SUBTILE
+
+    def hits(self, other):
+        '''
+        Whether this entity ran into another over the last tick. Either they ended up on the same tile, or they passed
+        through each other on the way there, which two entities heading at each other can do without ever being on the
+        same tile when it's checked
+        :param other: The other entity
+        :returns: A boolean
+        '''
+        if self.x // SUBTILE == other.x // SUBTILE and self.y // SUBTILE == other.y // SUBTILE:
+            return True
+
+        # Where other was relative to this entity at the start and end of the tick. If the line between the two goes
+        # through 0, 0 they were in the same place at some point. Positions are ints, so this is exact
+        start_x, start_y = other.last_x - self.last_x, other.last_y - self.last_y
+        end_x, end_y = other.x - self.x, other.y - self.y
+
+        return start_x * end_y == start_y * end_x and start_x * end_x + start_y * end_y <= 0
+
     def update_movement_possibilities(self):
         '''
         Convenience method for the update method, left unimplemented b/c ghosts and players behave differently
@@ -32,8 +77,15 @@ class Entity:
 
     def update(self):
 
-        if self.x <= Fraction(1, 2) and self.theta == 180:
-            self.x = Fraction(Entity.map_dims[1] + Fraction(Entity.padding[0]) - Fraction(1, 2))
+        # Going through the tunnel comes out at the other end, which is read from the entity's own map since games on
+        # different maps can run side by side. Maps without a tunnel never wrap
+        tunnel_column = self.game.map.tunnel_column
+
+        if tunnel_column is None:
+            pass
+
+        elif self.x <= HALF_TILE and self.theta == 180:
+            self.x = tunnel_column * SUBTILE + HALF_TILE
 
-        elif self.x >= Fraction(Entity.map_dims[1] + Fraction(Entity.padding[0]) - Fraction(1, 2)) and self.theta == 0:
-            self.x = Fraction(1, 2)
\ No newline at end of file
+        elif self.x >= tunnel_column * SUBTILE + HALF_TILE and self.theta == 0:
+            self.x = HALF_TILE
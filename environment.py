@@ -0,0 +1,154 @@
+__author__ = 'anish'
+
+# A reinforcement learning environment around one headless Game, in the style of OpenAI Gym:
+#
+#   env = Environment("classic.map", players=1)
+#   observation = env.reset(seed=1)
+#   observation, reward, done, info = env.step([UP])
+#
+# Agents pick one of ACTIONS for each player every tick, which is handed to the player through a Remote controller (see
+# controllers.py), so there's no keyboard or window anywhere. Observations are planes of the map, one for each of
+# CHANNELS, with a 1 wherever that thing is: walls, gates, dots and power-ups from the game's grid, then ghosts by state
+# and players by number from their positions. Planes are indexed [channel, y, x] in tiles, with y = 0 the bottom row
+# like everywhere else in the game.
+#
+# The observation is one array made when the environment is, and every reset and step writes into it rather than
+# making a new one. Walls and gates never change so they're only written once, and the dot planes are compared straight
+# out of the game's grid through a view of it. Copy the observation to keep it past the next step
+#
+# DEPENDS numpy
+
+import random
+
+import numpy as np
+
+from controllers import Remote
+from game import Game
+from common import *
+
+# What a player can do on a tick, and the direction each one asks for
+ACTIONS = NOOP, UP, LEFT, DOWN, RIGHT = range(5)
+ACTION_DIRECTIONS = (None, 90, 180, 270, 0)
+
+# Ghost states, in the order of their planes
+GHOST_STATES = ("idle", "escape", "wander", "chase", "scared", "flashing", "retreat")
+
+WALLS, GATES, DOTS, POWER_UPS = range(4)
+GHOST_CHANNELS = {state: 4 + number for number, state in enumerate(GHOST_STATES)}
+PLAYER_CHANNELS = 4 + len(GHOST_STATES)
+
+CHANNELS = ["walls", "gates", "dots", "power_ups"] + ["ghosts_" + state for state in GHOST_STATES]
+
+
+class Environment:
+
+    def __init__(self, handle="classic.map", players=1, max_ticks=None, freeze_ticks=0):
+        '''
+        :param handle: The map file
+        :param players: How many players, each of which needs an action every step
+        :param max_ticks: Episodes are cut off (done, with info["truncated"] set) after this many steps. None for no
+        limit, so an episode only ends when the game is over
+        :param freeze_ticks: Ticks the game freezes for after a level is cleared or a life is lost, see Game. Steps
+        taken while frozen do nothing
+        :returns: Nothing
+        '''
+        self.players = players
+        self.max_ticks = max_ticks
+
+        self.controllers = [Remote() for _ in range(players)]
+        self.game = Game(handle, players, headless=True, freeze_ticks=freeze_ticks, seed=0,
+                         controllers=self.controllers)
+        game_map = self.game.map
+
+        self.channels = CHANNELS + ["player_{}".format(number + 1) for number in range(players)]
+        self.observation = np.zeros((len(self.channels), game_map.height, game_map.width), dtype=np.uint8)
+
+        tiles = np.frombuffer(game_map.tiles, dtype=np.uint8).reshape(game_map.height, game_map.width)
+        np.equal(tiles, WALL, out=self.observation[WALLS])
+        np.equal(tiles, GATE, out=self.observation[GATES])
+
+        # The grid the dot planes were last read from, and a numpy view of it. Games make a new grid whenever the dots
+        # are put back, which is the only time the view has to be made again
+        self.grid = None
+        self.grid_view = None
+
+        self.ticks = 0
+
+    def reset(self, seed=None):
+        '''
+        Start a new episode
+        :param seed: Seed for the game's random numbers, the same seed and actions always play out the same. Defaults
+        to a random seed
+        :returns: The first observation
+        '''
+        if seed is None:
+            seed = random.randrange(1 << 32)
+
+        # Reseeding and restarting the clock makes the episode exactly a new Game(seed=seed), without making one
+        game = self.game
+        game.seed = seed
+        game.random.seed(seed)
+        game.clock.ticks = 0
+        game.reset(self.players)
+
+        self.ticks = 0
+
+        return self.observe()
+
+    def step(self, actions):
+        '''
+        Advance the game one tick
+        :param actions: One of ACTIONS for each player, or just one for a single player
+        :returns: The observation, the reward (how much the score went up), whether the episode is over, and a dict of
+        info: score, lives, level, tick, whether a life was lost, and whether the episode was cut off by max_ticks
+        '''
+        game = self.game
+
+        if game.over:
+            raise RuntimeError("The game is over, reset the environment before stepping it again")
+
+        if not hasattr(actions, "__len__"):
+            actions = (actions,)
+
+        if len(actions) != self.players:
+            raise ValueError("Expected {} actions, one for each player, got {}".format(self.players, len(actions)))
+
+        for controller, action in zip(self.controllers, actions):
+            controller.want = ACTION_DIRECTIONS[action]
+
+        score, lives = game.score, game.lives
+
+        game.update()
+        self.ticks += 1
+
+        truncated = self.max_ticks is not None and self.ticks >= self.max_ticks and not game.over
+        info = {"score": game.score, "lives": game.lives, "level": game.level, "tick": self.ticks,
+                "life_lost": game.lives < lives, "truncated": truncated}
+
+        return self.observe(), game.score - score, game.over or truncated, info
+
+    def observe(self):
+        '''
+        Write the game as it is now into the observation
+        :returns: The observation, which is the same array every time
+        '''
+        game = self.game
+        observation = self.observation
+
+        if game.grid is not self.grid:
+            self.grid = game.grid
+            self.grid_view = np.frombuffer(game.grid, dtype=np.uint8).reshape(observation.shape[1:])
+
+        np.equal(self.grid_view, DOT, out=observation[DOTS])
+        np.equal(self.grid_view, PUP, out=observation[POWER_UPS])
+
+        # Entities take up one tile each, so their planes are cleared and the few tiles they're on set again
+        observation[GHOST_CHANNELS["idle"]:].fill(0)
+
+        for g in game.ghosts:
+            observation[GHOST_CHANNELS[g.state], g.y // SUBTILE, g.x // SUBTILE] = 1
+
+        for number, p in enumerate(game.players):
+            observation[PLAYER_CHANNELS + number, p.y // SUBTILE, p.x // SUBTILE] = 1
+
+        return observation
@@ -1,51 +1,151 @@
+import random
 from governor import *
+from clock import TickClock
+from gamemap import Map
 from common import *
-from graphicsgroup import GraphicsGroup
-
-import pyglet
-import pyglet.font as fontlib
-
-from time import sleep
-
-from pyglet.gl import *
-from ctypes import pointer, sizeof
 
 
 class Game:
 
-    def __init__(self, handle="classic.map", wanted_players=1, total_dots_eaten=0, xoff=0, yoff=0):
+    # Whether the HUD's font has been added to pyglet yet, see init_labels
+    font_loaded = False
+
+    def __init__(self, handle="classic.map", wanted_players=1, total_dots_eaten=0, xoff=0, yoff=0, headless=False,
+                 freeze_ticks=None, clock=None, profiler=None, seed=None, record=False, controllers=None):
         '''
         This is... a really big class. It parses a grid from a game file, and takes care of drawing the grid, updating
         entities, etc.
         :param handle: The filename of the game to play
+        :param headless: If True, nothing graphical is created and pyglet is never imported, so the game can be
+        updated without a window or GL context. draw() must not be called on a headless game
+        :param freeze_ticks: How many ticks the game freezes for after a level is cleared or a life is lost. Defaults to
+        FREEZE_TICKS, or to 0 (no freezing at all) for headless games
+        :param clock: What the governor times ghost phases and power-ups with, see clock.py. Defaults to a TickClock, so
+        that the game runs on simulation time
+        :param profiler: A Profiler to time each stage of update and draw with, see profiler.py. This can be set or
+        cleared at any time, and with none nothing is timed
+        :param seed: Seed for the game's random numbers, which everything random in the game is drawn from. Two games
+        with the same seed and the same input play out exactly the same. Defaults to a random seed, kept in self.seed
+        :param record: Whether to record every tick's input to self.log, so the game can be replayed, see replay.py
+        :param controllers: What steers each player, by player number, see controllers.py. Players without one go by
+        their keys. The list is kept as self.controllers, and players made after it changes pick up the change
         :returns: Nothing
         '''
 
+        self.headless = headless
+
+        if freeze_ticks is None:
+            freeze_ticks = 0 if headless else FREEZE_TICKS
+
+        self.freeze_ticks = freeze_ticks
+        self.frozen = 0
+
+        self.clock = TickClock() if clock is None else clock
+        self.profiler = profiler
+        self.controllers = [] if controllers is None else controllers
+
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        self.random = random.Random(self.seed)
+
+        self.log = None
+        if record:
+            from replay import InputLog
+            self.log = InputLog(handle, self.seed, freeze_ticks)
+
         self.xoff = xoff
         self.yoff = yoff
 
         self.players = []
         self.ghosts = []
-        self.grid = []
+        self.grid = bytearray()
+
+        self.graphics_group = None
+        self.dot_buffers = {}
+
+        self.score_label = self.lives_label = None
+
+        self.load_static_map(handle, self.xoff, self.yoff)
+        self.reset(wanted_players, total_dots_eaten)
+
+        if not self.headless:
+            self.init_buffers()
+            self.init_labels()
+
+    def reset(self, wanted_players=None, total_dots_eaten=0):
+        '''
+        Start a new game on the same map. Everything made to draw the game (buffers, labels, sprites) is kept, so this
+        is much cheaper than making a new Game, and leaks nothing
+        :param wanted_players: How many players the new game has. Defaults to as many as the last game had
+        :param total_dots_eaten: How many dots count as eaten already, the level goes up every Map.dots
+        :returns: None
+        '''
+        if wanted_players is not None:
+            self.wanted_players = wanted_players
+
+        if self.log is not None:
+            self.log.reset(self.wanted_players, total_dots_eaten)
 
         self.lives = 3
         self.level = 1
         self.score = 0
         self.over = False
+        self.frozen = 0
 
         self.should_update = True
 
-        self.wanted_players = wanted_players
+        # Whether the last call to update moved anything, see draw
+        self.moved = False
 
-        self.load_static_map(handle, self.xoff, self.yoff)
-        self.governor = Governor(self, handle)
+        self.reset_dots()
+        self.governor = Governor(self)
 
         self.total_dots_eaten = total_dots_eaten
         self.dots_eaten = self.pups_eaten = 0
 
-        self.init_buffers()
+    def clone(self):
+        '''
+        Copy the game as it is right now, see savestate.py. The copy is always headless
+        :returns: The copy
+        '''
+        import savestate
+        return savestate.clone(self)
+
+    def reset_dots(self):
 
-        fontlib.add_file("resources/prstartk.ttf")
+        # Put every dot and power-up back, in the grid and in the buffers they're drawn from
+        self.grid = self.map.new_grid()
+
+        for tile, buffer in self.dot_buffers.items():
+            buffer.fill(self.dot_points(tile))
+
+    def delete(self):
+        '''
+        Free the GL buffers and labels the game was drawn with. The game can't be drawn afterwards
+        :returns: None
+        '''
+        if self.headless:
+            return None
+
+        self.graphics_group.delete_vbo(self.line_vbo)
+        self.graphics_group.delete_vbo(self.circle_vbo)
+
+        for buffer in self.dot_buffers.values():
+            buffer.delete()
+
+        self.dot_buffers = {}
+
+        self.score_label.delete()
+        self.lives_label.delete()
+
+    def init_labels(self):
+
+        import pyglet
+        import pyglet.font as fontlib
+
+        # The font only needs adding once, however many games are made
+        if not Game.font_loaded:
+            fontlib.add_file("resources/prstartk.ttf")
+            Game.font_loaded = True
 
         self.score_label = pyglet.text.Label("foo",
                                              font_name='Press Start K',
@@ -59,41 +159,118 @@ class Game:
 
     def update(self):
 
+        self.moved = False
+
+        # Controllers are asked once a tick, even when nothing moves, so scripts and bots see every tick
+        for p in self.players:
+            p.read_input()
+
+        # Every call is recorded, even ones where nothing happens, so a replay calls update exactly as often
+        if self.log is not None:
+            self.log.tick(self.should_update, [DIRECTION_MASKS[p.input] for p in self.players])
+
         if not self.should_update:
             return None
 
-        if self.total_dots_eaten % 236 == 0:
+        # While frozen nothing moves, but the game is still drawn
+        if self.frozen:
+            self.frozen -= 1
+
+            if not self.frozen:
+                self.thaw()
+
+            return None
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+
+        if self.total_dots_eaten % self.map.dots == 0:
             self.level += 1
-            self.load_static_map("classic.map", self.xoff, self.yoff)
+            self.reset_dots()
+
+            # Levelling up makes new players, which have to move by the input read from the old ones this tick. Asking
+            # their controllers again would skip a tick of a script or a replay
+            players = self.players
             self.governor = Governor(self)
+
+            for old, new in zip(players, self.players):
+                new.input = old.input
+
             self.dots_eaten = 0
             self.pups_eaten = 0
-            sleep(3)
+
+            # The rest of this tick still runs so that the player eats the dot it spawned on, otherwise the level
+            # would be cleared again as soon as the freeze ends
+            self.freeze()
+
+            if profiler is not None:
+                profiler.lap("level_up")
 
         self.governor.update()
 
+        if profiler is not None:
+            profiler.lap("governor")
+
         for p in self.players:
             p.update()
 
-            if self.grid[int(p.y)][int(p.x)] == "d":
+            index = p.y // SUBTILE * self.map.width + p.x // SUBTILE
+
+            if self.grid[index] == DOT:
 
-                self.grid[int(p.y)][int(p.x)] = "e"
+                self.grid[index] = EMPTY
                 self.score += 10
                 self.dots_eaten += 1
                 self.total_dots_eaten += 1
 
-            if self.grid[int(p.y)][int(p.x)] == "p":
+                if not self.headless:
+                    self.dot_buffers[DOT].remove(index)
+
+            elif self.grid[index] == PUP:
 
-                self.grid[int(p.y)][int(p.x)] = "e"
+                self.grid[index] = EMPTY
                 self.score += 50
                 self.pups_eaten += 1
                 self.governor.fire_pup()
 
+                if not self.headless:
+                    self.dot_buffers[PUP].remove(index)
+
+        if profiler is not None:
+            profiler.lap("players")
+
+        # Index players by the tiles they were on over this tick, so each ghost is only checked against the players near
+        # it. Nobody moves as much as a tile in one tick, so any player a ghost hit will be under one of the tiles the
+        # ghost was on
+        occupants = {}
+
+        for number, p in enumerate(self.players):
+            for index in {p.last_y // SUBTILE * self.map.width + p.last_x // SUBTILE,
+                          p.y // SUBTILE * self.map.width + p.x // SUBTILE}:
+                occupants.setdefault(index, []).append(number)
+
+        life_lost = False
+
         for g in self.ghosts:
             g.update()
 
-            for target_player in self.players:
-                if [int(g.x), int(g.y)] == [int(target_player.x), int(target_player.y)]:
+            # Ghosts move and are checked for collisions one at a time, so both stages are timed once per ghost
+            if profiler is not None:
+                profiler.lap("ghosts")
+
+            index = g.y // SUBTILE * self.map.width + g.x // SUBTILE
+            last_index = g.last_y // SUBTILE * self.map.width + g.last_x // SUBTILE
+            nearby = occupants.get(index, [])
+
+            # Players are always checked in order, as with more than one it matters who gets there first
+            if last_index != index and last_index in occupants:
+                nearby = sorted(set(nearby + occupants[last_index]))
+
+            for number in nearby:
+                target_player = self.players[number]
+
+                if g.hits(target_player):
 
                     if g.state == "scared" or g.state == "flashing":
                         self.score += 200
@@ -103,92 +280,117 @@ class Game:
                         self.lives -= 1
 
                         if self.lives > 0:
-                            sleep(3)
                             self.governor = Governor(self)
                             self.dots_eaten = 0
-                        else:
-                            sleep(3)
-                            self.over = True
 
-        self.lives_label.text = "Lives" + str(self.lives)
-        self.score_label.text = "Score:" + str(self.score)
+                        # The game is only over once the freeze ends, see thaw
+                        self.freeze()
+
+                        life_lost = True
+                        break
+
+            if profiler is not None:
+                profiler.lap("collision")
+
+            # Losing a life replaces every entity, so the ghosts left in this (old) list have nothing left to do
+            if life_lost:
+                break
+
+        # Time only passes for the governor on ticks which actually ran, so pausing or freezing the game pauses it too
+        self.clock.tick()
+        self.moved = True
+
+        if not self.headless:
+            self.lives_label.text = "Lives" + str(self.lives)
+            self.score_label.text = "Score:" + str(self.score)
+
+        if profiler is not None:
+            profiler.lap("hud")
+            profiler.end("tick")
+
+    def freeze(self):
+        '''
+        Stop the game for freeze_ticks ticks. Unlike sleeping, this doesn't block, so the game keeps being drawn and
+        input keeps being handled. The governor's timers are paused for as long as the freeze lasts
+        :returns: None
+        '''
+        self.frozen = self.freeze_ticks
+        self.governor.pause()
+
+        if not self.frozen:
+            self.thaw()
+
+    def thaw(self):
+
+        if self.lives > 0:
+            self.governor.resume()
+        else:
+            self.over = True
+
+    def draw(self, alpha=1):
+        '''
+        Draw the game
+        :param alpha: How far between the last tick and the next to draw entities, from 0 to 1. Entities are drawn alpha
+        of the way along the move they made last tick, so that they move smoothly however many frames there are a tick
+        :returns: None
+        '''
+        # Entities which didn't move last tick (the game's frozen or paused) are drawn where they are, or they'd be
+        # drawn somewhere between there and where they were before the game stopped
+        if not self.moved:
+            alpha = 1
 
-    def draw(self):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
 
         # Draw the game, players, and ghosts
         self.draw_map()
 
+        if profiler is not None:
+            profiler.lap("draw_map")
+
         for p in self.players:
-            p.draw()
+            p.draw(alpha)
 
         for g in self.ghosts:
-            g.draw()
+            g.draw(alpha)
+
+        if profiler is not None:
+            profiler.lap("sprites")
 
         self.score_label.draw()
         self.lives_label.draw()
 
+        if profiler is not None:
+            profiler.lap("labels")
+            profiler.end("frame")
+
     def draw_map(self):
 
-        glColor3f(0, 0, 1)
+        self.graphics_group.set_color(0, 0, 1)
 
         # Draw lines
-        glBindBuffer(GL_ARRAY_BUFFER, self.line_vbo)
-        glVertexPointer(2, GL_FLOAT, 0, 0)
-        glDrawArrays(GL_LINES, 0, self.line_data_l)
+        self.graphics_group.draw_vbo(self.line_vbo, self.line_data_l)
 
         # Draw circles
-        glBindBuffer(GL_ARRAY_BUFFER, self.circle_vbo)
-        glVertexPointer(2, GL_FLOAT, 0, 0)
-        glDrawArrays(GL_LINES, 0, self.circle_data_l)
-
-        for y in range(len(self.grid)):
-
-            for x in range(len(self.grid[y])):
+        self.graphics_group.draw_vbo(self.circle_vbo, self.circle_data_l)
 
-                if self.grid[y][x] == "d":
-                    glColor3f(1, 1, 0)
-                    glPointSize(5 / 24 * GRID_DIM)
-                    glBegin(GL_POINTS)
-                    self.glVertex2f(GRID_DIM * x + GRID_DIM / 2, GRID_DIM * y + GRID_DIM / 2)
-                    glEnd()
-
-                elif self.grid[y][x] == "p":
-                    glColor3f(1, 20/255, 147/255)
-                    glPointSize(7 / 24 * GRID_DIM)
-                    glBegin(GL_POINTS)
-                    self.glVertex2f(GRID_DIM * x + GRID_DIM / 2, GRID_DIM * y + GRID_DIM / 2)
-                    glEnd()
+        # Draw dots and power-ups, one call each
+        for buffer in self.dot_buffers.values():
+            buffer.draw()
 
     def load_static_map(self, handle, xoff, yoff):
 
-        with open(handle) as f:
-            file_lines = f.readlines()
-
-            i = 0
-            while i < len(file_lines):
-
-                if "#PADDING" in file_lines[i]:
-                    args = file_lines[i].split()
-                    self.xoff = -int(args[1]) * GRID_DIM
-                    self.yoff = int(args[2]) * GRID_DIM
-                    self.graphics_group = GraphicsGroup(self, x=self.xoff, y=self.yoff)
-
-                    Entity.padding = [int(args[1]), int(args[2])]
-                    file_lines.pop(i)
-                    i -= 1
-
-                elif "#DIMENSIONS" in file_lines[i]:
-                    args = file_lines[i].split()
-                    Entity.map_dims = [int(args[1]), int(args[2])]
-
-                elif file_lines[i][0] == "#":
-                    file_lines.pop(i)
-                    i -= 1
+        # The map is only parsed the first time any game loads it, see gamemap.py
+        self.map = Map.load(handle)
 
-                i += 1
+        if self.map.padding is not None:
+            self.xoff = -self.map.padding[0] * GRID_DIM
+            self.yoff = self.map.padding[1] * GRID_DIM
 
-            self.grid = list(reversed(file_lines))
-            self.grid = [list(self.grid[z])[0:-1] for z in range(len(self.grid))]
+        if not self.headless:
+            from graphicsgroup import GraphicsGroup
+            self.graphics_group = GraphicsGroup(self, x=self.xoff, y=self.yoff)
 
     def calculate_static_map(self):
 
@@ -197,29 +399,31 @@ class Game:
         # this checks all of them once and creates functions using functools.partial() to draw the game which can be
         # called quickly.
         # I'm not going to comment this method, that would take waaay too long. Maybe another day
+        # Walls are all that's drawn here, so this reads the map's rows rather than the grid of tile codes
+        grid = self.map.rows
 
-        for y in range(len(self.grid)):
+        for y in range(len(grid)):
 
-            for x in range(len(self.grid[y]))[::-1]:
+            for x in range(len(grid[y]))[::-1]:
 
-                u = self.grid[y][x]
+                u = grid[y][x]
 
                 if u == "b":
 
                     try:
-                        empty_up = self.grid[y+1][x] != "b"
+                        empty_up = grid[y+1][x] != "b"
                     except IndexError:
                         empty_up = False
                     try:
-                        empty_down = self.grid[y-1][x] != "b"
+                        empty_down = grid[y-1][x] != "b"
                     except IndexError:
                         empty_down = False
                     try:
-                        empty_right = self.grid[y][x+1] != "b"
+                        empty_right = grid[y][x+1] != "b"
                     except IndexError:
                         empty_right = False
                     try:
-                        empty_left = self.grid[y][x-1] != "b"
+                        empty_left = grid[y][x-1] != "b"
                     except IndexError:
                         empty_left = False
 
@@ -232,41 +436,41 @@ class Game:
                         self.draw_line(x * GRID_DIM + GRID_DIM // 2, y * GRID_DIM, x * GRID_DIM + GRID_DIM // 2,
                                                                y * GRID_DIM + GRID_DIM, self.line_points)
 
-                    elif empty_up and empty_left and not empty_down and self.grid[y-1][x-1] != "b":
+                    elif empty_up and empty_left and not empty_down and grid[y-1][x-1] != "b":
                         self.odraw_segment(x * GRID_DIM + GRID_DIM, y * GRID_DIM, GRID_DIM // 2, 90, 180,
                                            self.circle_points)
 
-                    elif empty_up and empty_right and not empty_down and self.grid[y-1][x+1] != "b":
+                    elif empty_up and empty_right and not empty_down and grid[y-1][x+1] != "b":
                         self.odraw_segment(x * GRID_DIM, y * GRID_DIM, GRID_DIM // 2, 0, 90, self.circle_points)
 
-                    elif empty_down and empty_left and not empty_up and self.grid[y+1][x-1] != "b":
+                    elif empty_down and empty_left and not empty_up and grid[y+1][x-1] != "b":
                         self.odraw_segment(x * GRID_DIM + GRID_DIM, y * GRID_DIM + GRID_DIM, GRID_DIM // 2, 180, 270,
                                            self.circle_points)
 
-                    elif empty_down and empty_right and not empty_up and self.grid[y+1][x+1] != "b":
+                    elif empty_down and empty_right and not empty_up and grid[y+1][x+1] != "b":
                         self.odraw_segment(x * GRID_DIM, y * GRID_DIM + GRID_DIM, GRID_DIM // 2, 270, 360,
                                            self.circle_points)
 
                     try:
-                        if self.grid[y-1][x-1] != "b" and not empty_left and not empty_down:
+                        if grid[y-1][x-1] != "b" and not empty_left and not empty_down:
                             self.odraw_segment(x * GRID_DIM, y * GRID_DIM, GRID_DIM // 2, 0, 90,
                                                self.circle_points)
                     except IndexError:
                         pass
                     try:
-                        if self.grid[y-1][x+1] != "b" and not empty_right and not empty_down:
+                        if grid[y-1][x+1] != "b" and not empty_right and not empty_down:
                             self.odraw_segment(x * GRID_DIM + GRID_DIM, y * GRID_DIM, GRID_DIM // 2, 90, 180,
                                                self.circle_points)
                     except IndexError:
                         pass
                     try:
-                        if self.grid[y+1][x-1] != "b" and not empty_left and not empty_up:
+                        if grid[y+1][x-1] != "b" and not empty_left and not empty_up:
                             self.odraw_segment(x * GRID_DIM, y * GRID_DIM + GRID_DIM, GRID_DIM // 2, 270, 360,
                                                self.circle_points)
                     except IndexError:
                         pass
                     try:
-                        if self.grid[y+1][x+1] != "b" and not empty_right and not empty_up:
+                        if grid[y+1][x+1] != "b" and not empty_right and not empty_up:
                             self.odraw_segment(x * GRID_DIM + GRID_DIM, y * GRID_DIM + GRID_DIM, GRID_DIM // 2, 180,
                                                 270, self.circle_points)
                     except IndexError:
@@ -283,15 +487,25 @@ class Game:
         # Set up buffers and upload relevant vertex data to them, this is muy faster than using glBegin, etc...
 
         self.line_data_l = self.line_points.__len__()
-        self.line_vbo = GLuint()
-        glGenBuffers(1, pointer(self.line_vbo))
-        self.line_gldata = (GLfloat*self.line_data_l)(*self.line_points)
-        glBindBuffer(GL_ARRAY_BUFFER, self.line_vbo)
-        glBufferData(GL_ARRAY_BUFFER, sizeof(self.line_gldata), pointer(self.line_gldata), GL_STATIC_DRAW)
+        self.line_vbo = self.graphics_group.create_vbo(self.line_points)
 
         self.circle_data_l = self.circle_points.__len__()
-        self.circle_vbo = GLuint()
-        glGenBuffers(1, pointer(self.circle_vbo))
-        self.circle_gldata = (GLfloat*self.circle_data_l)(*self.circle_points)
-        glBindBuffer(GL_ARRAY_BUFFER, self.circle_vbo)
-        glBufferData(GL_ARRAY_BUFFER, sizeof(self.circle_gldata), pointer(self.circle_gldata), GL_STATIC_DRAW)
\ No newline at end of file
+        self.circle_vbo = self.graphics_group.create_vbo(self.circle_points)
+
+        # Dots and power-ups go in buffers of their own which are updated a slot at a time as they're eaten, see
+        # graphicsgroup.py
+        from graphicsgroup import PointBuffer
+
+        self.dot_buffers = {DOT: PointBuffer(self.graphics_group, self.dot_points(DOT), 5 / 24 * GRID_DIM, (1, 1, 0)),
+                            PUP: PointBuffer(self.graphics_group, self.dot_points(PUP), 7 / 24 * GRID_DIM,
+                                             (1, 20/255, 147/255))}
+
+    def dot_points(self, tile):
+        '''
+        Where to draw every dot or power-up still in the grid
+        :param tile: DOT or PUP
+        :returns: A dict of grid index -> (x, y)
+        '''
+        return {index: (GRID_DIM * (index % self.map.width) + GRID_DIM / 2,
+                        GRID_DIM * (index // self.map.width) + GRID_DIM / 2)
+                for index, value in enumerate(self.grid) if value == tile}
@@ -0,0 +1,310 @@
+__author__ = 'anish'
+
+# A map file, parsed once. Game and Governor used to open and parse the file themselves, every time a game was made and
+# again on every level up and lost life. A Map holds everything in the file and never changes, so one can be shared by
+# every game played on it
+
+import os
+import zlib
+from array import array
+from math import floor
+from common import *
+from levels import DEFAULT_LEVELS, parse_level
+
+# Maps that have already been loaded, by absolute path: path -> (modification time, Map)
+_cache = {}
+
+# The directions a ghost can turn, with their OPEN_* bits, in the order ghosts prefer them when two are equally good
+GHOST_TURNS = ((90, OPEN_UP), (180, OPEN_LEFT), (270, OPEN_DOWN), (0, OPEN_RIGHT))
+
+# Distance to a tile which can't be reached at all, see ghost_distances
+UNREACHABLE = 0xFFFF
+
+
+class Map:
+
+    def __init__(self, handle):
+        '''
+        Parse a map file. Use Map.load rather than making one directly, so that the file is only parsed once
+        :param handle: The filename of the map
+        :returns: Nothing
+        '''
+        self.handle = handle
+
+        self.max_players = 0
+        self.padding = None
+        self.dims = None
+
+        # Where ghosts go to get out of the ghost house, in tiles. Maps without an #ESCAPE line use the classic one
+        self.escape = None
+
+        # Every spawn line in file order as (directive, x, y), e.g. ("#INKYSPAWN", "13.5", "17.5"). Order matters since
+        # ghosts pick a player to target as soon as they're made
+        self.spawns = []
+
+        # Timings for each level, from the map's #LEVEL lines if it has any, see levels.py
+        self.levels = {}
+
+        rows = []
+
+        with open(handle) as f:
+            for line in f:
+                line = line.rstrip("\n")
+
+                if not line.startswith("#"):
+                    rows.append(tuple(line))
+                    continue
+
+                args = line.split()
+
+                if args[0] == "#MAX_PLAYERS":
+                    self.max_players = int(args[1])
+
+                elif args[0] == "#PADDING":
+                    self.padding = (int(args[1]), int(args[2]))
+
+                elif args[0] == "#DIMENSIONS":
+                    self.dims = (int(args[1]), int(args[2]))
+
+                elif args[0] == "#ESCAPE":
+                    self.escape = (float(args[1]), float(args[2]))
+
+                elif args[0].endswith("SPAWN"):
+                    self.spawns.append((args[0], args[1], args[2]))
+
+                elif args[0] == "#LEVEL":
+                    first_level, level = parse_level(args)
+                    self.levels[first_level] = level
+
+        if not self.levels:
+            self.levels = DEFAULT_LEVELS
+
+        # The file lists rows from the top down, but y points up in game
+        self.rows = tuple(reversed(rows))
+
+        # The rows again as one flat bytearray of tile codes, indexed y * width + x. Short rows are padded with EMPTY
+        self.height = len(self.rows)
+        self.width = max((len(row) for row in self.rows), default=0)
+        self.tiles = bytearray(self.width * self.height)
+
+        for y, row in enumerate(self.rows):
+            for x, tile in enumerate(row):
+                self.tiles[y * self.width + x] = TILE_CODES.get(tile, EMPTY)
+
+        # A level is cleared every time this many dots have been eaten, see Game.update
+        self.dots = self.tiles.count(DOT)
+
+        if not self.dots:
+            raise ValueError("The map {} has no dots, so a level on it could never be cleared".format(handle))
+
+        # Every tile with a dot or power-up on it, in order. These are the only tiles a game's grid ever changes on, so
+        # a saved game only needs a bit for each, see savestate.py. The checksum tells saves made on other maps apart
+        self.food = [index for index, tile in enumerate(self.tiles) if tile == DOT or tile == PUP]
+        self.checksum = zlib.crc32(self.tiles)
+
+        # Walls never move, so which ways an entity can go from each tile is worked out here once, as a bitmask of
+        # OPEN_* bits per tile, rather than by looking at the neighbouring tiles every tick
+        self.player_moves = bytearray(self.width * self.height)
+        self.ghost_moves = bytearray(self.width * self.height)
+
+        for y in range(self.height):
+            for x in range(self.width):
+                self.player_moves[y * self.width + x] = self.player_mask(x, y)
+                self.ghost_moves[y * self.width + x] = self.ghost_mask(x, y)
+
+        # Ghosts find their way with distance fields over the tiles they can walk on, see ghost_distances. Entities
+        # going through the tunnel wrap around at this column, just right of the visible part of the map, see
+        # Entity.update
+        self.tunnel_column = None
+        if self.padding is not None and self.dims is not None:
+            self.tunnel_column = self.dims[0] + self.padding[0]
+
+        # ghost_neighbours[index] is the tile a ghost at index ends up on going each way in GHOST_TURNS, or -1 if it
+        # can't go that way from the centre of the tile. ghost_sources[index] lists the tiles a ghost can reach index
+        # from
+        self.ghost_neighbours = []
+        self.ghost_sources = [[] for _ in self.tiles]
+
+        for index in range(len(self.tiles)):
+            neighbours = tuple(self.ghost_neighbour(index, theta) if self.ghost_moves[index] & bit else -1
+                               for theta, bit in GHOST_TURNS)
+            self.ghost_neighbours.append(neighbours)
+
+            for neighbour in neighbours:
+                if neighbour != -1 and self.ghost_moves[index] & OPEN_SELF:
+                    self.ghost_sources[neighbour].append(index)
+
+        # ghost_ways[index][arrival] lists the ways (theta, tile it leads to) a ghost can leave the centre of the tile
+        # at index in without reversing, having arrived moving in direction arrival (None for a ghost which hasn't
+        # moved)
+        #
+        # Ghosts look this up at every tile centre they reach, they don't follow a graph of junctions a corridor at a
+        # time. Along a corridor the lookup finds one way and choose_way takes it without working anything out, so all
+        # an edge would save is the lookup, and how far along its edge each ghost is would have to be kept in saves and
+        # the batch engine, and kept in step with ghosts being moved when their speed changes
+        self.ghost_ways = []
+
+        for neighbours in self.ghost_neighbours:
+            ways = tuple(zip((theta for theta, bit in GHOST_TURNS), neighbours))
+            self.ghost_ways.append({arrival: tuple((theta, neighbour) for theta, neighbour in ways
+                                                   if neighbour != -1 and
+                                                   (arrival is None or theta != (arrival + 180) % 360))
+                                    for arrival in (None, 0, 90, 180, 270)})
+
+        self.nearest_ghost_tile = self.nearest_tiles(OPEN_SELF)
+
+        # Distance fields which have been worked out so far, by target tile
+        self._ghost_distances = {}
+
+        # What bots find their way around the map with, made the first time a bot plays on it, see controllers.Maze
+        self.maze = None
+
+    def tile(self, x, y):
+        '''
+        The letter at x, y, found the way indexing the rows would find it, so -1 is the last row or column
+        :returns: The letter, or None if x, y is off the map
+        '''
+        try:
+            return self.rows[y][x]
+        except IndexError:
+            return None
+
+    def is_open(self, x, y, closed=("b",)):
+        '''
+        Whether an entity can be on the tile at x, y. Anything off the map counts as closed
+        :param closed: Letters of the tiles that count as closed
+        :returns: A boolean
+        '''
+        tile = self.tile(x, y)
+        return tile is not None and tile not in closed
+
+    def player_mask(self, x, y):
+        '''
+        The OPEN_* bits for a player on the tile at x, y: which of the four neighbouring tiles aren't walls. See
+        Player.update_movement_possibilities for how they're used
+        :returns: An int
+        '''
+        return OPEN_UP * self.is_open(x, y + 1) | OPEN_LEFT * self.is_open(x - 1, y) | \
+            OPEN_DOWN * self.is_open(x, y - 1) | OPEN_RIGHT * self.is_open(x + 1, y)
+
+    def ghost_mask(self, x, y):
+        '''
+        The OPEN_* bits for a ghost on the tile at x, y. Ghosts never look left of column 0 or below row 0, and can't go
+        down into a gate. See Ghost.update_movement_possibilities for how they're used
+        :returns: An int
+        '''
+        return OPEN_UP * self.is_open(x, y + 1) | OPEN_LEFT * self.is_open(max(x - 1, 0), y) | \
+            OPEN_DOWN * self.is_open(x, max(y - 1, 0), ("b", "g")) | OPEN_RIGHT * self.is_open(x + 1, y) | \
+            OPEN_SELF * self.is_open(x, y) | OPEN_FLOOR * self.is_open(x, y, ("b", "g"))
+
+    def ghost_neighbour(self, index, theta):
+        '''
+        The tile a ghost at the centre of the tile at index moves into going in direction theta, going through the
+        tunnel if there is one. Like the ghosts themselves, this never goes left of column 0 or below row 0
+        :returns: The index of the tile
+        '''
+        x, y = index % self.width, index // self.width
+
+        if theta == 0 and x == self.tunnel_column:
+            return y * self.width
+        if theta == 180 and x == 0 and self.tunnel_column is not None:
+            return y * self.width + self.tunnel_column
+
+        x = max(x + DIRECTIONS[theta][0], 0)
+        y = max(y + DIRECTIONS[theta][1], 0)
+
+        return y * self.width + x if x < self.width and y < self.height else -1
+
+    def nearest_tiles(self, bit):
+        '''
+        For every tile, the closest tile (in steps, ignoring walls) whose ghost_moves has bit set
+        :returns: A list of tile indexes, indexed by tile index
+        '''
+        nearest = [-1] * len(self.tiles)
+        frontier = [index for index in range(len(self.tiles)) if self.ghost_moves[index] & bit]
+
+        for index in frontier:
+            nearest[index] = index
+
+        while frontier:
+            next_frontier = []
+
+            for index in frontier:
+                x, y = index % self.width, index // self.width
+
+                for dx, dy in DIRECTIONS.values():
+                    if 0 <= x + dx < self.width and 0 <= y + dy < self.height:
+                        neighbour = (y + dy) * self.width + x + dx
+
+                        if nearest[neighbour] == -1:
+                            nearest[neighbour] = nearest[index]
+                            next_frontier.append(neighbour)
+
+            frontier = next_frontier
+
+        return nearest
+
+    def ghost_target(self, x, y):
+        '''
+        The tile a ghost heads for when its setpoint is x, y. Setpoints can be off the map or inside walls, in which
+        case this is the closest tile a ghost can actually get to
+        :param x: The setpoint's x, in tiles
+        :param y: The setpoint's y, in tiles
+        :returns: The index of the tile
+        '''
+        x = min(max(floor(x), 0), self.width - 1)
+        y = min(max(floor(y), 0), self.height - 1)
+
+        return self.nearest_ghost_tile[y * self.width + x]
+
+    def ghost_distances(self, target):
+        '''
+        How many tiles a ghost has to move through to get from each tile to target, found by a breadth first search
+        backwards from target. Each field is only worked out the first time it's asked for, and then kept
+        :param target: The index of the tile, from ghost_target
+        :returns: An array of distances indexed by tile index, UNREACHABLE where target can't be reached from
+        '''
+        if target not in self._ghost_distances:
+            distances = array("H", [UNREACHABLE]) * len(self.tiles)
+            distances[target] = 0
+            frontier = [target]
+
+            while frontier:
+                next_frontier = []
+
+                for index in frontier:
+                    distance = distances[index] + 1
+
+                    for source in self.ghost_sources[index]:
+                        if distances[source] == UNREACHABLE:
+                            distances[source] = distance
+                            next_frontier.append(source)
+
+                frontier = next_frontier
+
+            self._ghost_distances[target] = distances
+
+        return self._ghost_distances[target]
+
+    @staticmethod
+    def load(handle):
+        '''
+        Get the Map for a file, parsing it only if it hasn't been parsed yet or has changed since
+        :param handle: The filename of the map
+        :returns: The Map
+        '''
+        path = os.path.abspath(handle)
+        mtime = os.stat(path).st_mtime_ns
+
+        if path not in _cache or _cache[path][0] != mtime:
+            _cache[path] = (mtime, Map(handle))
+
+        return _cache[path][1]
+
+    def new_grid(self):
+        '''
+        A fresh grid of tiles for one game, with every dot and power-up in place. It's a copy of Map.tiles, which is
+        small enough that copying it is quick
+        :returns: A bytearray of tile codes, indexed y * width + x
+        '''
+        return bytearray(self.tiles)
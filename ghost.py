@@ -1,9 +1,6 @@
 __author__ = 'anish'
 from entity import *
-from sprite import Sprite
-from pyglet import image
-from random import randint, choice
-from copy import copy
+from gamemap import GHOST_TURNS, UNREACHABLE
 from common import *
 
 
@@ -13,68 +10,63 @@ class Ghost(Entity):
 
         super().__init__(game, x, y)
 
-        # setpoint coordinates
-        self.want_x = self.x
-        self.want_y = self.y
+        # setpoint coordinates. Unlike positions, these are in tiles since targets are often fractional
+        self.want_x = self.x / SUBTILE
+        self.want_y = self.y / SUBTILE
 
         self.count = 0
 
         self.state = "idle"
         self.pre_state = None
 
-        self.target_player = choice(self.game.players)
+        self.target_player = self.game.random.choice(self.game.players)
 
         # The wanderpoint variable is specific to this each ghost
         self.wanderpoint = []
         self.escaped = False
-        #TODO Hardcoding an escape tile isnt map-agnostic, do figure this out
-        self.escape_tile = [15.5, 19.5]
+        # Maps can say where their ghost house's door is with an #ESCAPE line, otherwise it's the classic map's
+        self.escape_tile = list(self.game.map.escape) if self.game.map.escape is not None else [15.5, 19.5]
 
         self.speeds = {"wander": self.speed, "escape": self.speed, "chase": self.speed,
-                       "scared": Fraction(1, 2) * self.speed, "flashing": Fraction(1, 2) * self.speed,
-                       "idle": Fraction(0, 1), "retreat": Fraction(2, 1) * self.speed}
+                       "scared": self.speed // 2, "flashing": self.speed // 2,
+                       "idle": 0, "retreat": 2 * self.speed}
 
         self.dot_threshold = 0
 
         self.normal_sprites = None
+        self.scared_sprites = None
 
-        # Get the scared spritesheet. This variable *could* be static, but isn't because of concerns that will never
-        # apply, probably. Christian would be proud
-
-        scared_spritesheet = Entity.spritesheet.get_region(4 * 32, 6 * 32, 4 * 32, 32)
+        # Headless games never draw, so there is nothing to load
+        if self.game.headless:
+            return None
 
-        self.scared_sprites = image.ImageGrid(scared_spritesheet, 1, 4, item_width=32, item_height=32)
-        for i in range(len(self.scared_sprites)):
-            self.scared_sprites[i].anchor_x = self.scared_sprites[i].width // 2
-            self.scared_sprites[i].anchor_y = self.scared_sprites[i].width // 2
+        import assets
 
-        self.scared_sprites = [Sprite(i, self.game.graphics_group) for i in self.scared_sprites]
+        # The scared sprites are the same for every ghost, so they come from the shared cache in assets.py
+        self.scared_sprites = [assets.get_sprite(self.game.graphics_group, 6, column) for column in range(4, 8)]
 
     def load_resources(self, row):
 
-        # Slice out the needed region of the sprite sheet (32 x 32 Pac-Man normal_sprites)
-        spritesheet = Entity.spritesheet.get_region(0, row * 32, 8 * 32, 32)
+        # Headless games never draw, so there is nothing to load
+        if self.game.headless:
+            return None
 
-        # Convert the image into an array of images, and center their anchor points
-        self.normal_sprites = image.ImageGrid(spritesheet, 1, 8, item_width=32, item_height=32)
-        for i in range(len(self.normal_sprites)):
-            self.normal_sprites[i].anchor_x = self.normal_sprites[i].width // 2
-            self.normal_sprites[i].anchor_y = self.normal_sprites[i].width // 2
+        import assets
 
-        # Convert the images in the array to normal_sprites
-        self.normal_sprites = [Sprite(i, self.game.graphics_group) for i in self.normal_sprites]
+        # Each ghost's sprites are one row of the spritesheet, in the shared cache in assets.py. They're indexed by
+        # animation frame and then by direction
+        sprite = lambda column: assets.get_sprite(self.game.graphics_group, row, column)
 
-        temp = copy(self.normal_sprites)
-        self.normal_sprites = {}
-        angles = {90: temp[0], 270: temp[2], 180: temp[4], 0: temp[6]}
-        self.normal_sprites[0] = angles
-        angles = {0: temp[7], 90: temp[1], 270: temp[3], 180: temp[5]}
-        self.normal_sprites[1] = angles
+        self.normal_sprites = {0: {90: sprite(0), 270: sprite(2), 180: sprite(4), 0: sprite(6)},
+                               1: {0: sprite(7), 90: sprite(1), 270: sprite(3), 180: sprite(5)}}
 
     def update(self):
 
         super().update()
 
+        self.last_x = self.x
+        self.last_y = self.y
+
         if not self.escaped and self.game.dots_eaten >= self.dot_threshold:
             self.state = "escape"
 
@@ -84,13 +76,13 @@ class Ghost(Entity):
         if self.state == "escape":
             self.set_setpoint(*self.escape_tile)
 
-            if not self.escaped and [self.x, self.y] == self.escape_tile:
+            if not self.escaped and self.at_escape_tile():
                 self.state = "wander"
                 self.escaped = True
 
         if self.state == "retreat":
             self.set_setpoint(*self.escape_tile)
-            if [self.x, self.y] == self.escape_tile:
+            if self.at_escape_tile():
                 self.state = "wander"
 
         if self.state == "chase":
@@ -108,7 +100,7 @@ class Ghost(Entity):
         if self.pre_state == "flashing" or self.pre_state == "scared" or self.pre_state == "retreat" and \
             self.state != self.pre_state:
 
-            self.target_player = choice(self.game.players)
+            self.target_player = self.game.random.choice(self.game.players)
 
         self.speed = self.speeds[self.state]
         self.x -= self.x % self.speed
@@ -120,55 +112,48 @@ class Ghost(Entity):
 
     def update_pos(self):
 
-        self.update_movement_possibilities()
-
-        # The AI attempts to take the shortest path to target. The squares of the distances are actually used to avoid
-        # having to call math.sqrt
-        up_distance = pow(float(self.x) - float(self.want_x), 2) + pow(float(self.y) + float(self.speed) - float(self.want_y), 2)
-        left_distance = pow(float(self.x) - float(self.speed) - float(self.want_x), 2) + pow(float(self.y) - float(self.want_y), 2)
-        down_distance = pow(float(self.x) - float(self.want_x), 2) + pow(float(self.y) - float(self.speed) - float(self.want_y), 2)
-        right_distance = pow(float(self.x) + float(self.speed) - float(self.want_x), 2) + pow(float(self.y) - float(self.want_y), 2)
-
-        distances = [right_distance, left_distance, down_distance, up_distance]
-
-        # This loop is needed to ensure that a valid theta is always set. If this is not included then sometimes an
-        # appropriate theta will not be set because it is not the shortest path, allowing invalid paths to be taken
+        # Ghosts only have choices to make at the centre of a tile: between centres the only way to go is straight on,
+        # so there is nothing to check at all. At the centre, the ways out of the tile were worked out when the map was
+        # loaded, and along corridors there's only ever one (see Map.ghost_ways)
+        if self.x % SUBTILE == HALF_TILE and self.y % SUBTILE == HALF_TILE:
+            index = self.y // SUBTILE * self.game.map.width + self.x // SUBTILE
+            self.choose_way(self.game.map.ghost_ways[index][self.theta])
 
-        theta_set = False
+        elif self.theta is None:
+            # A ghost which hasn't moved yet and doesn't start at the centre of a tile has to look around itself
+            self.update_movement_possibilities()
+            neighbours = self.game.map.ghost_neighbours[self.y // SUBTILE * self.game.map.width + self.x // SUBTILE]
+            allowed = (self.can_up, self.can_left, self.can_down, self.can_right)
 
-        while not theta_set:
+            self.choose_way([(theta, neighbour) for (theta, bit), can_go, neighbour in
+                             zip(GHOST_TURNS, allowed, neighbours) if can_go])
 
-            min_distance = min(distances)
+        self.x += self.speed * DIRECTIONS[self.theta][0]
+        self.y += self.speed * DIRECTIONS[self.theta][1]
 
-            if self.can_up and up_distance == min_distance and self.theta != 270:
-                self.theta = 90
-                theta_set = True
-
-            elif self.can_left and left_distance == min_distance and self.theta != 0:
-                self.theta = 180
-                theta_set = True
-
-            elif self.can_down and down_distance == min_distance and self.theta != 90:
-                self.theta = 270
-                theta_set = True
+    def choose_way(self, ways):
+        '''
+        Set theta to the way which leads to the tile closest to the setpoint. How far every tile is from the setpoint is
+        worked out once per map and setpoint, see Map.ghost_distances. On ties, the first of up, left, down, right wins
+        :param ways: (theta, index of the tile that way leads to, or -1) for each way the ghost can go
+        :returns: None
+        '''
+        # With nowhere to go, the ghost just carries on
+        if len(ways) < 2:
+            if ways:
+                self.theta = ways[0][0]
 
-            elif self.can_right and right_distance == min_distance and self.theta != 180:
-                self.theta = 0
-                theta_set = True
+            return None
 
-            #if none of the minimum distances are in valid directions, remove them from consideration and reloop
-            if not theta_set:
-                distances = [d for d in distances if d != min_distance]
+        distances = self.game.map.ghost_distances(self.game.map.ghost_target(self.want_x, self.want_y))
+        best = None
 
-                if not distances:
-                    up_distance = 1
-                    left_distance = 2
-                    down_distance = 3
-                    right_distance = 4
-                    distances = [1, 2, 3, 4]
+        for theta, neighbour in ways:
+            distance = distances[neighbour] if neighbour != -1 else UNREACHABLE
 
-        self.x += self.speed * cos(self.theta).__int__()
-        self.y += self.speed * sin(self.theta).__int__()
+            if best is None or distance < best:
+                self.theta = theta
+                best = distance
 
     def update_movement_possibilities(self):
         '''
@@ -176,40 +161,48 @@ class Ghost(Entity):
         rule- that is taken care of in the update method. This simply tests for a block in the desired position
         :return: None
         '''
-        #The .000001 is included to make sure that the method correctly detects the presence of a block on the game
-        # The constant's value does not matter, but it should be smaller than 1 / self.speed
-        self.can_up = self.x % 1 == 0.5 and self.game.grid[int(self.y + 0.5)][int(self.x)] != "b"
-        self.can_left = self.y % 1 == 0.5 and self.game.grid[int(self.y)][int(self.x - 0.5 - .00000001)] != "b"
-        self.can_down = self.x % 1 == 0.5 and self.game.grid[int(self.y - 0.5 - .000000001)][int(self.x)] != "b" and \
-            self.game.grid[int(self.y - 0.5 - .000000001)][int(self.x)] != "g"
-        self.can_right = self.y % 1 == 0.5 and self.game.grid[int(self.y)][int(self.x + 0.5)] != "b"
-
-    def draw(self):
+        # Off the centre of a tile, the tile a ghost has to check is sometimes its own rather than its neighbour. The
+        # map's table has bits for both, see gamemap.py. Ghosts never look left of column 0 or below row 0
+        moves = self.game.map.ghost_moves[self.y // SUBTILE * self.game.map.width + self.x // SUBTILE]
+        offset_x = self.x % SUBTILE
+        offset_y = self.y % SUBTILE
+
+        self.can_up = offset_x == HALF_TILE and moves & (OPEN_UP if offset_y >= HALF_TILE else OPEN_SELF) != 0
+        self.can_left = offset_y == HALF_TILE and moves & (OPEN_LEFT if offset_x <= HALF_TILE else OPEN_SELF) != 0
+        self.can_down = offset_x == HALF_TILE and moves & (OPEN_DOWN if offset_y <= HALF_TILE else OPEN_FLOOR) != 0
+        self.can_right = offset_y == HALF_TILE and moves & (OPEN_RIGHT if offset_x >= HALF_TILE else OPEN_SELF) != 0
+
+    def draw(self, alpha=1):
         '''
         Draw the appropriate sprite to the game
+        :param alpha: How far between the last tick and this one to draw the ghost, see Entity.draw_position
         :return: None
         '''
         self.count += .08
 
         #Based on the count and the current theta, draw a frame rotated at the appropriate angle
+        x, y = self.draw_position(alpha)
 
         if self.state == "idle":
-            self.normal_sprites[int(self.count % 2)][0].set_position(int(self.x * GRID_DIM), int(self.y * GRID_DIM))
+            self.normal_sprites[int(self.count % 2)][0].set_position(x, y)
             self.normal_sprites[int(self.count % 2)][0].draw()
 
         elif self.state == "chase" or self.state == "wander" or self.state == "escape" or self.state == "retreat":
-            self.normal_sprites[int(self.count % 2)][self.theta].set_position(int(self.x * GRID_DIM),
-                                                                              int(self.y * GRID_DIM))
+            self.normal_sprites[int(self.count % 2)][self.theta].set_position(x, y)
             self.normal_sprites[int(self.count % 2)][self.theta].draw()
 
         elif self.state == "scared":
-            self.scared_sprites[int(self.count % 2)].set_position(int(self.x * GRID_DIM), int(self.y * GRID_DIM))
+            self.scared_sprites[int(self.count % 2)].set_position(x, y)
             self.scared_sprites[int(self.count % 2)].draw()
 
         elif self.state == 'flashing':
-            self.scared_sprites[int(self.count % 4)].set_position(int(self.x * GRID_DIM), int(self.y * GRID_DIM))
+            self.scared_sprites[int(self.count % 4)].set_position(x, y)
             self.scared_sprites[int(self.count % 4)].draw()
 
+    def at_escape_tile(self):
+
+        return self.x * 2 == self.escape_tile[0] * 2 * SUBTILE and self.y * 2 == self.escape_tile[1] * 2 * SUBTILE
+
     def set_setpoint(self, x, y):
 
         self.want_x = x
@@ -218,7 +211,7 @@ class Ghost(Entity):
     def panic(self):
 
         #TODO THis isnt map-agnostic, fix later?
-        return [randint(0, 32), randint(0, 31)]
+        return [self.game.random.randint(0, 32), self.game.random.randint(0, 31)]
 
     def target(self):
 
@@ -14,7 +14,7 @@ class Blinky(Ghost):
         self.dot_threshold = 0
 
     def target(self):
-        return [self.target_player.x, self.target_player.y]
+        return [self.target_player.x / SUBTILE, self.target_player.y / SUBTILE]
 
 
 class Pinky(Ghost):
@@ -30,8 +30,8 @@ class Pinky(Ghost):
     def target(self):
 
         try:
-            return [self.target_player.x + 4 * cos(self.target_player.theta),
-                                  self.target_player.y + 4 * sin(self.target_player.theta)]
+            return [self.target_player.x / SUBTILE + 4 * cos(self.target_player.theta),
+                                  self.target_player.y / SUBTILE + 4 * sin(self.target_player.theta)]
         except TypeError:
             return self.wanderpoint
 
@@ -47,15 +47,18 @@ class Inky(Ghost):
 
     def target(self):
         try:
-            x1 = self.target_player.x + 2 * cos(self.target_player.theta)
-            y1 = self.target_player.y + 2 * sin(self.target_player.theta)
+            x1 = self.target_player.x / SUBTILE + 2 * cos(self.target_player.theta)
+            y1 = self.target_player.y / SUBTILE + 2 * sin(self.target_player.theta)
         except TypeError:
             return self.wanderpoint
 
-        vecx = x1 - self.game.ghosts[0].x
-        vecy = y1 - self.game.ghosts[0].y
+        blinky_x = self.game.ghosts[0].x / SUBTILE
+        blinky_y = self.game.ghosts[0].y / SUBTILE
 
-        return [self.game.ghosts[0].x + 2 * vecx, self.game.ghosts[0].y + 2 * vecy]
+        vecx = x1 - blinky_x
+        vecy = y1 - blinky_y
+
+        return [blinky_x + 2 * vecx, blinky_y + 2 * vecy]
 
 
 class Clyde(Ghost):
@@ -69,7 +72,7 @@ class Clyde(Ghost):
         self.dot_threshold = 90
 
     def target(self):
-        if pow(self.x - self.target_player.x, 2) + pow(self.y - self.target_player.y, 2) <= 64:
+        if pow(self.x - self.target_player.x, 2) + pow(self.y - self.target_player.y, 2) <= 64 * SUBTILE * SUBTILE:
                 return [30, -1]
         else:
             return self.wanderpoint
\ No newline at end of file
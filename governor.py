@@ -1,15 +1,15 @@
 __author__ = 'anish'
 from player import *
 from ghosts import *
-
-from time import time
+from levels import level_for
 
 
 class Governor:
 
-    def __init__(self, game, handle="classic.map"):
+    def __init__(self, game):
 
         self.game = game
+        self.clock = game.clock
         self.master_state = "idle"
 
         game.players = []
@@ -17,42 +17,45 @@ class Governor:
 
         self.pup_time = None
         self.flash_time = None
-        
-        self.pup_duration = 10
-        self.flash_duration = 2
 
         self.indefinite_chase = False
 
-        self.start_time = time()
+        self.start_time = self.clock.time()
         self.now = self.start_time
         self.past = self.now - .1
 
-        with open(handle) as f:
+        # Set while the game is frozen, see pause and resume
+        self.paused_at = None
+
+        self.map_max_players = game.map.max_players
+        self.levels = game.map.levels
+
+        # Spawn entities in the order the map lists them, as ghosts pick a player to target as soon as they're made
+        for directive, x, y in game.map.spawns:
 
-            lines = f.readlines()
-            for l in lines:
-                if "#" in l:
-                    args = l.split()
+            if directive == "#PLAYERSPAWN" and len(self.game.players) < self.map_max_players and \
+                    len(self.game.players) < self.game.wanted_players:
 
-                    if args[0] == "#MAX_PLAYERS":
-                        self.map_max_players = int(args[1])
+                self.game.players.append(Player(self.game, x, y, len(self.game.players) + 1))
 
-                    elif args[0] == "#PLAYERSPAWN" and len(self.game.players) < self.map_max_players and \
-                        len(self.game.players) < self.game.wanted_players:
+            elif directive == "#BLINKYSPAWN":
+                self.game.ghosts.append(Blinky(self.game, x, y))
 
-                        self.game.players.append(Player(self.game, args[1], args[2], len(self.game.players) + 1))
+            elif directive == "#PINKYSPAWN":
+                self.game.ghosts.append(Pinky(self.game, x, y))
 
-                    elif args[0] == "#BLINKYSPAWN":
-                        self.game.ghosts.append(Blinky(self.game, args[1], args[2]))
+            elif directive == "#INKYSPAWN":
+                self.game.ghosts.append(Inky(self.game, x, y))
 
-                    elif args[0] == "#PINKYSPAWN":
-                        self.game.ghosts.append(Pinky(self.game, args[1], args[2]))
+            elif directive == "#CLYDESPAWN":
+                self.game.ghosts.append(Clyde(self.game, x, y))
 
-                    elif args[0] == "#INKYSPAWN":
-                        self.game.ghosts.append(Inky(self.game, args[1], args[2]))
+        self.level_config = level_for(self.levels, self.game.level)
+        self.pup_duration = self.level_config.pup_duration
+        self.flash_duration = self.level_config.flash_duration
 
-                    elif args[0] == "#CLYDESPAWN":
-                        self.game.ghosts.append(Clyde(self.game, args[1], args[2]))
+        # Index of the next phase of the level's schedule to start, see update
+        self.next_phase = 0
 
     def update(self):
 
@@ -60,7 +63,7 @@ class Governor:
                                                             self.pup_time + self.pup_duration + 1):
 
             self.set_ghost_states("flashing", break_scared=True, break_wander=False, break_chase=False)
-            self.flash_time = time() - self.start_time
+            self.flash_time = self.clock.time() - self.start_time
             self.pup_time = None
 
         if self.flash_time is not None and self.into_interval(self.flash_time + self.flash_duration,
@@ -69,77 +72,18 @@ class Governor:
             self.set_ghost_states(self.master_state, break_scared=True, break_wander=False, break_chase=False)
             self.flash_time = None
 
-        if self.game.level == 1:
-            self.pup_duration = 9
-            self.flash_duration = 3
-
-            if self.into_interval(0, 7):
-                self.master_state = "wander"
-            elif self.into_interval(7, 27):
-                self.master_state = "chase"
-            elif self.into_interval(27, 34):
-                self.master_state = "wander"
-            elif self.into_interval(34, 54):
-                self.master_state = "chase"
-            elif self.into_interval(54, 59):
-                self.master_state = "wander"
-            elif self.into_interval(59, 79):
-                self.master_state = "chase"
-            elif self.into_interval(79, 84):
-                self.master_state = "wander"
-            elif self.into_interval(84, 87):
-                self.master_state = "chase"
-                print("permanent chase!")
-                self.indefinite_chase = True
-
-        elif 2 <= self.game.level <= 4:
-            self.pup_duration = 5
-            self.flash_duration = 3
-
-            if self.into_interval(0, 7):
-                self.master_state = "wander"
-            elif self.into_interval(7, 27):
-                self.master_state = "chase"
-            elif self.into_interval(27, 34):
-                self.master_state = "wander"
-            elif self.into_interval(34, 54):
-                self.master_state = "chase"
-            elif self.into_interval(54, 59):
-                self.master_state = "wander"
-            elif self.into_interval(59, 1092):
-                self.master_state = "chase"
-            elif self.into_interval(1092, 1093):
-                self.master_state = "wander"
-            elif self.into_interval(1093, 2000):
-                self.master_state = "chase"
-                self.indefinite_chase = True
-
-        else:
-
-            self.pup_duration = 0
-            self.flash_duration = 2
-
-            if self.into_interval(0, 7):
-                self.master_state = "wander"
-            elif self.into_interval(7, 27):
-                self.master_state = "chase"
-            elif self.into_interval(27, 34):
-                self.master_state = "wander"
-            elif self.into_interval(34, 54):
-                self.master_state = "chase"
-            elif self.into_interval(54, 59):
-                self.master_state = "wander"
-            elif self.into_interval(59, 1096):
-                self.master_state = "chase"
-            elif self.into_interval(1096, 1097):
-                self.master_state = "wander"
-            elif self.into_interval(1097, 2000):
-                self.master_state = "chase"
-                self.indefinite_chase = True
+        # Apply every phase which has started since the last update. The table is sorted, so only the next phase ever
+        # needs checking
+        elapsed = self.now - self.start_time
+        while self.next_phase < len(self.level_config.times) and self.level_config.times[self.next_phase] <= elapsed:
+            self.master_state = self.level_config.states[self.next_phase]
+            self.next_phase += 1
+
+        self.indefinite_chase = self.next_phase == len(self.level_config.times)
 
         self.set_ghost_states(self.master_state)
         self.past = self.now
-        self.now = time()
+        self.now = self.clock.time()
 
     def set_ghost_states(self, state, break_idle=False, break_scared=False, break_wander=True, break_chase=True):
 
@@ -166,11 +110,34 @@ class Governor:
                     continue
                 g.state = "escape" if not g.escaped else state
 
+    def pause(self):
+        '''
+        Stop the clock, e.g. while the game is frozen
+        :returns: None
+        '''
+        if self.paused_at is None:
+            self.paused_at = self.clock.time()
+
+    def resume(self):
+        '''
+        Restart the clock. All times are shifted by however long the governor was paused, so no part of the schedule
+        or of a power-up is skipped or cut short
+        :returns: None
+        '''
+        if self.paused_at is None:
+            return None
+
+        paused_for = self.clock.time() - self.paused_at
+        self.start_time += paused_for
+        self.now += paused_for
+        self.past += paused_for
+        self.paused_at = None
+
     def into_interval(self, start, stop):
 
         return start <= self.now - self.start_time < stop and not (start <= self.past - self.start_time < stop)
 
     def fire_pup(self):
 
-        self.pup_time = time() - self.start_time
+        self.pup_time = self.clock.time() - self.start_time
         self.set_ghost_states("scared")
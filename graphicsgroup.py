@@ -1,7 +1,8 @@
 __author__ = 'anish'
 
 from functools import partial
-from pyglet.gl import glBegin, glEnd, glVertex2f, GL_LINE_STRIP, GL_QUADS
+from pyglet.gl import *
+from ctypes import pointer, sizeof
 from common import *
 
 
@@ -11,7 +12,8 @@ class GraphicsGroup:
     # The idea is to make it so that all graphics are abstracted away, and that if I port this to another language
     # then all graphics can be implemented by changing this file
 
-    # glColor3f and glLineWidth, however, is fine and is left for use outside this class
+    # glLineWidth, however, is fine and is left for use outside this class. Game keeps no GL calls of its own so that
+    # it can run headless without ever importing this file
 
     # DEPENDS PYGLET In case of port, this will need to be rewritten
 
@@ -26,6 +28,39 @@ class GraphicsGroup:
         game.draw_line = self.draw_line
         game.odraw_segment = self.odraw_segment
 
+    def set_color(self, r, g, b):
+
+        glColor3f(r, g, b)
+
+    def create_vbo(self, vertex_array, usage=GL_STATIC_DRAW):
+
+        # Upload a flat list of vertex coordinates to a new buffer, this is muy faster than using glBegin, etc...
+        # Buffers which will be changed with update_vbo should be made with usage=GL_DYNAMIC_DRAW
+        vbo = GLuint()
+        glGenBuffers(1, pointer(vbo))
+        gldata = (GLfloat*len(vertex_array))(*vertex_array)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, sizeof(gldata), pointer(gldata), usage)
+
+        return vbo
+
+    def update_vbo(self, vbo, offset, vertex_array):
+
+        # Overwrite part of a buffer, starting offset floats in, without uploading the rest of it again
+        gldata = (GLfloat*len(vertex_array))(*vertex_array)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferSubData(GL_ARRAY_BUFFER, offset * sizeof(GLfloat), sizeof(gldata), pointer(gldata))
+
+    def delete_vbo(self, vbo):
+
+        glDeleteBuffers(1, pointer(vbo))
+
+    def draw_vbo(self, vbo, length, mode=GL_LINES):
+
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glVertexPointer(2, GL_FLOAT, 0, 0)
+        glDrawArrays(mode, 0, length)
+
     def draw_rectangle(self, x, y, w, h):
 
         glBegin(GL_QUADS)
@@ -62,4 +97,74 @@ class GraphicsGroup:
 
     def draw_line(self, x1, y1, x2, y2, vertex_array):
 
-        vertex_array.extend((self.xoff + x1, self.yoff + y1, self.xoff + x2, self.yoff + y2))
\ No newline at end of file
+        vertex_array.extend((self.xoff + x1, self.yoff + y1, self.xoff + x2, self.yoff + y2))
+
+
+class PointBuffer:
+
+    # A dynamic buffer of same sized, same coloured points, drawn with a single call. Dots and power-ups are drawn with
+    # these: when one is eaten, the last point in the buffer is moved into its slot and the buffer is drawn one point
+    # shorter, so only that one slot is ever written to
+
+    def __init__(self, group, points, size, color):
+        '''
+        :param group: The GraphicsGroup to draw with, its offsets are applied to every point
+        :param points: A dict of key -> (x, y), the key being anything to remove the point by later
+        :param size: Point size in pixels
+        :param color: (r, g, b)
+        '''
+        self.group = group
+        self.size = size
+        self.color = color
+
+        # Never grows, fill() is only ever given as many points as the buffer started with
+        self.vbo = group.create_vbo([0.0] * 2 * len(points), GL_DYNAMIC_DRAW)
+        self.fill(points)
+
+    def vertex(self, key):
+
+        x, y = self.points[key]
+        return [self.group.xoff + x, self.group.yoff + y]
+
+    def fill(self, points):
+        '''
+        Replace every point in the buffer, e.g. when the dots are put back for a new level
+        :param points: A dict of key -> (x, y), no larger than the one the buffer was made with
+        :returns: None
+        '''
+        self.points = dict(points)
+
+        # keys[slot] is the key of the point in that slot, slots[key] is the slot the point with that key is in
+        self.keys = list(self.points)
+        self.slots = {key: slot for slot, key in enumerate(self.keys)}
+
+        vertex_array = []
+        for key in self.keys:
+            vertex_array.extend(self.vertex(key))
+
+        if vertex_array:
+            self.group.update_vbo(self.vbo, 0, vertex_array)
+
+    def remove(self, key):
+        '''
+        Stop drawing a point
+        :param key: The key the point was given
+        :returns: None
+        '''
+        slot = self.slots.pop(key)
+        last = self.keys.pop()
+
+        if last != key:
+            self.keys[slot] = last
+            self.slots[last] = slot
+            self.group.update_vbo(self.vbo, 2 * slot, self.vertex(last))
+
+    def delete(self):
+
+        self.group.delete_vbo(self.vbo)
+
+    def draw(self):
+
+        self.group.set_color(*self.color)
+        glPointSize(self.size)
+        self.group.draw_vbo(self.vbo, len(self.keys), GL_POINTS)
\ No newline at end of file
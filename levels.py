@@ -0,0 +1,69 @@
+__author__ = 'anish'
+
+# Ghost timings for each level: how long power-ups last and when the ghosts switch between wandering (scatter) and
+# chasing. These used to be a long chain of if statements in Governor.update, now they're plain data which maps can
+# override with #LEVEL lines, e.g.
+#
+#   #LEVEL 2 5 3 wander 0 chase 7 wander 27
+#
+# reads "from level 2 on, power-ups last 5 seconds and ghosts flash for 3 more; ghosts wander for the first 7 seconds of
+# a round, chase until 27 seconds in and wander from then on". A #LEVEL line applies until the next one's first level
+
+from bisect import bisect_right
+
+
+class Level:
+
+    def __init__(self, pup_duration, flash_duration, phases):
+        '''
+        Timings for one or more levels, with the phases compiled into a sorted transition table
+        :param pup_duration: Seconds ghosts stay scared after a power-up is eaten, before they start flashing
+        :param flash_duration: Seconds ghosts flash for before they go back to the master state
+        :param phases: (start, state) pairs. From start seconds into a round onwards the master state is state
+        :returns: Nothing
+        '''
+        phases = sorted(phases, key=lambda phase: phase[0])
+
+        self.pup_duration = pup_duration
+        self.flash_duration = flash_duration
+        self.times = [start for start, state in phases]
+        self.states = [state for start, state in phases]
+
+
+# Keyed by the first level each entry applies to
+DEFAULT_LEVELS = {
+    1: Level(9, 3, [(0, "wander"), (7, "chase"), (27, "wander"), (34, "chase"), (54, "wander"), (59, "chase"),
+                    (79, "wander"), (84, "chase")]),
+    2: Level(5, 3, [(0, "wander"), (7, "chase"), (27, "wander"), (34, "chase"), (54, "wander"), (59, "chase"),
+                    (1092, "wander"), (1093, "chase")]),
+    5: Level(0, 2, [(0, "wander"), (7, "chase"), (27, "wander"), (34, "chase"), (54, "wander"), (59, "chase"),
+                    (1096, "wander"), (1097, "chase")]),
+}
+
+
+def parse_level(args):
+    '''
+    :param args: The split up words of a #LEVEL line
+    :returns: The first level the line applies to, and its Level
+    '''
+    if len(args) < 4 or len(args) % 2 != 0:
+        raise ValueError("Malformed line: " + " ".join(args))
+
+    # Without a phase the master state would never leave idle, so ghosts would never come out
+    if len(args) == 4:
+        raise ValueError("Malformed line, it has no phases: " + " ".join(args))
+
+    phases = [(float(args[i + 1]), args[i]) for i in range(4, len(args), 2)]
+
+    return int(args[1]), Level(float(args[2]), float(args[3]), phases)
+
+
+def level_for(levels, level):
+    '''
+    :param levels: Dict of first level -> Level, like DEFAULT_LEVELS
+    :param level: The current level
+    :returns: The Level which applies to it. Levels before the first entry use the first entry
+    '''
+    firsts = sorted(levels)
+
+    return levels[firsts[max(bisect_right(firsts, level) - 1, 0)]]
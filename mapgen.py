@@ -0,0 +1,175 @@
+__author__ = 'anish'
+
+# Procedurally generated mazes, mostly for finding out how the grid, pathing and rendering code copes with maps much
+# bigger than classic.map. Maps are written in the same format as classic.map and laid out the same way: corridors one
+# tile wide, walls at least two tiles thick (which is all calculate_static_map knows how to draw), a two tile thick
+# border with a ring of empty tiles around it and a tunnel through the middle.
+#
+# The maze is carved on a lattice of junctions three tiles apart. A random spanning tree of the lattice makes sure every
+# tile can be reached, then dead ends get an extra corridor each (pacman mazes don't have any) and a few more corridors
+# are opened at random to make loops. Everything is drawn from one random.Random, so a seed always gives the same map.
+#
+# There's no ghost house. Ghosts start in the corridor around the centre junction, which is their escape tile
+#
+#   python mapgen.py big.map --width 200 --height 200 --seed 7
+
+import random
+from argparse import ArgumentParser
+
+# The smallest maps that can be generated, the size of the classic map
+MIN_DIMS = (28, 29)
+
+# Tiles between neighbouring junctions. Each corridor between two is one tile wide, so walls are two thick
+SPACING = 3
+
+# The chance that each corridor left out of the maze is opened anyway to make a loop
+LOOPS = 0.1
+
+
+def generate(width, height, seed=None, loops=LOOPS):
+    '''
+    Generate a maze
+    :param width: Width of the visible part of the map in tiles, the first number of #DIMENSIONS
+    :param height: Height of the visible part of the map in tiles, the second number of #DIMENSIONS
+    :param seed: Seed for the random number generator. The same seed and sizes always give the same map
+    :param loops: The chance that each corridor which isn't needed is opened anyway
+    :returns: The contents of the map file, as a string
+    '''
+    if width < MIN_DIMS[0] or height < MIN_DIMS[1]:
+        raise ValueError("Maps must be at least {}x{} tiles, not {}x{}".format(*MIN_DIMS, width, height))
+
+    rng = random.Random(seed)
+
+    # The whole map is the visible part plus two tiles of padding on every side, like classic.map. Junction i, j is at
+    # tile 3 + SPACING * i, 3 + SPACING * j, and any tiles left over past the last junction just thicken the border
+    full_width, full_height = width + 4, height + 4
+    columns, rows = (width - 3) // SPACING + 1, (height - 3) // SPACING + 1
+
+    # Corridors are pairs of junction numbers (j * columns + i), lower number first
+    corridors = [(node, node + 1) for node in range(columns * rows) if node % columns != columns - 1]
+    corridors += [(node, node + columns) for node in range(columns * (rows - 1))]
+    rng.shuffle(corridors)
+
+    # Kruskal's algorithm, with a union-find over the junctions
+    parents = list(range(columns * rows))
+
+    def root(node):
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    opened = set()
+    closed = []
+
+    for a, b in corridors:
+        root_a, root_b = root(a), root(b)
+
+        if root_a != root_b:
+            parents[root_a] = root_b
+            opened.add((a, b))
+        else:
+            closed.append((a, b))
+
+    # Ghosts spawn either side of the centre junction and players side by side a little below it, so the corridors
+    # there have to be open
+    centre_i, centre_j = columns // 2, rows // 2
+    player_j = centre_j - max(1, rows // 4)
+    centre = centre_j * columns + centre_i
+    player = player_j * columns + centre_i
+    opened.update(((centre - 1, centre), (centre, centre + 1), (player, player + 1)))
+
+    # Give every dead end a second way out
+    degrees = [0] * (columns * rows)
+    for a, b in opened:
+        degrees[a] += 1
+        degrees[b] += 1
+
+    for node in range(columns * rows):
+        if degrees[node] == 1:
+            i, j = node % columns, node // columns
+            neighbours = [neighbour for neighbour, inside in ((node - 1, i > 0), (node + 1, i < columns - 1),
+                                                              (node - columns, j > 0), (node + columns, j < rows - 1))
+                          if inside and (min(node, neighbour), max(node, neighbour)) not in opened]
+            neighbour = rng.choice(neighbours)
+
+            opened.add((min(node, neighbour), max(node, neighbour)))
+            degrees[node] += 1
+            degrees[neighbour] += 1
+
+    opened.update(corridor for corridor in closed if rng.random() < loops)
+
+    # Carve the maze out of a map which starts off as solid wall, with the empty ring around it. Rows go up from the
+    # bottom of the map here, and are flipped when they're written out
+    grid = [bytearray(b"e" + b"b" * (full_width - 2) + b"e") for _ in range(full_height)]
+    grid[0] = bytearray(b"e" * full_width)
+    grid[-1] = bytearray(b"e" * full_width)
+
+    def position(node):
+        return 3 + SPACING * (node % columns), 3 + SPACING * (node // columns)
+
+    for node in range(columns * rows):
+        x, y = position(node)
+        grid[y][x] = ord("d")
+
+    for a, b in opened:
+        (x, y), (end_x, end_y) = position(a), position(b)
+
+        if end_x > x:
+            grid[y][x + 1:end_x] = b"d" * (end_x - x - 1)
+        else:
+            for row in grid[y + 1:end_y]:
+                row[x] = ord("d")
+
+    # The tunnel goes through the border on the centre row, out to the column entities wrap around at
+    centre_x, centre_y = position(centre)
+    last_x = position(centre_j * columns + columns - 1)[0]
+    grid[centre_y][:3] = b"eee"
+    grid[centre_y][last_x + 1:] = b"e" * (full_width - last_x - 1)
+
+    # A power-up near each corner, like classic.map
+    for i, j in ((0, 1), (columns - 1, 1), (0, rows - 2), (columns - 1, rows - 2)):
+        x, y = position(j * columns + i)
+        grid[y][x] = ord("p")
+
+    player_x, player_y = position(player)
+    ghosts = (("#BLINKYSPAWN", centre_x), ("#PINKYSPAWN", centre_x - 1), ("#INKYSPAWN", centre_x - 2),
+              ("#CLYDESPAWN", centre_x + 1))
+
+    # Nothing to eat where the ghosts start
+    for directive, x in ghosts:
+        grid[centre_y][x] = ord("e")
+
+    lines = ["#MAX_PLAYERS 2",
+             "#PLAYERSPAWN {} {}".format(player_x + 0.5, player_y + 0.5),
+             "#PLAYERSPAWN {} {}".format(player_x + 1.5, player_y + 0.5)]
+    lines += ["{} {} {}".format(directive, x + 0.5, centre_y + 0.5) for directive, x in ghosts]
+    lines += ["#ESCAPE {} {}".format(centre_x + 0.5, centre_y + 0.5),
+              "#PADDING 2 2",
+              "#DIMENSIONS {} {}".format(width, height)]
+    lines += [row.decode() for row in reversed(grid)]
+
+    return "\n".join(lines) + "\n"
+
+
+def write_map(handle, width, height, seed=None, loops=LOOPS):
+    '''
+    Generate a maze and save it as a map file. See generate for the parameters
+    :param handle: The filename to write the map to
+    :returns: Nothing
+    '''
+    with open(handle, "w") as f:
+        f.write(generate(width, height, seed, loops))
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Generate a random maze as a map file")
+    parser.add_argument("handle", help="the map file to write")
+    parser.add_argument("--width", type=int, default=MIN_DIMS[0], help="width in tiles, at least 28")
+    parser.add_argument("--height", type=int, default=MIN_DIMS[1], help="height in tiles, at least 29")
+    parser.add_argument("--seed", type=int, default=None, help="seed, the same seed always gives the same map")
+    parser.add_argument("--loops", type=float, default=LOOPS, help="chance each extra corridor is opened")
+    args = parser.parse_args()
+
+    write_map(args.handle, args.width, args.height, args.seed, args.loops)
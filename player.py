@@ -2,9 +2,8 @@ __author__ = 'anish'
 
 from entity import *
 from common import *
-from pyglet.window import key
-from sprite import Sprite
-from copy import copy
+from collections import defaultdict
+from controllers import KEYS
 
 
 class Player(Entity):
@@ -13,10 +12,15 @@ class Player(Entity):
 
         super().__init__(game, x, y)
 
-        if playernum == 1:
-            self.cscheme = [key.W, key.A, key.S, key.D]
-        elif playernum == 2:
-            self.cscheme = [key.UP, key.LEFT, key.DOWN, key.RIGHT]
+        # Only the first two players have keys, the rest can only be steered by a controller
+        self.cscheme = CONTROL_SCHEMES.get(playernum)
+
+        # What steers the player, see controllers.py. Players without one of their own go by their keys
+        number = playernum - 1
+        self.controller = game.controllers[number] if number < len(game.controllers) else KEYS
+
+        # The direction the controller asked for this tick, see read_input
+        self.input = None
 
         # movement related variables specific to how a player move
         self.want_theta = None
@@ -24,14 +28,13 @@ class Player(Entity):
         self.horizontal_mismatch = False
         self.vertical_mismatch = False
 
-        # control scheme, contains pyglet.key objects in directions up, left, down, right
-        # handler to which a new state is pushed every iteration by the driver class
-        self.keys = key.KeyStateHandler()
+        # Which keys are down, as a mapping of key -> pressed. Only the Keys controller reads these, through key_mask,
+        # and the direction it asks for reaches update through read_input. The driver replaces it with a snapshot of the
+        # keyboard every tick (see controls.py), headless games set keys in it themselves
+        self.keys = defaultdict(bool)
 
         # All variables needed for graphics only, although they might seem more important
         self.count = 0
-        self.last_x = self.x
-        self.last_y = self.y
 
         # Just declaring this here for consistency
         self.sprites = []
@@ -45,73 +48,75 @@ class Player(Entity):
         :WARNING: This entire method is heavily dependent on pyglet-specific methods. It will need to be reworked if
         a port is attempted
         '''
-        # Slice out the needed region of the sprite sheet (32 x 32 Pac-Man normal_sprites) <pyglet>
-        spritesheet = Entity.spritesheet.get_region(0, Entity.spritesheet.height - 32, 3 * 32, 32)
-
-        # Convert the image into an array of images, and center their anchor points <pyglet>
-        self.sprites = image.ImageGrid(spritesheet, 1, 3, item_width=32, item_height=32)
-        for i in range(len(self.sprites)):
-            self.sprites[i].anchor_x = self.sprites[i].width // 2
-            self.sprites[i].anchor_y = self.sprites[i].width // 2
+        # Headless games never draw, so there is nothing to load
+        if self.game.headless:
+            return None
 
-        # Convert the images in the array to normal_sprites <pyglet>
-        self.sprites = [Sprite(i, self.game.graphics_group) for i in self.sprites]
+        import assets
 
-        # Now store the normal_sprites in a dictionary indexed by frame and rotation angle
-        temp_sprites = self.sprites
+        # Sprites come from the shared cache in assets.py, so only the first player ever made cuts up the spritesheet
+        # and makes the sprites. They're stored in a dictionary indexed by frame and rotation angle <pyglet>
         self.sprites = {}
-        for frame in range(len(temp_sprites)):
-            angles = {}
-            for x in [0, 90, 180, 270]:
-                angles[x] = copy(temp_sprites[frame])
-                angles[x].set_rotation(x)
-
-            self.sprites[frame] = angles
-
-        # Shift the frames cyclically to make the animation start with the pizza frame. If more frames are added
-        # to the animation, this will need to be changed
 
-        #After modifications are carried out, the animation is in the order pizza -> more eaten pizza -> circle
-        c = self.sprites[0]
-        self.sprites[0] = self.sprites[1]
-        self.sprites[1] = self.sprites[2]
-        self.sprites[2] = c
+        # The frames are taken in the order pizza -> more eaten pizza -> circle, which is the order of columns 1, 2, 0
+        # on the spritesheet. If more frames are added to the animation, this will need to be changed
+        for frame, column in enumerate((1, 2, 0)):
+            self.sprites[frame] = {angle: assets.get_sprite(self.game.graphics_group, assets.top_row(), column, angle)
+                                   for angle in (0, 90, 180, 270)}
 
     def update_movement_possibilities(self):
 
         # Pac Man can actually start moving before he reaches the center of an open tile. To account for this, some
-        # conditions besides whether the immediate tile is a block are taken into account
-        self.can_right = True \
-            if self.game.grid[int(self.y)][int(self.x) + 1] != "b" else self.x % 1 < 0.5
+        # conditions besides whether the immediate tile is a block are taken into account. Which neighbouring tiles
+        # aren't blocks is looked up in the map's table, see gamemap.py
+        moves = self.game.map.player_moves[self.y // SUBTILE * self.game.map.width + self.x // SUBTILE]
 
-        self.can_left = True \
-            if self.game.grid[int(self.y)][int(self.x) - 1] != "b" else self.x % 1 > 0.5
+        self.can_right = True if moves & OPEN_RIGHT else self.x % SUBTILE < HALF_TILE
 
-        self.can_up = True \
-            if self.game.grid[int(self.y) + 1][int(self.x)] != "b" else self.y % 1 < 0.5
+        self.can_left = True if moves & OPEN_LEFT else self.x % SUBTILE > HALF_TILE
 
-        self.can_down = True \
-            if self.game.grid[int(self.y) - 1][int(self.x)] != "b" else self.y % 1 > 0.5
+        self.can_up = True if moves & OPEN_UP else self.y % SUBTILE < HALF_TILE
+
+        self.can_down = True if moves & OPEN_DOWN else self.y % SUBTILE > HALF_TILE
+
+    def key_mask(self):
+        '''
+        Which of the player's keys are down, as a bitmask. Bits 0 to 3 are the keys of its control scheme in order: up,
+        left, down, right. This is all of the input a player reads each tick, so it's what sessions are recorded as, see
+        replay.py
+        :returns: An int
+        '''
+        keys = self.keys
+        cscheme = self.cscheme
+
+        if cscheme is None:
+            return 0
+
+        return keys[cscheme[0]] | keys[cscheme[1]] << 1 | keys[cscheme[2]] << 2 | keys[cscheme[3]] << 3
+
+    def read_input(self):
+        '''
+        Ask the player's controller which way it wants to go this tick. Game.update does this for every player once a
+        tick, before anything moves, and update goes by what it said
+        :returns: The direction, or None
+        '''
+        self.input = self.controller.direction(self)
+        return self.input
 
     def update(self):
 
         super().update()
 
-        #update the wanted direction based upon which key is pressed
-        if self.keys[self.cscheme[0]]:
-            self.want_theta = 90
-        elif self.keys[self.cscheme[1]]:
-            self.want_theta = 180
-        elif self.keys[self.cscheme[2]]:
-            self.want_theta = 270
-        elif self.keys[self.cscheme[3]]:
-            self.want_theta = 0
+        #update the wanted direction based upon what the controller asked for, the last one is kept if it asked for
+        #nothing
+        if self.input is not None:
+            self.want_theta = self.input
 
         # Needed for mismatch correction, addressed farther down
         temp_theta = self.theta
 
         # Update the, well, you can understand this... This block is necessary for Player.draw to detect whether
-        # the player has moved at all
+        # the player has moved at all, and for Game.update to tell whether the player ran through a ghost
         self.last_x = self.x
         self.last_y = self.y
 
@@ -134,44 +139,50 @@ class Player(Entity):
         #       turn. Since whether you are past the center depends on which direction you approach it from (ie theta),
         #       an or statement with two cases is used
 
+        # Whether there's a block beyond the tile the player is about to be on comes from the same table as above
+        moves = self.game.map.player_moves
+        width = self.game.map.width
+        tile_x = self.x // SUBTILE
+        tile_y = self.y // SUBTILE
+
         if self.want_theta == 0 and self.can_right:
-            if self.theta == 180 or (self.game.grid[int(self.y)][int((self.x + self.speed)) + 1] != "b") \
-                and ((self.theta == 90 and self.y % 1 <= 0.5) or
-                (self.theta == 270 and self.y % 1 >= 0.5) or self.theta is None):
+            if self.theta == 180 or (moves[tile_y * width + (self.x + self.speed) // SUBTILE] & OPEN_RIGHT) \
+                and ((self.theta == 90 and self.y % SUBTILE <= HALF_TILE) or
+                (self.theta == 270 and self.y % SUBTILE >= HALF_TILE) or self.theta is None):
                     self.theta = self.want_theta
 
         elif self.want_theta == 180 and self.can_left:
-            if self.theta == 0 or (self.game.grid[int(self.y)][int((self.x - self.speed)) - 1] != "b") \
-                and ((self.theta == 90 and self.y % 1 <= 0.5) or
-                (self.theta == 270 and self.y % 1 >= 0.5) or self.theta is None):
+            if self.theta == 0 or (moves[tile_y * width + (self.x - self.speed) // SUBTILE] & OPEN_LEFT) \
+                and ((self.theta == 90 and self.y % SUBTILE <= HALF_TILE) or
+                (self.theta == 270 and self.y % SUBTILE >= HALF_TILE) or self.theta is None):
                     self.theta = self.want_theta
 
         elif self.want_theta == 90 and self.can_up:
-            if self.theta == 270 or (self.game.grid[int((self.y + self.speed)) + 1][int(self.x)] != "b") \
-                and ((self.theta == 0 and self.x % 1 <= 0.5) or
-                (self.theta == 180 and self.x % 1 >= 0.5) or self.theta is None):
+            if self.theta == 270 or (moves[(self.y + self.speed) // SUBTILE * width + tile_x] & OPEN_UP) \
+                and ((self.theta == 0 and self.x % SUBTILE <= HALF_TILE) or
+                (self.theta == 180 and self.x % SUBTILE >= HALF_TILE) or self.theta is None):
                     self.theta = self.want_theta
 
         elif self.want_theta == 270 and self.can_down:
-            if self.theta == 90 or (self.game.grid[int((self.y - self.speed)) - 1][int(self.x)] != "b") \
-                and ((self.theta == 0 and self.x % 1 <= 0.5) or
-                (self.theta == 180 and self.x % 1 >= 0.5) or self.theta is None):
+            if self.theta == 90 or (moves[(self.y - self.speed) // SUBTILE * width + tile_x] & OPEN_DOWN) \
+                and ((self.theta == 0 and self.x % SUBTILE <= HALF_TILE) or
+                (self.theta == 180 and self.x % SUBTILE >= HALF_TILE) or self.theta is None):
                     self.theta = self.want_theta
 
         # Actually update the position. I'm not actually sure if all of these if statements are needed, but I'm too
         # scared and tired to find out
 
         if self.theta == 0 and self.can_right:
-            self.x += self.speed * cos(self.theta).__int__()
+            self.x += self.speed
 
         elif self.theta == 180 and self.can_left:
-            self.x += self.speed * cos(self.theta).__int__()
+            self.x -= self.speed
 
         elif self.theta == 90 and self.can_up:
-            self.y += self.speed * sin(self.theta).__int__()
+            self.y += self.speed
 
         elif self.theta == 270 and self.can_down:
-            self.y += self.speed * sin(self.theta).__int__()
+            self.y -= self.speed
 
         # Correct mismatches. Since Pac-Man is allowed to move before he actually reaches a turn per se, the last block
         # takes care of making sure that he always stays in the center of the path
@@ -189,27 +200,29 @@ class Player(Entity):
         # Keep Pac Man moving in his last direction until the mismatch is fixed
 
         if self.horizontal_mismatch:
-            if self.x % 1 != 0.5:
-                self.x += self.speed * cos(self.last_theta).__int__()
+            if self.x % SUBTILE != HALF_TILE:
+                self.x += self.speed * DIRECTIONS[self.last_theta][0]
             else:
                 self.horizontal_mismatch = False
 
         elif self.vertical_mismatch:
-            if self.y % 1 != 0.5:
-                self.y += self.speed * sin(self.last_theta).__int__()
+            if self.y % SUBTILE != HALF_TILE:
+                self.y += self.speed * DIRECTIONS[self.last_theta][1]
             else:
                 self.vertical_mismatch = False
 
-    def draw(self):
+    def draw(self, alpha=1):
 
         # Update the count by some value. (.25 + .125) / 2 seems to work well
         if self.last_x != self.x or self.y != self.last_y:
             self.count += (.25 + .125) / 2
 
+        x, y = self.draw_position(alpha)
+
         #Based on the count and the current theta, draw a frame rotated at the appropriate angle
         try:
-            self.sprites[int(self.count % 3)][self.theta].set_position(int(self.x * GRID_DIM), int(self.y * GRID_DIM))
+            self.sprites[int(self.count % 3)][self.theta].set_position(x, y)
             self.sprites[int(self.count % 3)][self.theta].draw()
         except KeyError:
-            self.sprites[0][0].set_position(self.x * GRID_DIM, self.y * GRID_DIM)
+            self.sprites[0][0].set_position(x, y)
             self.sprites[0][0].draw()
\ No newline at end of file
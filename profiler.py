@@ -0,0 +1,166 @@
+__author__ = 'anish'
+
+# Timings for each stage of Game.update and Game.draw, to find out where a slow tick or a dropped frame went. A game
+# only times anything while it has a profiler, and with none it does nothing but check for one at each stage, so this
+# costs almost nothing when it's switched off. See Driver for the on-screen overlay
+#
+#   game.profiler = Profiler()
+#   ...
+#   game.profiler.export_json("profile.json")
+
+import csv
+import json
+from collections import deque
+from time import perf_counter
+from common import *
+
+# How many of the most recent ticks or frames percentiles are worked out from
+WINDOW = 10 * CLOCKS_PER_SEC
+
+PERCENTILES = (50, 95, 99)
+
+
+class Stage:
+
+    def __init__(self, kind):
+
+        # "tick" for stages of Game.update, "frame" for stages of Game.draw
+        self.kind = kind
+
+        self.count = 0
+        self.total = 0
+
+        # Seconds spent in the stage in each of the last WINDOW ticks or frames
+        self.recent = deque(maxlen=WINDOW)
+
+    def add(self, elapsed):
+
+        self.count += 1
+        self.total += elapsed
+        self.recent.append(elapsed)
+
+    def percentile(self, p):
+        '''
+        :param p: The percentile, from 0 to 100
+        :returns: The time in seconds, over the last WINDOW ticks or frames
+        '''
+        if not self.recent:
+            return 0
+
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, len(ordered) * p // 100)]
+
+
+class Profiler:
+
+    def __init__(self):
+
+        # Stage name -> Stage, in the order they were first timed
+        self.stages = {}
+
+        # Seconds spent in each stage so far this tick or frame. A stage can be timed in several pieces, e.g. once per
+        # ghost, and they're added up here until the tick or frame ends
+        self.current = {}
+        self.last = 0
+
+        # When each of the last few frames ended, for the frame rate
+        self.frame_times = deque(maxlen=CLOCKS_PER_SEC)
+
+        # How many ticks the driver has had to skip because it fell too far behind, see behind
+        self.ticks_behind = 0
+
+    def start(self):
+
+        # Start timing a tick or frame
+        self.current = {}
+        self.last = perf_counter()
+
+    def lap(self, stage):
+        '''
+        Count everything since the last lap (or start) as time spent in a stage
+        :param stage: The name of the stage
+        :returns: None
+        '''
+        now = perf_counter()
+        self.current[stage] = self.current.get(stage, 0) + now - self.last
+        self.last = now
+
+    def end(self, kind):
+        '''
+        Finish timing a tick or frame, recording how long each of its stages took, and how long it took altogether
+        :param kind: "tick" or "frame"
+        :returns: None
+        '''
+        for stage, elapsed in self.current.items():
+            if stage not in self.stages:
+                self.stages[stage] = Stage(kind)
+            self.stages[stage].add(elapsed)
+
+        if kind not in self.stages:
+            self.stages[kind] = Stage(kind)
+        self.stages[kind].add(sum(self.current.values()))
+
+        if kind == "frame":
+            self.frame_times.append(self.last)
+
+        self.current = {}
+
+    def behind(self, ticks):
+        '''
+        Record ticks the driver skipped rather than ran, since running all of them would have taken it even further
+        behind, see Driver.update
+        :param ticks: How many were skipped
+        :returns: None
+        '''
+        self.ticks_behind += ticks
+
+    def fps(self):
+
+        if len(self.frame_times) < 2 or self.frame_times[-1] == self.frame_times[0]:
+            return 0
+
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+    def summary(self):
+        '''
+        Everything recorded so far
+        :returns: A list of dicts, one per stage, with times in milliseconds
+        '''
+        rows = []
+
+        for name, stage in self.stages.items():
+            row = {"stage": name, "kind": stage.kind, "count": stage.count, "total_ms": stage.total * 1000,
+                   "mean_ms": stage.total / stage.count * 1000 if stage.count else 0}
+
+            for p in PERCENTILES:
+                row["p{}_ms".format(p)] = stage.percentile(p) * 1000
+
+            rows.append(row)
+
+        return rows
+
+    def overlay(self):
+        '''
+        A few lines of text summing up the most recent ticks and frames, for the HUD
+        :returns: A string
+        '''
+        lines = ["FPS {:.0f}  behind {} ticks".format(self.fps(), self.ticks_behind)]
+        lines += ["{:<10} {:6.2f} {:6.2f} ms".format(row["stage"], row["p50_ms"], row["p99_ms"])
+                  for row in self.summary()]
+
+        return "\n".join(lines)
+
+    def export_json(self, handle):
+
+        with open(handle, "w") as f:
+            json.dump({"fps": self.fps(), "ticks_behind": self.ticks_behind, "stages": self.summary()}, f, indent=2)
+
+    def export_csv(self, handle):
+
+        rows = self.summary()
+
+        with open(handle, "w", newline="") as f:
+            writer = csv.DictWriter(f, ["stage", "kind", "count", "total_ms", "mean_ms"] +
+                                    ["p{}_ms".format(p) for p in PERCENTILES])
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,196 @@
+__author__ = 'anish'
+
+# What server.py and client.py say to each other. Every message is one line of JSON, over TCP:
+#
+#   client -> server  {"type": "join", "map": "classic.map"}
+#   server -> client  {"type": "welcome", "player": 0, "map": "classic.map", "tick": 1234}
+#   client -> server  {"type": "input", "direction": 90, "ack": 1300}
+#   server -> client  {"type": "state", "tick": 1301, "base": 1300, ...}
+#
+# The server sends a state every tick, as a delta from the last state the client acknowledged (its base): only the
+# entities which are different now, the dots eaten since, and a few numbers like the score. The client keeps the last
+# few states it has been sent, so it can always rebuild a state from its base, see Replica. A client which hasn't
+# acknowledged anything, or whose base is too old, gets everything (base None)
+
+import json
+from common import *
+
+# How many ticks of states are kept to send deltas from. Clients further behind than this get sent everything
+HISTORY = 2 * CLOCKS_PER_SEC
+
+# The index of each direction in a player's control scheme
+DIRECTION_KEYS = {90: 0, 180: 1, 270: 2, 0: 3}
+
+
+def encode(message):
+
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def decode(line):
+
+    return json.loads(line.decode())
+
+
+def entities(game):
+    '''
+    The state of every entity in a game, which is all a client needs to draw them
+    :returns: A tuple of (x, y, theta) for each player, and a tuple of (x, y, theta, state) for each ghost
+    '''
+    return tuple((p.x, p.y, p.theta) for p in game.players), tuple((g.x, g.y, g.theta, g.state) for g in game.ghosts)
+
+
+def diff(old, new):
+    '''
+    The entities in new which aren't the same in old
+    :param old: A tuple of entity states from entities, or None for nothing
+    :param new: Another
+    :returns: A list of [index, *state], one for each entity which changed
+    '''
+    if old is None:
+        return [[index] + list(state) for index, state in enumerate(new)]
+
+    return [[index] + list(state) for index, state in enumerate(new) if index >= len(old) or old[index] != state]
+
+
+class Recorder:
+
+    # The server's record of one game: its entities over the last HISTORY ticks, and every dot and power-up eaten since
+    # the dots were last reset, in the order they were eaten
+
+    def __init__(self, game):
+
+        self.game = game
+
+        # tick -> (players, ghosts, epoch, how many tiles had been eaten)
+        self.history = {}
+
+        # Goes up by one every time the game puts its dots back, which it does with a new grid
+        self.epoch = 0
+        self.grid = game.grid
+        self.eaten = []
+        self.eaten_set = set()
+
+    def record(self, tick, players):
+        '''
+        Record the game's state after a tick
+        :param tick: The tick's number
+        :param players: The players before the tick. Losing a life replaces every player, and a player can eat a dot on
+        the same tick it loses a life, so these are checked for what they ate as well as the new ones
+        :returns: None
+        '''
+        game = self.game
+
+        if game.grid is not self.grid:
+            self.grid = game.grid
+            self.epoch += 1
+            self.eaten = []
+            self.eaten_set = set()
+
+        for p in list(players) + game.players:
+            index = p.y // SUBTILE * game.map.width + p.x // SUBTILE
+
+            if index not in self.eaten_set and game.map.tiles[index] in (DOT, PUP) and game.grid[index] == EMPTY:
+                self.eaten.append(index)
+                self.eaten_set.add(index)
+
+        self.history[tick] = entities(game) + (self.epoch, len(self.eaten))
+        self.history.pop(tick - HISTORY, None)
+
+    def delta(self, tick, base):
+        '''
+        A state message for one client
+        :param tick: The tick to send, which must have been recorded
+        :param base: The last tick the client acknowledged, or None
+        :returns: The message
+        '''
+        players, ghosts, epoch, count = self.history[tick]
+        base_players = base_ghosts = None
+
+        if base in self.history and base != tick:
+            base_players, base_ghosts, base_epoch, base_count = self.history[base]
+        else:
+            base = None
+
+        message = {"type": "state", "tick": tick, "base": base,
+                   "players": len(players), "p": diff(base_players, players),
+                   "ghosts": len(ghosts), "g": diff(base_ghosts, ghosts),
+                   "score": self.game.score, "lives": self.game.lives, "level": self.game.level,
+                   "phase": self.game.governor.master_state, "over": self.game.over}
+
+        # The dots can be sent as just the ones eaten since the base, unless they've been put back since then
+        if base is None or base_epoch != epoch:
+            message["reset"] = True
+            message["eaten"] = self.eaten[:count]
+        else:
+            message["reset"] = False
+            message["eaten"] = self.eaten[base_count:count]
+
+        return message
+
+
+class Replica:
+
+    # The client's copy of a game's state, rebuilt from the server's deltas
+
+    def __init__(self):
+
+        # tick -> (players, ghosts), for the last few ticks received
+        self.history = {}
+        self.tick = None
+
+        self.players = ()
+        self.ghosts = ()
+        self.eaten = set()
+
+        self.score = self.lives = self.level = 0
+        self.phase = None
+        self.over = False
+
+    def apply(self, message):
+        '''
+        Apply a state message. A message can only be applied if its base is one of the last few states applied
+        :param message: The message
+        :returns: The tiles eaten since the last message, and whether every dot was put back first. None if the base
+        is missing, in which case the client should acknowledge nothing so the server sends everything
+        '''
+        if message["base"] is None:
+            players, ghosts = (), ()
+        elif message["base"] in self.history:
+            players, ghosts = self.history[message["base"]]
+        else:
+            return None
+
+        players = self.patch(players, message["players"], message["p"])
+        ghosts = self.patch(ghosts, message["ghosts"], message["g"])
+
+        self.tick = message["tick"]
+        self.history[self.tick] = (players, ghosts)
+        for tick in [tick for tick in self.history if tick <= self.tick - 2 * HISTORY]:
+            del self.history[tick]
+
+        self.players, self.ghosts = players, ghosts
+
+        # Eaten tiles never come back until the dots are reset, so they can be added to what's been eaten however far
+        # back the base was
+        if message["reset"]:
+            self.eaten = set()
+
+        eaten = [index for index in message["eaten"] if index not in self.eaten]
+        self.eaten.update(eaten)
+
+        self.score, self.lives, self.level = message["score"], message["lives"], message["level"]
+        self.phase, self.over = message["phase"], message["over"]
+
+        return eaten, message["reset"]
+
+    @staticmethod
+    def patch(states, length, changes):
+
+        # Apply a diff to a tuple of entity states
+        states = list(states[:length]) + [None] * (length - len(states))
+
+        for index, *state in changes:
+            states[index] = tuple(state)
+
+        return tuple(states)
@@ -0,0 +1,369 @@
+__author__ = 'anish'
+
+# Recording games and playing them back. Everything random in a game is drawn from its own seeded random.Random, and
+# its clock only counts ticks, so all it takes to play a game again is its seed and what the players pressed on every
+# tick. That's what an InputLog keeps:
+#
+#   header  magic, format version, freeze length, the map's filename, and the seed. Seeds are kept as whatever they
+#           were (any int, a float, a string or bytes), so a game replays with exactly the seed it was made with
+#   runs    one record for each run of ticks in a row which all had the same input: how many ticks, whether the game
+#           was paused (Game.should_update), and one byte per player of the direction its controller asked for, as a
+#           key mask (see DIRECTION_MASKS)
+#   resets  one record wherever the game was reset: how many players, how many dots counted as eaten
+#   loads   one record wherever a save was loaded into the game: the save itself (see savestate.py), which a replay
+#           loads at the same point
+#
+# Players hold a key for many ticks at a time, so a run covers many ticks and an hour's play is tens of kilobytes.
+# Played back headless, nothing is drawn and nothing waits, so an hour replays in seconds
+#
+#   python replay.py session.log            fast-forward to the end, print where the game got to
+#   python replay.py session.log --watch    watch it at real time (needs pyglet)
+#
+# Games run on a WallClock can't be replayed, how long the ghosts spend in each phase depends on the real time
+
+import struct
+from argparse import ArgumentParser
+from collections import deque
+from time import perf_counter
+
+import savestate
+from common import *
+from controllers import Remote
+from game import Game
+from gamemap import Map
+
+MAGIC = b"PMRP"
+
+# Bump this whenever a record changes, logs from other versions can't be read
+VERSION = 2
+
+HEADER = struct.Struct("<4sHHH")
+SEED = struct.Struct("<BI")
+FLOAT = struct.Struct("<d")
+KIND = struct.Struct("<B")
+RUN = struct.Struct("<I?B")
+RESET = struct.Struct("<BI")
+LOAD = struct.Struct("<I")
+
+RUN_RECORD, RESET_RECORD, LOAD_RECORD = range(3)
+
+# What type a seed is, which is stored before its bytes
+INT_SEED, FLOAT_SEED, STR_SEED, BYTES_SEED = range(4)
+
+
+def pack_seed(seed):
+    '''
+    :param seed: Any seed random.Random takes, apart from None
+    :returns: The seed's record
+    '''
+    if isinstance(seed, int):
+        kind, data = INT_SEED, seed.to_bytes(seed.bit_length() // 8 + 1, "little", signed=True)
+    elif isinstance(seed, float):
+        kind, data = FLOAT_SEED, FLOAT.pack(seed)
+    elif isinstance(seed, str):
+        kind, data = STR_SEED, seed.encode()
+    elif isinstance(seed, (bytes, bytearray)):
+        kind, data = BYTES_SEED, bytes(seed)
+    else:
+        raise TypeError("Games can't be recorded with a seed of type {}".format(type(seed).__name__))
+
+    return SEED.pack(kind, len(data)) + data
+
+
+def unpack_seed(data, offset):
+    '''
+    :returns: The seed, and the offset of whatever comes after it
+    '''
+    kind, length = SEED.unpack_from(data, offset)
+    offset += SEED.size
+    value = data[offset:offset + length]
+
+    if kind == INT_SEED:
+        seed = int.from_bytes(value, "little", signed=True)
+    elif kind == FLOAT_SEED:
+        seed, = FLOAT.unpack(value)
+    elif kind == STR_SEED:
+        seed = value.decode()
+    elif kind == BYTES_SEED:
+        seed = bytes(value)
+    else:
+        raise ValueError("Unknown seed type {}".format(kind))
+
+    return seed, offset + length
+
+
+class InputLog:
+
+    def __init__(self, handle, seed, freeze_ticks):
+        '''
+        The input a game was played with, see Game's record. Resets are kept as ("reset", players, total_dots_eaten),
+        loads as ("load", save) and ticks as [(should_update, key masks), how many ticks in a row]
+        :param handle: The map file the game was played on
+        :param seed: The game's seed. It's checked here, so a seed which can't be saved fails straight away rather than
+        once the game has been played
+        :param freeze_ticks: How long the game froze for
+        :returns: Nothing
+        '''
+        pack_seed(seed)
+
+        self.handle = handle
+        self.seed = seed
+        self.freeze_ticks = freeze_ticks
+
+        self.entries = []
+
+        # The run ticks are being added to, while their input stays the same
+        self.run = None
+
+    def reset(self, wanted_players, total_dots_eaten):
+
+        self.entries.append(("reset", wanted_players, total_dots_eaten))
+        self.run = None
+
+    def restore(self, data):
+
+        # A save was loaded into the game, see savestate.load. Everything from here on follows on from the save
+        self.entries.append(("load", bytes(data)))
+        self.run = None
+
+    def tick(self, should_update, masks):
+        '''
+        Add a tick
+        :param should_update: Whether the game was being updated
+        :param masks: The key mask of each player
+        :returns: None
+        '''
+        key = (should_update, tuple(masks))
+
+        if self.run is not None and self.run[0] == key:
+            self.run[1] += 1
+        else:
+            self.run = [key, 1]
+            self.entries.append(self.run)
+
+    def ticks(self):
+
+        return sum(entry[1] for entry in self.entries if entry[0] not in ("reset", "load"))
+
+    def to_bytes(self):
+
+        handle = self.handle.encode()
+        parts = [HEADER.pack(MAGIC, VERSION, self.freeze_ticks, len(handle)), handle, pack_seed(self.seed)]
+
+        for entry in self.entries:
+            if entry[0] == "reset":
+                parts.append(KIND.pack(RESET_RECORD) + RESET.pack(entry[1], entry[2]))
+            elif entry[0] == "load":
+                parts.append(KIND.pack(LOAD_RECORD) + LOAD.pack(len(entry[1])) + entry[1])
+            else:
+                (should_update, masks), count = entry
+                parts.append(KIND.pack(RUN_RECORD) + RUN.pack(count, should_update, len(masks)) + bytes(masks))
+
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+
+        magic, version, freeze_ticks, length = HEADER.unpack_from(data)
+
+        if magic != MAGIC:
+            raise ValueError("Not an input log")
+        if version != VERSION:
+            raise ValueError("Input logs of version {} can't be read, only version {}".format(version, VERSION))
+
+        offset = HEADER.size
+        handle = data[offset:offset + length].decode()
+        seed, offset = unpack_seed(data, offset + length)
+        log = cls(handle, seed, freeze_ticks)
+
+        while offset < len(data):
+            kind, = KIND.unpack_from(data, offset)
+            offset += KIND.size
+
+            if kind == RESET_RECORD:
+                log.reset(*RESET.unpack_from(data, offset))
+                offset += RESET.size
+
+            elif kind == LOAD_RECORD:
+                length, = LOAD.unpack_from(data, offset)
+                offset += LOAD.size
+
+                log.restore(data[offset:offset + length])
+                offset += length
+
+            elif kind == RUN_RECORD:
+                count, should_update, players = RUN.unpack_from(data, offset)
+                offset += RUN.size
+
+                log.entries.append([(should_update, tuple(data[offset:offset + players])), count])
+                offset += players
+
+            else:
+                raise ValueError("Unknown record {} at byte {}".format(kind, offset - KIND.size))
+
+        log.run = None
+        return log
+
+    def save(self, path):
+
+        with open(path, "wb") as handle:
+            handle.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+
+        with open(path, "rb") as handle:
+            return cls.from_bytes(handle.read())
+
+
+def start(log, **kwargs):
+    '''
+    Make the game a log starts from. It isn't recorded itself
+    :param log: The InputLog
+    :param kwargs: Passed to Game, e.g. headless or offsets to draw at
+    :returns: The game
+    '''
+    if not log.entries or log.entries[0][0] != "reset":
+        raise ValueError("An input log has to start with the game being made")
+
+    _, wanted_players, total_dots_eaten = log.entries[0]
+
+    # Every player is steered by a Remote, which steps sets to what the log says for each run of ticks
+    controllers = [Remote() for _ in range(Map.load(log.handle).max_players)]
+
+    return Game(log.handle, wanted_players, total_dots_eaten, freeze_ticks=log.freeze_ticks, seed=log.seed,
+                controllers=controllers, **kwargs)
+
+
+def steps(log, game):
+    '''
+    Play a log back one tick at a time
+    :param log: The InputLog
+    :param game: The game it starts from, see start
+    :returns: A generator which updates the game once each time it's advanced, and yields the tick it's reached
+    '''
+    tick = 0
+
+    for entry in log.entries[1:]:
+        if entry[0] == "reset":
+            game.reset(entry[1], entry[2])
+            continue
+
+        if entry[0] == "load":
+            savestate.load(game, entry[1])
+            continue
+
+        (should_update, masks), count = entry
+
+        # A run's input is the same on every tick of it, and players made partway through pick up the same controllers
+        for controller, mask in zip(game.controllers, masks):
+            controller.want = MASK_DIRECTIONS[mask]
+
+        game.should_update = should_update
+
+        for _ in range(count):
+            game.update()
+
+            tick += 1
+            yield tick
+
+
+def replay(log):
+    '''
+    Play a whole log back as fast as possible, with nothing drawn
+    :param log: The InputLog
+    :returns: The game, as it was when the log ended
+    '''
+    game = start(log, headless=True)
+
+    # Runs the generator to the end without keeping anything it yields
+    deque(steps(log, game), maxlen=0)
+
+    return game
+
+
+def watch(log, speed=1, skip=0):
+    '''
+    Play a log back in a window, at real time or a multiple of it. Space pauses
+    :param log: The InputLog
+    :param speed: How many times faster than real time to play
+    :param skip: How many ticks to fast-forward through before the window starts playing
+    :returns: None
+    '''
+    import pyglet
+    from pyglet.gl import glLineWidth, glClearColor, glClear, glEnableClientState, GL_COLOR_BUFFER_BIT, \
+        GL_VERTEX_ARRAY
+
+    # The window fits the map the log was played on, with room for the score underneath like the driver's
+    game_map = Map.load(log.handle)
+    width, height = game_map.dims if game_map.dims is not None else (game_map.width, game_map.height)
+    window = pyglet.window.Window(width * GRID_DIM, height * GRID_DIM + 100)
+    game = start(log, xoff=0, yoff=100)
+    playback = steps(log, game)
+
+    for _ in range(skip):
+        next(playback, None)
+
+    glLineWidth(4)
+    glClearColor(0, 0, 0, 1)
+    glClear(GL_COLOR_BUFFER_BIT)
+    glEnableClientState(GL_VERTEX_ARRAY)
+
+    # Same fixed step as the driver: real time is counted up, and spent a tick at a time
+    state = {"lag": 0, "paused": False}
+
+    def update(dt):
+
+        if state["paused"]:
+            return None
+
+        state["lag"] += dt * speed
+
+        while state["lag"] >= 1 / CLOCKS_PER_SEC:
+            state["lag"] -= 1 / CLOCKS_PER_SEC
+
+            if next(playback, None) is None:
+                pyglet.app.exit()
+                return None
+
+    @window.event
+    def on_draw():
+
+        window.clear()
+        game.draw(min(state["lag"] * CLOCKS_PER_SEC, 1))
+
+    @window.event
+    def on_key_press(symbol, modifiers):
+
+        if symbol == pyglet.window.key.SPACE:
+            state["paused"] = not state["paused"]
+
+    pyglet.clock.schedule(update)
+    pyglet.app.run()
+
+    game.delete()
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Play back a recorded game")
+    parser.add_argument("log", help="the input log, e.g. the session.log the driver writes")
+    parser.add_argument("--watch", action="store_true", help="play it in a window instead of fast-forwarding")
+    parser.add_argument("--speed", type=float, default=1, help="how many times faster than real time to watch")
+    parser.add_argument("--skip", type=int, default=0, help="ticks to fast-forward through before watching")
+    args = parser.parse_args()
+
+    log = InputLog.load(args.log)
+
+    if args.watch:
+        watch(log, args.speed, args.skip)
+
+    else:
+        started = perf_counter()
+        game = replay(log)
+        elapsed = perf_counter() - started
+
+        print("{} ticks ({:.1f} minutes of play) replayed in {:.2f}s".format(log.ticks(), log.ticks() / CLOCKS_PER_SEC
+                                                                             / 60, elapsed))
+        print("Level {}, score {}, lives {}, {}".format(game.level, game.score, game.lives,
+                                                       "game over" if game.over else "still playing"))
@@ -0,0 +1,301 @@
+__author__ = 'anish'
+
+# Saving a game mid-play, and copying one. A save is a few fixed-width records packed with struct, so it's small and
+# quick to make and read:
+#
+#   header    magic, format version, checksum of the map it was made on
+#   game      level, lives, score, counters, freeze length, clock, how many players and ghosts
+#   random    the state of the game's random numbers, so a restored game makes the same choices the original would
+#   governor  master state, timers (NaN for a timer that isn't running), next phase
+#   players   one record each: position, directions, mismatch flags, which keys are down
+#   ghosts    one record each: position, setpoint, state, target player, escaped
+#   dots      one bit for each tile of the map with a dot or power-up on it (Map.food), set if it hasn't been eaten
+#
+# A save is restored into a game on the same map, which is made the normal way first. Sprites, buffers and everything
+# else that never changes come from that game. clone makes a copy of a game without going through a save at all
+#
+# Controllers (see controllers.py) aren't part of a save: where a Script is up to and a bot's random numbers stay as
+# they are in the game the save is loaded into. clone does copy them
+
+import random
+import struct
+from collections import defaultdict
+from copy import copy
+from math import isnan, nan
+from operator import itemgetter
+from common import *
+from controllers import copy_controllers
+from levels import level_for
+from player import Player
+
+MAGIC = b"PMSV"
+
+# Bump this whenever a record changes, saves from other versions can't be read
+VERSION = 2
+
+HEADER = struct.Struct("<4sHI")
+GAME = struct.Struct("<HbI?HH??IIIBQBB")
+RANDOM = struct.Struct("<625Id")
+GOVERNOR = struct.Struct("<B6d?H")
+PLAYER = struct.Struct("<4i3HBd")
+GHOST = struct.Struct("<4iH3d5B")
+
+# Every value a ghost's state (or the governor's master state) can take, stored as its index. None is NO_STATE
+STATES = ("idle", "escape", "wander", "chase", "scared", "flashing", "retreat")
+NO_STATE = 0xFF
+
+# Directions are stored as they are, except None
+NO_THETA = 0xFFFF
+
+# Turns the tile codes of the food tiles into a string of bits, see pack_dots
+_FOOD_BITS = bytes(ord("1") if code in (DOT, PUP) else ord("0") for code in range(256))
+
+
+def pack_dots(game_map, grid):
+    '''
+    :returns: A bitset of which food tiles still have food on them, in the order of Map.food
+    '''
+    food = game_map.food
+
+    if not food:
+        return b""
+
+    # Reading every food tile at once and turning the codes into a binary number keeps the loops in C
+    tiles = itemgetter(*food)(grid) if len(food) > 1 else (grid[food[0]],)
+    bits = bytes(tiles).translate(_FOOD_BITS)[::-1]
+
+    return int(bits, 2).to_bytes((len(food) + 7) // 8, "little")
+
+
+def unpack_dots(game_map, data):
+    '''
+    :returns: A new grid for the map, with the food the bitset says was eaten taken away
+    '''
+    grid = game_map.new_grid()
+    bits = format(int.from_bytes(data, "little"), "b").zfill(len(game_map.food))[::-1]
+
+    index = bits.find("0")
+    while index != -1:
+        grid[game_map.food[index]] = EMPTY
+        index = bits.find("0", index + 1)
+
+    return grid
+
+
+def pack_time(value):
+
+    return nan if value is None else value
+
+
+def unpack_time(value):
+
+    return None if isnan(value) else value
+
+
+def pack_theta(theta):
+
+    return NO_THETA if theta is None else theta
+
+
+def unpack_theta(theta):
+
+    return None if theta == NO_THETA else theta
+
+
+def pack_state(state):
+
+    return NO_STATE if state is None else STATES.index(state)
+
+
+def unpack_state(state):
+
+    return None if state == NO_STATE else STATES[state]
+
+
+def pack_random(rng):
+
+    # A Mersenne Twister's state is 624 words and an index into them, plus a normal variate kept from last time
+    version, words, gauss_next = rng.getstate()
+    return RANDOM.pack(*words, pack_time(gauss_next))
+
+
+def unpack_random(data, offset):
+
+    *words, gauss_next = RANDOM.unpack_from(data, offset)
+
+    rng = random.Random()
+    rng.setstate((3, tuple(words), unpack_time(gauss_next)))
+    return rng
+
+
+def save(game):
+    '''
+    Save a game. Its controllers aren't saved, see the top of this file
+    :param game: The game, which can be in any state, even frozen or over
+    :returns: The save, as bytes
+    '''
+    governor = game.governor
+    parts = [HEADER.pack(MAGIC, VERSION, game.map.checksum),
+             GAME.pack(game.level, game.lives, game.score, game.over, game.frozen, game.freeze_ticks,
+                       game.should_update, game.moved, game.total_dots_eaten, game.dots_eaten, game.pups_eaten,
+                       game.wanted_players, getattr(game.clock, "ticks", 0), len(game.players), len(game.ghosts)),
+             pack_random(game.random),
+             GOVERNOR.pack(pack_state(governor.master_state), pack_time(governor.pup_time),
+                           pack_time(governor.flash_time), governor.start_time, governor.now, governor.past,
+                           pack_time(governor.paused_at), governor.indefinite_chase, governor.next_phase)]
+
+    for p in game.players:
+        flags = p.horizontal_mismatch | p.vertical_mismatch << 1
+        for bit, key in enumerate(p.cscheme or ()):
+            flags |= bool(p.keys[key]) << bit + 2
+
+        parts.append(PLAYER.pack(p.x, p.y, p.last_x, p.last_y, pack_theta(p.theta), pack_theta(p.want_theta),
+                                 pack_theta(p.last_theta), flags, p.count))
+
+    for g in game.ghosts:
+        target = game.players.index(g.target_player) if g.target_player in game.players else 0
+
+        parts.append(GHOST.pack(g.x, g.y, g.last_x, g.last_y, pack_theta(g.theta), g.want_x, g.want_y, g.count,
+                                pack_state(g.state), pack_state(g.pre_state), target, g.escaped, g.speed))
+
+    parts.append(pack_dots(game.map, game.grid))
+
+    return b"".join(parts)
+
+
+def load(game, data):
+    '''
+    Restore a save into a game, which has to be on the map the save was made on. Whatever the game was doing before is
+    forgotten, apart from its controllers, which carry on from wherever they were. A game being recorded has the save
+    added to its input log, so the log replays through the load
+    :param game: The game
+    :param data: The save, from save
+    :returns: The game
+    '''
+    magic, version, checksum = HEADER.unpack_from(data)
+
+    if magic != MAGIC:
+        raise ValueError("Not a saved game")
+    if version != VERSION:
+        raise ValueError("Saved games of version {} can't be read, only version {}".format(version, VERSION))
+    if checksum != game.map.checksum:
+        raise ValueError("The game was saved on a different map")
+
+    offset = HEADER.size
+
+    (game.level, game.lives, game.score, game.over, game.frozen, game.freeze_ticks, game.should_update, game.moved,
+     game.total_dots_eaten, game.dots_eaten, game.pups_eaten, game.wanted_players, ticks, players,
+     ghosts) = GAME.unpack_from(data, offset)
+    offset += GAME.size
+
+    if hasattr(game.clock, "ticks"):
+        game.clock.ticks = ticks
+
+    game.random = unpack_random(data, offset)
+    offset += RANDOM.size
+
+    if ghosts != len(game.ghosts):
+        raise ValueError("The game was saved with {} ghosts, not {}".format(ghosts, len(game.ghosts)))
+
+    # Players are made here if there aren't enough, which unlike making ghosts doesn't use any random numbers
+    spawns = [(x, y) for directive, x, y in game.map.spawns if directive == "#PLAYERSPAWN"]
+    game.players = game.players[:players] + [Player(game, *spawns[number], number + 1)
+                                             for number in range(len(game.players), players)]
+
+    governor = game.governor
+    (master_state, pup_time, flash_time, governor.start_time, governor.now, governor.past, paused_at,
+     governor.indefinite_chase, governor.next_phase) = GOVERNOR.unpack_from(data, offset)
+    offset += GOVERNOR.size
+
+    governor.master_state = unpack_state(master_state)
+    governor.pup_time = unpack_time(pup_time)
+    governor.flash_time = unpack_time(flash_time)
+    governor.paused_at = unpack_time(paused_at)
+    governor.level_config = level_for(governor.levels, game.level)
+    governor.pup_duration = governor.level_config.pup_duration
+    governor.flash_duration = governor.level_config.flash_duration
+
+    for p in game.players:
+        p.x, p.y, p.last_x, p.last_y, theta, want_theta, last_theta, flags, p.count = PLAYER.unpack_from(data, offset)
+        offset += PLAYER.size
+
+        p.theta, p.want_theta, p.last_theta = unpack_theta(theta), unpack_theta(want_theta), unpack_theta(last_theta)
+        p.horizontal_mismatch = bool(flags & 1)
+        p.vertical_mismatch = bool(flags & 2)
+
+        p.keys = defaultdict(bool)
+        for bit, key in enumerate(p.cscheme or ()):
+            p.keys[key] = bool(flags & 1 << bit + 2)
+
+    for g in game.ghosts:
+        (g.x, g.y, g.last_x, g.last_y, theta, g.want_x, g.want_y, g.count, state, pre_state, target, g.escaped,
+         g.speed) = GHOST.unpack_from(data, offset)
+        offset += GHOST.size
+
+        g.theta = unpack_theta(theta)
+        g.state, g.pre_state = unpack_state(state), unpack_state(pre_state)
+        g.escaped = bool(g.escaped)
+        g.target_player = game.players[target]
+
+    game.grid = unpack_dots(game.map, data[offset:])
+
+    # The buffers the dots are drawn from have to match the grid again
+    for tile, buffer in game.dot_buffers.items():
+        buffer.fill(game.dot_points(tile))
+
+    if game.log is not None:
+        game.log.restore(data)
+
+    return game
+
+
+def clone(game):
+    '''
+    Copy a game, e.g. to try something out on the copy and carry on with the original afterwards. Nothing is saved or
+    loaded, every object is just copied, and anything which never changes (the map, sprites) is shared. The copy is
+    always headless, so it can't change anything the original draws with
+    :param game: The game to copy
+    :returns: The copy
+    '''
+    new = copy(game)
+    new.headless = True
+    new.graphics_group = None
+    new.dot_buffers = {}
+    new.score_label = new.lives_label = None
+    new.profiler = None
+    new.log = None
+
+    new.grid = bytearray(game.grid)
+    new.clock = copy(game.clock)
+
+    new.random = random.Random()
+    new.random.setstate(game.random.getstate())
+
+    new.governor = copy(game.governor)
+    new.governor.game = new
+    new.governor.clock = new.clock
+
+    # Controllers are copied too, so bots on the copy don't change what the original's bots do next
+    new.controllers = copy_controllers(game.controllers)
+    controllers = {id(c): d for c, d in zip(game.controllers, new.controllers)}
+
+    players = {}
+    new.players = []
+
+    for p in game.players:
+        q = copy(p)
+        q.game = new
+        q.controller = controllers.get(id(p.controller), p.controller)
+        q.keys = defaultdict(bool, {key: p.keys[key] for key in p.cscheme or ()})
+        new.players.append(q)
+        players[id(p)] = q
+
+    new.ghosts = []
+
+    for g in game.ghosts:
+        h = copy(g)
+        h.game = new
+        h.target_player = players.get(id(g.target_player), new.players[0] if new.players else None)
+        new.ghosts.append(h)
+
+    return new
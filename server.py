@@ -0,0 +1,257 @@
+__author__ = 'anish'
+
+# An authoritative multiplayer server. Every game runs headless here, CLOCKS_PER_SEC ticks a second, and clients only
+# send which way they want to go and draw what they're sent back, see protocol.py for the messages and client.py for a
+# client. Games are rooms of up to the map's MAX_PLAYERS players. A client joining a full room (or a map with no room)
+# gets a new one, and one process can run as many rooms as it can keep up with
+#
+#   python server.py --port 5555
+#
+# Only the Python standard library is needed, so this runs anywhere the headless game does
+
+import asyncio
+import traceback
+from argparse import ArgumentParser
+from collections import defaultdict
+from controllers import Remote
+from game import Game
+from gamemap import Map
+from protocol import *
+
+# A client whose connection has this many bytes waiting to be sent is skipped until it catches up. Since every state is
+# a delta from what the client last acknowledged, skipping some loses nothing
+MAX_BUFFERED = 1 << 16
+
+# How many ticks a server can fall behind before it gives up catching up and skips them
+MAX_TICKS = 8
+
+
+def valid_int(value):
+
+    # JSON booleans come through as bools, which are ints as far as Python is concerned
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class Connection:
+
+    def __init__(self, reader, writer):
+
+        self.reader = reader
+        self.writer = writer
+
+        self.room = None
+        self.player = None
+
+        # The way the client last asked to go (None for no key), and the last tick it acknowledged
+        self.direction = None
+        self.ack = None
+
+
+class Room:
+
+    def __init__(self, handle):
+
+        self.handle = handle
+
+        # Each client steers its player through a Remote, set to the way it last asked to go
+        self.controllers = [Remote() for _ in range(Map.load(handle).max_players)]
+        self.game = Game(handle, wanted_players=1, headless=True, controllers=self.controllers)
+        self.recorder = Recorder(self.game)
+        self.connections = []
+        self.tick_count = 0
+
+    def full(self):
+
+        return len(self.connections) >= self.game.map.max_players
+
+    def join(self, connection):
+
+        # A new player starts a new game, the way adding a player in the driver does
+        connection.room = self
+        connection.player = len(self.connections)
+        self.connections.append(connection)
+        self.game.reset(len(self.connections))
+
+    def leave(self, connection):
+
+        # Players are numbered by when they joined, so everyone after the one leaving moves down one
+        self.connections.remove(connection)
+
+        for number, other in enumerate(self.connections):
+            other.player = number
+
+        if self.connections:
+            self.game.reset(len(self.connections))
+
+    def tick(self):
+
+        game = self.game
+
+        for connection in self.connections:
+            self.controllers[connection.player].want = connection.direction
+
+        players = game.players
+
+        if game.over:
+            game.reset()
+        else:
+            game.update()
+
+        self.tick_count += 1
+        self.recorder.record(self.tick_count, players)
+
+        for connection in self.connections:
+            if connection.writer.transport.get_write_buffer_size() < MAX_BUFFERED:
+                connection.writer.write(encode(self.recorder.delta(self.tick_count, connection.ack)))
+
+
+class Server:
+
+    def __init__(self, maps=("classic.map",)):
+
+        # The maps clients can ask for, the first is the one they get if they don't ask. Clients can't ask for any other
+        # file on the server
+        self.maps = maps
+
+        # map -> rooms on that map
+        self.rooms = defaultdict(list)
+        self.server = None
+
+        # The task handling each connection, see connect
+        self.handlers = set()
+
+    async def start(self, host="127.0.0.1", port=5555):
+        '''
+        Start listening and running games. Pass port 0 to listen on any free port, see port
+        :returns: None
+        '''
+        self.server = await asyncio.start_server(self.connect, host, port)
+        self.runner = asyncio.ensure_future(self.run())
+
+    def port(self):
+
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+
+        # Closing every connection lets each handler see the end of its stream and clean up after itself
+        self.runner.cancel()
+        self.server.close()
+
+        for rooms in self.rooms.values():
+            for room in rooms:
+                for connection in room.connections:
+                    connection.writer.close()
+
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def find_room(self, handle):
+
+        for room in self.rooms[handle]:
+            if not room.full():
+                return room
+
+        room = Room(handle)
+        self.rooms[handle].append(room)
+        return room
+
+    async def connect(self, reader, writer):
+
+        connection = Connection(reader, writer)
+        self.handlers.add(asyncio.current_task())
+
+        try:
+            message = decode(await reader.readline())
+
+            if not isinstance(message, dict) or message.get("type") != "join":
+                return None
+
+            handle = message.get("map", self.maps[0])
+            if handle not in self.maps:
+                handle = self.maps[0]
+
+            room = self.find_room(handle)
+            room.join(connection)
+            writer.write(encode({"type": "welcome", "player": connection.player, "map": handle,
+                                 "tick": room.tick_count}))
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                message = decode(line)
+
+                # Anything a client sends is checked before it's kept, a bad value is as good as none at all
+                if isinstance(message, dict) and message.get("type") == "input":
+                    direction = message.get("direction")
+                    ack = message.get("ack")
+
+                    connection.direction = direction if valid_int(direction) and direction in DIRECTION_KEYS else None
+                    connection.ack = ack if valid_int(ack) else None
+
+        except (ValueError, ConnectionError):
+            pass
+
+        finally:
+            if connection.room is not None:
+                connection.room.leave(connection)
+
+                # A room closed by run has already been taken out
+                rooms = self.rooms[connection.room.handle]
+                if not connection.room.connections and connection.room in rooms:
+                    rooms.remove(connection.room)
+
+            writer.close()
+            self.handlers.discard(asyncio.current_task())
+
+    def close_room(self, room):
+
+        # The handlers remove the room once every connection in it has gone
+        for connection in room.connections:
+            connection.writer.close()
+
+        if room in self.rooms[room.handle]:
+            self.rooms[room.handle].remove(room)
+
+    async def run(self):
+
+        # Every room is ticked in turn, CLOCKS_PER_SEC times a second. Like the driver, a server which falls more than
+        # MAX_TICKS behind skips the ticks it missed rather than running them all at once
+        loop = asyncio.get_event_loop()
+        next_tick = loop.time()
+
+        while True:
+            for rooms in list(self.rooms.values()):
+                for room in list(rooms):
+                    # A room that fails is closed, its clients get disconnected but every other room carries on
+                    try:
+                        room.tick()
+                    except Exception:
+                        traceback.print_exc()
+                        self.close_room(room)
+
+            next_tick += 1 / CLOCKS_PER_SEC
+            now = loop.time()
+
+            if now - next_tick > MAX_TICKS / CLOCKS_PER_SEC:
+                next_tick = now
+
+            await asyncio.sleep(max(0, next_tick - now))
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Run an authoritative multiplayer server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--maps", nargs="+", default=["classic.map"], help="the maps clients can play on")
+    args = parser.parse_args()
+
+    async def main():
+        server = Server(tuple(args.maps))
+        await server.start(args.host, args.port)
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
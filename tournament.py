@@ -0,0 +1,267 @@
+__author__ = 'anish'
+
+# Plays lots of headless games across a pool of processes and sums up how they went, for scoring player bots and ghost
+# AIs against each other. Every game is seeded, so a tournament played again with the same seeds plays out the same:
+#
+#   python tournament.py --games 10000 --policy greedy
+#   python tournament.py --games 10000 --policy random --ghosts my_ghosts --out results.jsonl
+#
+# A policy is the bot every player is steered by, one of controllers.BOTS, or your own controller class as module:Class
+# (made with a seeded random.Random). Ghost AIs are modules with their own Blinky, Pinky, Inky and Clyde classes
+# (usually subclasses of the ones in ghosts.py), which are used in place of the stock ones.
+#
+# Workers are warmed up before they play anything: the map is parsed and compiled, including the bots' Maze and the
+# distance field for every tile ghosts can head for, so no game pays for it. Games are handed out and sent back in
+# batches, which keeps the pool busy without sending a message for every game, and each batch is added to the totals as
+# soon as it arrives.
+# Games don't share anything, so the more cores, the more games a second
+
+import importlib
+import json
+import multiprocessing
+import random
+import statistics
+import sys
+from argparse import ArgumentParser
+from collections import Counter
+from time import perf_counter
+
+import governor
+from controllers import BOTS, Maze
+from game import Game
+from gamemap import Map
+from common import *
+
+# Games are cut off after this many ticks (ten minutes of play) whether they're over or not
+MAX_TICKS = 10 * 60 * CLOCKS_PER_SEC
+
+# Games played by a worker for each batch it sends back
+BATCH = 20
+
+# Maps with more tiles than this don't have every distance field worked out up front, it would take too much memory
+WARM_TILES = 4096
+
+GHOST_TYPES = ("Blinky", "Pinky", "Inky", "Clyde")
+
+
+def find(name, table):
+    '''
+    Look a bot up by name, or import it from module:name
+    :returns: The bot's class
+    '''
+    if name in table:
+        return table[name]
+
+    module, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def use_ghosts(module):
+    '''
+    Make new games use a module's ghost classes, in this process. Ghosts the module doesn't have stay stock
+    :param module: The module's name, or None for the stock ghosts
+    :returns: None
+    '''
+    import ghosts
+    variant = ghosts if module is None else importlib.import_module(module)
+
+    for name in GHOST_TYPES:
+        setattr(governor, name, getattr(variant, name, getattr(ghosts, name)))
+
+
+def warm(handle, ghosts=None):
+    '''
+    Get a process ready to play games on a map. The map is parsed and compiled along with the Maze bots use, and on maps
+    which aren't too big the distance field to every tile ghosts can head for is worked out
+    :param handle: The map file
+    :param ghosts: Module of the ghost AI to use, see use_ghosts
+    :returns: None
+    '''
+    game_map = Map.load(handle)
+    Maze.of(game_map)
+
+    if len(game_map.tiles) <= WARM_TILES:
+        for target in set(game_map.nearest_ghost_tile):
+            game_map.ghost_distances(target)
+
+    use_ghosts(ghosts)
+
+
+def catcher(ghosts, players):
+    '''
+    Which ghost took a life on the tick just played. Losing a life replaces every entity, but the old ones are left
+    where they were when it happened
+    :param ghosts: The ghosts before the tick
+    :param players: The players before the tick
+    :returns: The name of the ghost's class
+    '''
+    # Ghosts are checked in order and the first one to catch anyone ends the tick, so it's the first that's touching a
+    # player without being scared. Scared ghosts which were caught themselves have already turned to retreat
+    for g in ghosts:
+        if g.state not in ("scared", "flashing", "retreat") and any(g.hits(p) for p in players):
+            return type(g).__name__
+
+    return "unknown"
+
+
+def play(handle, seed, policy="random", players=1, max_ticks=MAX_TICKS):
+    '''
+    Play one headless game
+    :param handle: The map file
+    :param seed: The game's seed, which also seeds the bots
+    :param policy: Name of the bot every player is steered by
+    :param players: How many players
+    :param max_ticks: When to stop a game that isn't over
+    :returns: A dict: seed, score, ticks survived, dots eaten, level reached, lives left, whether the game was over,
+    and lives lost to each ghost type
+    '''
+    bots = [find(policy, BOTS)(random.Random("{}:{}".format(seed, number))) for number in range(players)]
+    game = Game(handle, players, headless=True, seed=seed, controllers=bots)
+    deaths = Counter()
+    ticks = 0
+
+    while not game.over and ticks < max_ticks:
+        ghosts, before, lives = game.ghosts, game.players, game.lives
+
+        game.update()
+        ticks += 1
+
+        if game.lives < lives:
+            deaths[catcher(ghosts, before)] += 1
+
+    return {"seed": seed, "score": game.score, "ticks": ticks, "dots": game.total_dots_eaten, "level": game.level,
+            "lives": game.lives, "over": game.over, "deaths": dict(deaths)}
+
+
+def play_batch(args):
+    '''
+    Play a batch of games in a worker
+    :param args: (handle, seeds, policy, players, max_ticks)
+    :returns: A list of results from play
+    '''
+    handle, seeds, policy, players, max_ticks = args
+    return [play(handle, seed, policy, players, max_ticks) for seed in seeds]
+
+
+class Summary:
+
+    # Totals over every game played so far
+
+    def __init__(self):
+
+        self.results = []
+        self.deaths = Counter()
+        self.started = perf_counter()
+
+    def add(self, results):
+
+        self.results.extend(results)
+
+        for result in results:
+            self.deaths.update(result["deaths"])
+
+    def report(self):
+        '''
+        :returns: A dict of the mean, standard deviation, lowest and highest score, ticks survived and dots eaten, and
+        the lives lost to each ghost type, in total and per game
+        '''
+        games = len(self.results)
+        report = {"games": games, "games_per_second": games / (perf_counter() - self.started),
+                  "over": sum(result["over"] for result in self.results)}
+
+        for stat in ("score", "ticks", "dots", "level"):
+            values = [result[stat] for result in self.results]
+            report[stat] = {"mean": statistics.mean(values) if values else 0,
+                            "stdev": statistics.stdev(values) if len(values) > 1 else 0,
+                            "min": min(values, default=0), "max": max(values, default=0)}
+
+        report["deaths"] = {name: {"total": self.deaths[name], "per_game": self.deaths[name] / games if games else 0}
+                            for name in sorted(self.deaths, key=lambda name: (name not in GHOST_TYPES, name))}
+
+        return report
+
+
+def run(handle="classic.map", seeds=range(100), policy="random", ghosts=None, players=1, max_ticks=MAX_TICKS,
+        processes=None, batch=BATCH, on_batch=None):
+    '''
+    Play a game for every seed, across a pool of processes
+    :param handle: The map file
+    :param seeds: The games' seeds
+    :param policy: Name of the bot every player is steered by, see controllers.BOTS
+    :param ghosts: Module of the ghost AI, see use_ghosts. None for the stock ghosts
+    :param players: Players in each game
+    :param max_ticks: When to stop a game that isn't over
+    :param processes: How many worker processes, defaults to one for each core. With 1 everything is played in this
+    process, with no pool at all
+    :param batch: Games a worker plays for each batch it sends back
+    :param on_batch: Called with the Summary every time a batch arrives, e.g. to show progress
+    :returns: The Summary
+    '''
+    seeds = list(seeds)
+    tasks = [(handle, seeds[start:start + batch], policy, players, max_ticks) for start in range(0, len(seeds), batch)]
+    summary = Summary()
+
+    if processes == 1:
+        warm(handle, ghosts)
+
+        try:
+            for task in tasks:
+                summary.add(play_batch(task))
+
+                if on_batch is not None:
+                    on_batch(summary)
+        finally:
+            use_ghosts(None)
+
+        return summary
+
+    # Parsing the map here first means workers forked from this process start with it already compiled
+    Map.load(handle)
+
+    with multiprocessing.Pool(processes, initializer=warm, initargs=(handle, ghosts)) as pool:
+        for results in pool.imap_unordered(play_batch, tasks):
+            summary.add(results)
+
+            if on_batch is not None:
+                on_batch(summary)
+
+    return summary
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Play many headless games and sum up the results")
+    parser.add_argument("--map", default="classic.map")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, the rest count up from it")
+    parser.add_argument("--policy", default="random", help="one of {}, or module:Class".format(", ".join(BOTS)))
+    parser.add_argument("--ghosts", default=None, help="module with the ghost classes to play against")
+    parser.add_argument("--players", type=int, default=1)
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument("--processes", type=int, default=None, help="defaults to one for each core")
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--out", default=None, help="also write every game's result here, one JSON object a line")
+    args = parser.parse_args()
+
+    out = open(args.out, "w") if args.out else None
+    written = 0
+
+    def progress(summary):
+
+        global written
+
+        if out is not None:
+            for result in summary.results[written:]:
+                out.write(json.dumps(result) + "\n")
+            written = len(summary.results)
+
+        print("{}/{} games".format(len(summary.results), args.games), file=sys.stderr, end="\r")
+
+    summary = run(args.map, range(args.seed, args.seed + args.games), args.policy, args.ghosts, args.players,
+                  args.max_ticks, args.processes, args.batch, progress)
+
+    if out is not None:
+        out.close()
+
+    print(file=sys.stderr)
+    print(json.dumps(summary.report(), indent=4))